@@ -1,5 +1,9 @@
 import axios from 'axios';
 
+// Identifies this phone to the backend so its eye/head timers are
+// kept separate from other drivers using the same server
+const SESSION_ID = `app_${Date.now()}_${Math.random().toString(36).slice(2, 10)}`;
+
 export class ApiService {
   /**
    * Check server health and status
@@ -34,7 +38,7 @@ export class ApiService {
       });
 
       const result = await axios.post(
-        `${serverUrl}/api/process-frame`,
+        `${serverUrl}/api/process-frame?session_id=${SESSION_ID}`,
         formData,
         {
           headers: {
@@ -52,11 +56,13 @@ export class ApiService {
   }
 
   /**
-   * Start recording session
+   * Start recording session (default: this app's session, the one processFrame sends to)
    */
-  static async startRecording(serverUrl) {
+  static async startRecording(serverUrl, sessionId = SESSION_ID) {
     try {
-      const response = await axios.post(`${serverUrl}/api/start-recording`);
+      const response = await axios.post(`${serverUrl}/api/start-recording`, null, {
+        params: { session_id: sessionId },
+      });
       return response.data;
     } catch (error) {
       throw new Error(`Start recording failed: ${error.message}`);
@@ -64,11 +70,13 @@ export class ApiService {
   }
 
   /**
-   * Stop recording session
+   * Stop recording session (default: this app's session, the one processFrame sends to)
    */
-  static async stopRecording(serverUrl) {
+  static async stopRecording(serverUrl, sessionId = SESSION_ID) {
     try {
-      const response = await axios.post(`${serverUrl}/api/stop-recording`);
+      const response = await axios.post(`${serverUrl}/api/stop-recording`, null, {
+        params: { session_id: sessionId },
+      });
       return response.data;
     } catch (error) {
       throw new Error(`Stop recording failed: ${error.message}`);
@@ -76,11 +84,13 @@ export class ApiService {
   }
 
   /**
-   * Get recording status
+   * Get recording status (default: this app's session, the one processFrame sends to)
    */
-  static async getRecordingStatus(serverUrl) {
+  static async getRecordingStatus(serverUrl, sessionId = SESSION_ID) {
     try {
-      const response = await axios.get(`${serverUrl}/api/recording-status`);
+      const response = await axios.get(`${serverUrl}/api/recording-status`, {
+        params: { session_id: sessionId },
+      });
       return response.data;
     } catch (error) {
       throw new Error(`Get recording status failed: ${error.message}`);
@@ -2,11 +2,12 @@ import streamlit as st
 import cv2
 import numpy as np
 from datetime import datetime
-import time
 import os
 import json
 from models.activity_detector import ActivityDetector
 from utils.video_recorder import VideoRecorder
+from utils.recording_files import RecordingFileServer
+from utils.live_pipeline import LivePipeline
 from utils.audio_alert import AudioAlert
 
 # Page configuration
@@ -49,11 +50,24 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Recording file server (streams recordings with HTTP Range, no authentication).
+# It listens on 127.0.0.1 by default, so its links only work in a browser on
+# this machine. For other browsers put it behind a proxy (DMS_RECORDING_SERVER_URL
+# = the URL browsers reach it at) - listening on another host also requires
+# the URL. DMS_RECORDING_INLINE_MAX_MB > 0 opts in to serving smaller
+# recordings through Streamlit instead (read into memory, works anywhere)
+RECORDING_SERVER_HOST = os.environ.get("DMS_RECORDING_SERVER_HOST") or "127.0.0.1"
+RECORDING_SERVER_PORT = int(os.environ.get("DMS_RECORDING_SERVER_PORT") or 0)
+RECORDING_SERVER_URL = os.environ.get("DMS_RECORDING_SERVER_URL") or None
+RECORDING_INLINE_MAX_MB = float(os.environ.get("DMS_RECORDING_INLINE_MAX_MB") or 0)
+
 # Initialize session state
 if 'detector' not in st.session_state:
     st.session_state.detector = None
 if 'recorder' not in st.session_state:
-    st.session_state.recorder = VideoRecorder()
+    # mp4 encoding on a background thread; if it falls behind, the oldest
+    # queued frames are dropped rather than slowing down monitoring
+    st.session_state.recorder = VideoRecorder(async_write=True, overflow="drop_oldest")
 if 'audio_alert' not in st.session_state:
     st.session_state.audio_alert = AudioAlert()
 if 'is_running' not in st.session_state:
@@ -74,6 +88,58 @@ def initialize_detector(confidence_threshold):
         )
     return detector
 
+@st.cache_resource
+def get_recording_server():
+    """Server streaming recordings (HTTP Range) - one per Streamlit process"""
+    return RecordingFileServer(
+        st.session_state.recorder.output_dir,
+        host=RECORDING_SERVER_HOST,
+        port=RECORDING_SERVER_PORT,
+        public_url=RECORDING_SERVER_URL
+    ).start()
+
+def show_recording_files(video_file, log_file):
+    """
+    Play and offer downloads of a recording, streamed from disk instead of read into memory
+    
+    Only with DMS_RECORDING_INLINE_MAX_MB set (opt-in) are files up to that
+    size served by Streamlit instead while the recording server is local-only.
+    """
+    recording_server = get_recording_server()
+    
+    def inline(path):
+        return (not recording_server.remote_access and RECORDING_INLINE_MAX_MB > 0
+                and os.path.getsize(path) <= RECORDING_INLINE_MAX_MB * 1024 * 1024)
+    
+    if video_file and os.path.exists(video_file):
+        file_size_mb = os.path.getsize(video_file) / (1024 * 1024)
+        if inline(video_file):
+            st.video(video_file)
+            with open(video_file, 'rb') as f:
+                st.download_button("🎥 Download Video Recording", data=f,
+                                   file_name=os.path.basename(video_file), mime="video/mp4")
+        else:
+            st.video(recording_server.url(video_file))
+            st.markdown(f"[🎥 Download Video Recording]({recording_server.url(video_file, download=True)})")
+        
+        # Show video info
+        st.info(f"📹 Video saved: `{os.path.basename(video_file)}`\n\n📊 Size: {file_size_mb:.2f} MB")
+    if log_file and os.path.exists(log_file):
+        if inline(log_file):
+            with open(log_file, 'rb') as f:
+                st.download_button("📝 Download Activity Log", data=f,
+                                   file_name=os.path.basename(log_file), mime="application/x-ndjson")
+        else:
+            st.markdown(f"[📝 Download Activity Log]({recording_server.url(log_file, download=True)})")
+    
+    if recording_server.remote_access:
+        st.caption(f"⚠️ Recordings are served without authentication at {recording_server.public_url} - "
+                   "protect that URL (e.g. at the proxy)")
+    else:
+        st.caption("Recordings are streamed from this machine only (127.0.0.1) - for browsers on "
+                   "other machines set DMS_RECORDING_SERVER_URL (see PROJECT_STRUCTURE.md); "
+                   "the recording server has no authentication")
+
 def main():
     # Header
     st.markdown('<p class="main-header">🚗 Driver Monitoring System (DMS)</p>', unsafe_allow_html=True)
@@ -110,10 +176,38 @@ def main():
             help="OPTIMIZED at 0.3 for best detection (lower = more sensitive)"
         )
         st.caption("✅ **Default (0.3)** - Optimized for accurate eye & head detection")
+        track_keypoints = st.checkbox(
+            "Keypoint tracking",
+            value=False,
+            help="Run pose inference every few frames and track face/shoulder keypoints with optical flow in between (much less CPU, eye state refreshed on inference frames)"
+        )
+        roi_inference = st.checkbox(
+            "Driver ROI crop",
+            value=False,
+            help="After the driver is found, run detection on a crop around them at reduced resolution (full frame again when the driver is lost)"
+        )
         
         # Recording settings
         st.subheader("📹 Recording Settings")
         fps = st.slider("Recording FPS", min_value=10, max_value=30, value=20)
+        annotate_frames = st.checkbox(
+            "Draw annotations",
+            value=True,
+            help="Draw skeleton, box and status on the displayed and recorded frames (off = raw camera frames, faster)"
+        )
+        continuous_recording = st.checkbox(
+            "Continuous recording",
+            value=True,
+            help="Record the whole session to one video"
+        )
+        event_clips = st.checkbox(
+            "Event clips",
+            value=False,
+            help="Save a short clip around every alarm (pre-roll kept in memory)"
+        )
+        if event_clips:
+            pre_event_seconds = st.slider("Seconds before alarm", min_value=2, max_value=30, value=10)
+            post_event_seconds = st.slider("Seconds after alarm", min_value=2, max_value=30, value=10)
         
         # Audio alert settings
         st.subheader("🔊 Audio Alerts")
@@ -174,6 +268,7 @@ def main():
         alert_level_placeholder = st.empty()
         confidence_placeholder = st.empty()
         frame_count_placeholder = st.empty()
+        stage_fps_placeholder = st.empty()
         recording_status_placeholder = st.empty()
         
         st.markdown("---")
@@ -210,6 +305,9 @@ def main():
     # Stop monitoring
     if stop_button:
         st.session_state.is_running = False
+        if st.session_state.get('pipeline') is not None:
+            st.session_state.pipeline.stop()
+            st.session_state.pipeline = None
         
         # Stop recording if active
         if st.session_state.recorder.is_recording():
@@ -222,22 +320,9 @@ def main():
                 st.success("✅ Monitoring stopped! Session summary:")
                 st.json(summary)
                 
-                # Provide VIDEO download button
-                if video_file and os.path.exists(video_file):
-                    with open(video_file, 'rb') as f:
-                        video_bytes = f.read()
-                        st.download_button(
-                            label="🎥 Download Video Recording",
-                            data=video_bytes,
-                            file_name=os.path.basename(video_file),
-                            mime="video/mp4",
-                            help="Download the recorded video with all detections and annotations"
-                        )
-                    
-                    # Show video info
-                    file_size_mb = os.path.getsize(video_file) / (1024 * 1024)
-                    st.info(f"📹 Video saved: `{os.path.basename(video_file)}`\n\n📊 Size: {file_size_mb:.2f} MB")
-                else:
+                # Play / download the VIDEO (streamed with range requests)
+                show_recording_files(video_file, log_file)
+                if video_file and not os.path.exists(video_file):
                     st.warning("⚠️ Video file not found. Recording may have failed.")
         else:
             st.info("Monitoring stopped")
@@ -270,155 +355,175 @@ def main():
         
         # Start recording
         if not st.session_state.recorder.is_recording():
-            video_file = st.session_state.recorder.start_recording(frame_width, frame_height, fps)
-            st.info(f"📹 Recording started: {os.path.basename(video_file)}")
+            recorder = st.session_state.recorder
+            recorder.event_clips = event_clips
+            if event_clips:
+                recorder.pre_event_seconds = pre_event_seconds
+                recorder.post_event_seconds = post_event_seconds
+            video_file = recorder.start_recording(frame_width, frame_height, fps,
+                                                  write_video=continuous_recording)
+            if video_file:
+                st.info(f"📹 Recording started: {os.path.basename(video_file)}")
+            if event_clips:
+                st.info(f"🎬 Event clips: {pre_event_seconds}s before / {post_event_seconds}s after each alarm")
         
-        # Process frames
-        while st.session_state.is_running:
-            ret, frame = cap.read()
-            
-            if not ret:
-                st.warning("⚠️ End of video or cannot read frame")
-                st.session_state.is_running = False
-                break
-            
-            # Process frame with activity detector
-            annotated_frame, activity, confidence, details = st.session_state.detector.process_frame(frame)
-            
-            # Record frame and log activity
-            st.session_state.recorder.write_frame(annotated_frame)
-            st.session_state.recorder.log_activity(activity, confidence, details)
-            
-            # Update statistics
-            st.session_state.frame_count += 1
-            st.session_state.activity_history.append({
-                'frame': st.session_state.frame_count,
-                'activity': activity,
-                'confidence': confidence
-            })
-            
-            # Keep only last 50 activities
-            if len(st.session_state.activity_history) > 50:
-                st.session_state.activity_history.pop(0)
-            
-            # Display frame
-            video_placeholder.image(
-                cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB),
-                channels="RGB",
-                use_column_width=True
-            )
-            
-            # Update real-time stats (OPTIMIZED)
-            behavior_display = activity.replace('_', ' ').title()
-            alert_level = details.get('alert_level', 'SAFE')
-            danger_level = details.get('danger', 'LOW')
-            trigger_alarm = details.get('trigger_alarm', False)
-            eyes_closed_duration = details.get('eyes_closed_duration', 0.0)
-            looking_down_duration = details.get('looking_down_duration', 0.0)
-            alarm_reason = details.get('alarm_reason', behavior_display)
-            
-            # Trigger audio alert if needed (BEEP BEEP BEEP!)
-            if st.session_state.audio_enabled and trigger_alarm:
+        # Capture and inference run in their own threads; this loop only
+        # displays the newest result
+        pipeline = LivePipeline(
+            cap, st.session_state.detector, st.session_state.recorder,
+            annotate=annotate_frames, track=track_keypoints, roi=roi_inference,
+            drop_frames=video_source == "Webcam"
+        ).start()
+        st.session_state.pipeline = pipeline
+        last_sequence = 0
+        
+        try:
+            while st.session_state.is_running:
+                latest = pipeline.next_result(last_sequence)
+                if latest is None:
+                    if pipeline.finished:
+                        if pipeline.error is not None:
+                            st.error(f"❌ Processing error: {pipeline.error}")
+                        st.warning("⚠️ End of video or cannot read frame")
+                        st.session_state.is_running = False
+                        break
+                    continue
+                last_sequence, annotated_frame, result = latest
+                activity, confidence, details = result['activity'], result['confidence'], result['details']
+                
+                # Update statistics
+                st.session_state.frame_count = pipeline.frames_processed
+                st.session_state.activity_history = list(pipeline.history)
+                
+                # Display frame
+                video_placeholder.image(
+                    cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB),
+                    channels="RGB",
+                    use_column_width=True
+                )
+                pipeline.display_rate.tick()
+                
+                # Update real-time stats (OPTIMIZED)
+                behavior_display = activity.replace('_', ' ').title()
+                alert_level = details.alert_level.name
+                danger_level = details.danger.name
+                trigger_alarm = details.trigger_alarm
+                eyes_closed_duration = details.eyes_closed_duration
+                looking_down_duration = details.looking_down_duration
+                alarm_reason = details.alarm_reason or behavior_display
+                
+                # Trigger audio alert if needed (BEEP BEEP BEEP!)
+                if st.session_state.audio_enabled and trigger_alarm:
+                    if alert_level == "CRITICAL":
+                        st.session_state.audio_alert.play_critical_alert()
+                    elif alert_level == "WARNING":
+                        st.session_state.audio_alert.play_warning_alert()
+                
+                # Show critical alerts with duration info
                 if alert_level == "CRITICAL":
-                    st.session_state.audio_alert.play_critical_alert()
+                    if eyes_closed_duration > 0:
+                        alert_placeholder.error(f"🚨 **CRITICAL ALARM!**\n\n👁️ **Eyes closed for {eyes_closed_duration:.1f} seconds!**\n\n🔊 BEEP BEEP BEEP")
+                    elif looking_down_duration > 0:
+                        alert_placeholder.error(f"🚨 **CRITICAL ALARM!**\n\n📱 **Looking down for {looking_down_duration:.1f} seconds!**\n\n🔊 BEEP BEEP BEEP")
+                    else:
+                        alert_placeholder.error(f"🚨 **CRITICAL ALARM:** {behavior_display}\n\n🔊 BEEP BEEP BEEP")
                 elif alert_level == "WARNING":
-                    st.session_state.audio_alert.play_warning_alert()
-            
-            # Show critical alerts with duration info
-            if alert_level == "CRITICAL":
-                if eyes_closed_duration > 0:
-                    alert_placeholder.error(f"🚨 **CRITICAL ALARM!**\n\n👁️ **Eyes closed for {eyes_closed_duration:.1f} seconds!**\n\n🔊 BEEP BEEP BEEP")
-                elif looking_down_duration > 0:
-                    alert_placeholder.error(f"🚨 **CRITICAL ALARM!**\n\n📱 **Looking down for {looking_down_duration:.1f} seconds!**\n\n🔊 BEEP BEEP BEEP")
-                else:
-                    alert_placeholder.error(f"🚨 **CRITICAL ALARM:** {behavior_display}\n\n🔊 BEEP BEEP BEEP")
-            elif alert_level == "WARNING":
-                if eyes_closed_duration > 0:
-                    alert_placeholder.warning(f"⚠️ **WARNING:** Eyes closing...\n\n👁️ **{eyes_closed_duration:.1f}s** (Alarm at 5.0s)")
-                elif looking_down_duration > 0:
-                    alert_placeholder.warning(f"⚠️ **WARNING:** Looking down...\n\n📱 **{looking_down_duration:.1f}s** (Alarm at 5.0s)")
+                    if eyes_closed_duration > 0:
+                        alert_placeholder.warning(f"⚠️ **WARNING:** Eyes closing...\n\n👁️ **{eyes_closed_duration:.1f}s** (Alarm at 5.0s)")
+                    elif looking_down_duration > 0:
+                        alert_placeholder.warning(f"⚠️ **WARNING:** Looking down...\n\n📱 **{looking_down_duration:.1f}s** (Alarm at 5.0s)")
+                    else:
+                        alert_placeholder.warning(f"⚠️ **WARNING:** {behavior_display}")
+                elif alert_level == "SAFE":
+                    alert_placeholder.success(f"✅ **SAFE:** {alarm_reason}")
                 else:
-                    alert_placeholder.warning(f"⚠️ **WARNING:** {behavior_display}")
-            elif alert_level == "SAFE":
-                alert_placeholder.success(f"✅ **SAFE:** {alarm_reason}")
-            else:
-                alert_placeholder.info(f"ℹ️ {alarm_reason}")
-            
-            # Color code based on alert level
-            behavior_colors = {
-                'SAFE': '#00ff00',
-                'CAUTION': '#ffff00', 
-                'WARNING': '#ffa500',
-                'CRITICAL': '#ff0000'
-            }
-            behavior_color = behavior_colors.get(alert_level, '#1f77b4')
-            
-            with current_behavior_placeholder.container():
-                st.markdown(f"""
-                    <div class="metric-card">
-                        <h3>🎯 Current Behavior</h3>
-                        <h2 style="color: {behavior_color};">{behavior_display}</h2>
-                    </div>
-                """, unsafe_allow_html=True)
-            
-            with alert_level_placeholder.container():
-                alert_icons = {
-                    'SAFE': '🟢',
-                    'CAUTION': '🟡',
-                    'WARNING': '🟠',
-                    'CRITICAL': '🔴'
+                    alert_placeholder.info(f"ℹ️ {alarm_reason}")
+                
+                # Color code based on alert level
+                behavior_colors = {
+                    'SAFE': '#00ff00',
+                    'CAUTION': '#ffff00', 
+                    'WARNING': '#ffa500',
+                    'CRITICAL': '#ff0000'
                 }
-                icon = alert_icons.get(alert_level, '⚪')
+                behavior_color = behavior_colors.get(alert_level, '#1f77b4')
                 
-                # Add duration info if applicable
-                if eyes_closed_duration > 0:
-                    st.metric("Alert Level", f"{icon} {alert_level}", delta=f"👁️ Eyes: {eyes_closed_duration:.1f}s")
-                elif looking_down_duration > 0:
-                    st.metric("Alert Level", f"{icon} {alert_level}", delta=f"📱 Down: {looking_down_duration:.1f}s")
-                else:
-                    st.metric("Alert Level", f"{icon} {alert_level}")
-            
-            with confidence_placeholder.container():
-                st.metric("Confidence", f"{confidence:.2%}")
-            
-            with frame_count_placeholder.container():
-                st.metric("Frames Processed", st.session_state.frame_count)
-            
-            with recording_status_placeholder.container():
-                st.markdown("""
-                    <div class="status-box recording">
-                        <strong>🔴 RECORDING</strong>
-                    </div>
-                """, unsafe_allow_html=True)
-            
-            # Update behavior timeline
-            if st.session_state.activity_history:
-                timeline_text = "**Recent Behaviors:**\n\n"
-                for item in reversed(st.session_state.activity_history[-10:]):
-                    behavior_name = item['activity'].replace('_', ' ').title()
-                    
-                    # Add emoji based on behavior
-                    if 'eyes_on_road' in item['activity']:
-                        emoji = '✅'
-                    elif 'eyes_closed' in item['activity'] or 'sleeping' in item['activity'] or 'looking_down' in item['activity']:
-                        emoji = '🚨'
-                    elif 'drowsy' in item['activity'] or ('looking' in item['activity'] and 'distracted' in item['activity']):
-                        emoji = '⚠️'
+                with current_behavior_placeholder.container():
+                    st.markdown(f"""
+                        <div class="metric-card">
+                            <h3>🎯 Current Behavior</h3>
+                            <h2 style="color: {behavior_color};">{behavior_display}</h2>
+                        </div>
+                    """, unsafe_allow_html=True)
+                
+                with alert_level_placeholder.container():
+                    alert_icons = {
+                        'SAFE': '🟢',
+                        'CAUTION': '🟡',
+                        'WARNING': '🟠',
+                        'CRITICAL': '🔴'
+                    }
+                    icon = alert_icons.get(alert_level, '⚪')
+                
+                    # Add duration info if applicable
+                    if eyes_closed_duration > 0:
+                        st.metric("Alert Level", f"{icon} {alert_level}", delta=f"👁️ Eyes: {eyes_closed_duration:.1f}s")
+                    elif looking_down_duration > 0:
+                        st.metric("Alert Level", f"{icon} {alert_level}", delta=f"📱 Down: {looking_down_duration:.1f}s")
                     else:
-                        emoji = 'ℹ️'
-                    
-                    timeline_text += f"{emoji} **{behavior_name}** ({item['confidence']:.2f})\n\n"
-                behavior_timeline_placeholder.markdown(timeline_text)
-            
-            # Small delay to control frame rate
-            time.sleep(0.03)  # ~30 FPS display
+                        st.metric("Alert Level", f"{icon} {alert_level}")
+                
+                with confidence_placeholder.container():
+                    st.metric("Confidence", f"{confidence:.2%}")
+                
+                with stage_fps_placeholder.container():
+                    stats = pipeline.get_stats()
+                    st.caption(f"⚡ Capture {stats['capture_fps']:.1f} FPS · Inference {stats['inference_fps']:.1f} FPS · "
+                               f"Display {stats['display_fps']:.1f} FPS · {stats['frames_dropped']} frames skipped")
+                
+                with frame_count_placeholder.container():
+                    tracking_stats = st.session_state.detector.get_tracking_stats() if track_keypoints else None
+                    if tracking_stats:
+                        st.metric("Frames Processed", st.session_state.frame_count,
+                                  delta=f"{tracking_stats['skipped_inferences']} inferences skipped (N={tracking_stats['current_interval']})")
+                    else:
+                        st.metric("Frames Processed", st.session_state.frame_count)
+                
+                with recording_status_placeholder.container():
+                    st.markdown("""
+                        <div class="status-box recording">
+                            <strong>🔴 RECORDING</strong>
+                        </div>
+                    """, unsafe_allow_html=True)
+                
+                # Update behavior timeline
+                if st.session_state.activity_history:
+                    timeline_text = "**Recent Behaviors:**\n\n"
+                    for item in reversed(st.session_state.activity_history[-10:]):
+                        behavior_name = item['activity'].replace('_', ' ').title()
+                
+                        # Add emoji based on behavior
+                        if 'eyes_on_road' in item['activity']:
+                            emoji = '✅'
+                        elif 'eyes_closed' in item['activity'] or 'sleeping' in item['activity'] or 'looking_down' in item['activity']:
+                            emoji = '🚨'
+                        elif 'drowsy' in item['activity'] or ('looking' in item['activity'] and 'distracted' in item['activity']):
+                            emoji = '⚠️'
+                        else:
+                            emoji = 'ℹ️'
+                
+                        timeline_text += f"{emoji} **{behavior_name}** ({item['confidence']:.2f})\n\n"
+                    behavior_timeline_placeholder.markdown(timeline_text)
+        finally:
+            # Also runs when Streamlit interrupts the script (Stop button rerun)
+            pipeline.stop()
         
         # Cleanup
         cap.release()
         
         # Stop recording
         if st.session_state.recorder.is_recording():
-            log_file, csv_file, summary_file = st.session_state.recorder.stop_recording()
+            video_file, log_file, summary_file = st.session_state.recorder.stop_recording()
             
             if summary_file and os.path.exists(summary_file):
                 with open(summary_file, 'r') as f:
@@ -439,6 +544,8 @@ def main():
                 with col_summary2:
                     st.write("**Activity Distribution:**")
                     st.json(summary['activity_counts'])
+                
+                show_recording_files(video_file, log_file)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,113 @@
+"""
+Backend configuration for the Driver Monitoring System
+Every value can be overridden with an environment variable (DMS_*)
+"""
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting from the environment (1/0, true/false, yes/no)"""
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_str(name: str, default: str) -> str:
+    """Read a string setting from the environment"""
+    value = os.environ.get(name)
+    return value if value not in (None, "") else default
+
+
+# Model settings
+MODEL_NAME = _env_str("DMS_MODEL_NAME", "yolo11n-pose.pt")
+CONFIDENCE_THRESHOLD = _env_float("DMS_CONFIDENCE_THRESHOLD", 0.3)
+
+# Inference backend: "pytorch", "onnx" (ONNX Runtime) or "openvino" (CPU).
+# Exported models are cached in MODEL_CACHE_DIR; INT8 selects a quantized export.
+# MODEL_IMGSZ is the full-frame inference size (and the export size)
+INFERENCE_BACKEND = _env_str("DMS_INFERENCE_BACKEND", "pytorch")
+INT8 = _env_bool("DMS_INT8", False)
+MODEL_CACHE_DIR = _env_str("DMS_MODEL_CACHE_DIR", "model_cache")
+MODEL_IMGSZ = _env_int("DMS_MODEL_IMGSZ", 640)
+
+# Reduced-resolution decode: JPEGs are decoded at 1/2, 1/4 or 1/8 scale when
+# the long side still covers the inference size (MODEL_IMGSZ, or a session's
+# own imgsz); keypoints are reported in original image coordinates
+REDUCED_DECODE = _env_bool("DMS_REDUCED_DECODE", True)
+
+# Startup: the PyTorch model is loaded from a cached checkpoint with layers
+# already fused, and every model runs WARMUP_RUNS blank-frame inferences
+# before /health/ready reports ready
+FUSE_MODEL = _env_bool("DMS_FUSE_MODEL", True)
+WARMUP_RUNS = _env_int("DMS_WARMUP_RUNS", 2)
+
+# Keypoint tracking: run pose inference only every N frames per session and
+# track face/shoulder keypoints with optical flow in between. N starts at
+# TRACKING_INTERVAL and adapts to driver motion up to MAX_TRACKING_INTERVAL.
+# Thread mode only: the tracker keeps the previous grayscale frame in the
+# session state, which process mode would pickle to a worker and back with
+# every frame, so it is ignored when EXECUTOR_MODE is "process"
+TRACK_KEYPOINTS = _env_bool("DMS_TRACK_KEYPOINTS", False)
+TRACKING_INTERVAL = _env_int("DMS_TRACKING_INTERVAL", 5)
+MAX_TRACKING_INTERVAL = _env_int("DMS_MAX_TRACKING_INTERVAL", 15)
+
+# Driver-ROI inference: after a confident detection, run the next frames on
+# a crop around the driver at ROI_IMGSZ, with a full-frame pass every
+# ROI_REACQUIRE_INTERVAL inferences (and whenever the driver is lost)
+ROI_INFERENCE = _env_bool("DMS_ROI_INFERENCE", False)
+ROI_IMGSZ = _env_int("DMS_ROI_IMGSZ", 320)
+ROI_REACQUIRE_INTERVAL = _env_int("DMS_ROI_REACQUIRE_INTERVAL", 30)
+
+# Micro-batching inference scheduler
+# Frames from all sessions are collected for at most BATCH_MAX_WAIT_MS
+# (or until BATCH_MAX_SIZE frames are waiting) and run in one forward pass
+BATCH_MAX_SIZE = _env_int("DMS_BATCH_MAX_SIZE", 8)
+BATCH_MAX_WAIT_MS = _env_float("DMS_BATCH_MAX_WAIT_MS", 10.0)
+
+# Worker pool for decode / inference / encode ("thread" or "process")
+# In process mode every worker loads its own copy of the model
+EXECUTOR_MODE = _env_str("DMS_EXECUTOR_MODE", "thread")
+EXECUTOR_WORKERS = _env_int("DMS_EXECUTOR_WORKERS", 2)
+
+# Sessions: REST clients have no disconnect event, so their per-driver
+# state is dropped after this many idle seconds
+SESSION_IDLE_TIMEOUT = _env_float("DMS_SESSION_IDLE_TIMEOUT", 300.0)
+
+# Drowsiness trends: seconds covered by the per-session sliding window
+# behind details["fatigue"] (PERCLOS, closure / head-down event counts)
+FATIGUE_WINDOW = _env_float("DMS_FATIGUE_WINDOW", 60.0)
+
+# Send an annotated JPEG back by default. Clients can switch their session
+# to results-only (keypoints, box, overlay primitives) to skip drawing and
+# JPEG encoding on the server entirely
+ANNOTATE_FRAMES = _env_bool("DMS_ANNOTATE_FRAMES", True)
+
+# Per-session ingest queue: frames allowed to wait while one is processed.
+# When full the oldest frame is dropped ("latest frame wins")
+INGEST_QUEUE_SIZE = _env_int("DMS_INGEST_QUEUE_SIZE", 1)
+
+# Offline video analysis (/api/process-video): frames per inference batch and
+# frames buffered between the decode, inference and writer stages
+VIDEO_BATCH_SIZE = _env_int("DMS_VIDEO_BATCH_SIZE", 8)
+VIDEO_QUEUE_SIZE = _env_int("DMS_VIDEO_QUEUE_SIZE", 32)
+
+# Live recording (/api/start-recording): every session records to its own
+# files under RECORDINGS_DIR, sized from its first frame. Frames are
+# decoded and written on the session's recorder thread; up to
+# RECORDING_QUEUE_SIZE frames may wait before the oldest is dropped
+RECORDINGS_DIR = _env_str("DMS_RECORDINGS_DIR", "recordings")
+RECORDING_FPS = _env_float("DMS_RECORDING_FPS", 15.0)
+RECORDING_QUEUE_SIZE = _env_int("DMS_RECORDING_QUEUE_SIZE", 32)
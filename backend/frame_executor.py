@@ -0,0 +1,393 @@
+"""
+Frame Executor - Runs all CPU-bound frame work off the asyncio event loop
+Decode (base64 + cv2.imdecode), YOLO inference and encode (cv2.imencode + base64)
+go through a worker pool so one slow frame never stalls other sockets
+
+Modes:
+    thread  - ThreadPoolExecutor sharing the server's ActivityDetector
+              (decode/encode run in parallel, inference is serialized by a lock)
+    process - ProcessPoolExecutor where every worker process loads its own
+              ActivityDetector (true parallel inference, more memory)
+"""
+import asyncio
+import base64
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+# Detector used by the worker functions below. In thread mode this is the
+# server's detector, in process mode every worker process loads its own.
+_worker_detector = None
+_worker_lock = threading.Lock()
+
+
+def _init_process_worker(model_name: str, confidence_threshold: float, detector_options: Dict,
+                         warmup_runs: int = 0):
+    """Process pool initializer: load (and warm up) one ActivityDetector per worker process"""
+    global _worker_detector
+    from models.activity_detector import ActivityDetector
+
+    _worker_detector = ActivityDetector(
+        model_name=model_name,
+        confidence_threshold=confidence_threshold,
+        **detector_options
+    )
+    if warmup_runs > 0:
+        _worker_detector.warmup(warmup_runs)
+
+
+def _warmup_worker(runs: int) -> float:
+    """Warm up the shared detector (thread mode), returns seconds spent"""
+    with _worker_lock:
+        return _worker_detector.warmup(runs)
+
+
+def _worker_ready() -> int:
+    """No-op job: returns once this worker process has loaded its model"""
+    return os.getpid()
+
+
+def jpeg_size(data) -> Optional[tuple]:
+    """
+    Read (width, height) from a JPEG's frame header without decoding it
+
+    Args:
+        data: Image bytes (bytes, memoryview or uint8 array); read through a
+              byte memoryview so every byte is a Python int and the shifts
+              below can't overflow (NumPy 2 keeps uint8 scalars as uint8)
+
+    Returns:
+        (width, height), or None if data is not a JPEG (or the header is cut off)
+    """
+    data = memoryview(data).cast('B')
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte
+            pos += 1
+            continue
+        if 0xD0 <= marker <= 0xD9 or marker == 0x01:
+            # Markers without a length field
+            pos += 2
+            continue
+        length = (data[pos + 2] << 8) | data[pos + 3]
+        # SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = (data[pos + 5] << 8) | data[pos + 6]
+            width = (data[pos + 7] << 8) | data[pos + 8]
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def reduction_factor(width: int, height: int, target_size: int) -> int:
+    """
+    Largest decode reduction (1, 2, 4 or 8) that keeps the long side at
+    least target_size, so the model input is not upscaled
+    """
+    long_side = max(width, height)
+    for factor in (8, 4, 2):
+        if long_side // factor >= target_size:
+            return factor
+    return 1
+
+
+# cv2.imread flags for JPEG DCT-domain downscaling
+_REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+def decode_frame(data, offset: int = 0, timings: Optional[Dict] = None) -> Optional[np.ndarray]:
+    """
+    Decode an incoming image to a BGR frame
+
+    Args:
+        data: Raw JPEG/PNG bytes, a base64 string, or a base64 data URL
+        offset: Start of the image inside raw bytes (skips a protocol header
+                without copying the buffer)
+        timings: Optional dict that receives base64_decode / imdecode seconds
+
+    Returns:
+        Decoded frame, or None if the data is not a valid image
+    """
+    return decode_frame_reduced(data, offset, timings)[0]
+
+
+def decode_frame_reduced(data, offset: int = 0, timings: Optional[Dict] = None,
+                         target_size: Optional[int] = None):
+    """
+    Decode an incoming image at the lowest resolution the model still needs
+
+    JPEGs larger than needed are decoded with IMREAD_REDUCED_COLOR_2/4/8
+    (downscaled while decoding - a fraction of the work of a full decode);
+    other formats are decoded fully and then downscaled.
+
+    Args:
+        data, offset, timings: See decode_frame
+        target_size: Inference input size; the decoded long side stays at
+                     least this large (None = full resolution)
+
+    Returns:
+        (frame, scale): the frame (None if invalid) and the factor that maps
+        its pixel coordinates back to the original image
+    """
+    try:
+        if isinstance(data, str):
+            stage_start = time.perf_counter()
+            data = base64.b64decode(data.split(",", 1)[1] if "," in data else data)
+            if timings is not None:
+                timings['base64_decode'] = time.perf_counter() - stage_start
+        else:
+            data = memoryview(data)[offset:]
+
+        nparr = np.frombuffer(data, np.uint8)
+        if nparr.size == 0:
+            return None, 1.0
+        stage_start = time.perf_counter()
+        factor = 1
+        size = jpeg_size(data) if target_size else None
+        if size is not None:
+            factor = reduction_factor(size[0], size[1], target_size)
+        frame = cv2.imdecode(nparr, _REDUCED_DECODE_FLAGS.get(factor, cv2.IMREAD_COLOR))
+        if frame is not None and target_size and size is None:
+            # Not a JPEG: scaled decode path
+            factor = reduction_factor(frame.shape[1], frame.shape[0], target_size)
+            if factor > 1:
+                frame = cv2.resize(frame, (frame.shape[1] // factor, frame.shape[0] // factor),
+                                   interpolation=cv2.INTER_AREA)
+        if timings is not None:
+            timings['imdecode'] = time.perf_counter() - stage_start
+        return frame, float(factor)
+    except (ValueError, cv2.error):
+        return None, 1.0
+
+
+def encode_frame(frame: np.ndarray, jpeg_quality: int = 80) -> bytes:
+    """Encode a frame to JPEG bytes"""
+    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return buffer.tobytes()
+
+
+def encode_frame_data_url(frame: np.ndarray, jpeg_quality: int = 80) -> str:
+    """Encode a frame to a base64 JPEG data URL"""
+    img_base64 = base64.b64encode(encode_frame(frame, jpeg_quality)).decode('utf-8')
+    return f"data:image/jpeg;base64,{img_base64}"
+
+
+def build_pose_payload(detection: Dict) -> Dict:
+    """
+    Compact, JSON-ready pose result a client can draw itself:
+    the 17 COCO keypoints (x, y, confidence), the person box and
+    the overlay primitives (label, color, alert level)
+    """
+    keypoints = detection['keypoints']
+    box = detection['box']
+    overlay = _worker_detector.get_overlay(
+        detection['activity'], detection['confidence'], detection['details']
+    )
+    blue, green, red = overlay['color']
+
+    return {
+        "keypoints": np.round(keypoints, 2).tolist() if keypoints is not None else None,
+        "box": np.round(box, 1).tolist() if box is not None else None,
+        "overlay": {
+            "label": overlay['label'],
+            "color": f"#{red:02x}{green:02x}{blue:02x}",
+            "alert_level": overlay['alert_level']
+        }
+    }
+
+
+def process_jobs(jobs: List[Dict]) -> List[Optional[Dict]]:
+    """
+    Run the full frame path for a batch of jobs: decode → infer → encode
+
+    Each job is a dict with:
+        data: Encoded image (see decode_frame)
+        data_offset: Start of the image inside data (default 0)
+        session: SessionState of the driver, or None for the detector default
+        jpeg_quality: Quality of the returned annotated JPEG
+        image_format: "data_url" (base64 string, default) or "jpeg" (raw bytes)
+        annotate: False skips drawing and encoding entirely (results only)
+        imgsz: Inference input size for this frame (None = detector default)
+        reduced_decode: Decode JPEGs only as large as imgsz needs
+                        (keypoints are still returned in original coordinates)
+
+    Returns:
+        One result per job (None when the image could not be decoded).
+        Results carry the annotated frame in the requested format (None in
+        results-only mode), the compact pose payload, the updated session
+        (so session state survives a trip through a worker process) and
+        per-stage timings in seconds (merged into the server's metrics).
+    """
+    decode_timings = [{} for _ in jobs]
+    sizes = [job.get('imgsz') or _worker_detector.imgsz for job in jobs]
+    decoded = [
+        decode_frame_reduced(
+            job['data'], job.get('data_offset', 0), timings,
+            target_size=size if job.get('reduced_decode') else None
+        )
+        for job, timings, size in zip(jobs, decode_timings, sizes)
+    ]
+    frames = [frame for frame, _ in decoded]
+    valid = [i for i, frame in enumerate(frames) if frame is not None]
+
+    results: List[Optional[Dict]] = [None] * len(jobs)
+    if not valid:
+        return results
+
+    sessions = [jobs[i].get('session') for i in valid]
+    annotate = [jobs[i].get('annotate', True) for i in valid]
+    with _worker_lock:
+        detections = _worker_detector.process_batch(
+            [frames[i] for i in valid], sessions, annotate=annotate,
+            scales=[decoded[i][1] for i in valid], imgsz=[sizes[i] for i in valid]
+        )
+
+    for i, session, detection in zip(valid, sessions, detections):
+        annotated_frame = detection.pop('annotated_frame')
+        jpeg_quality = jobs[i].get('jpeg_quality', 80)
+        timings = detection['timings']
+        timings.update(decode_timings[i])
+        if annotated_frame is None:
+            detection['annotated_frame'] = None
+        else:
+            stage_start = time.perf_counter()
+            if jobs[i].get('image_format', 'data_url') == 'jpeg':
+                detection['annotated_frame'] = encode_frame(annotated_frame, jpeg_quality)
+            else:
+                detection['annotated_frame'] = encode_frame_data_url(annotated_frame, jpeg_quality)
+            timings['encode'] = time.perf_counter() - stage_start
+        detection['pose'] = build_pose_payload(detection)
+        detection['session'] = session
+        results[i] = detection
+
+    return results
+
+
+class FrameExecutor:
+    """Pluggable worker pool for decode / inference / encode"""
+
+    def __init__(self, mode: str = "thread", workers: int = 2, detector=None,
+                 model_name: str = 'yolo11n-pose.pt', confidence_threshold: float = 0.3,
+                 detector_options: Optional[Dict] = None, warmup_runs: int = 0):
+        """
+        Args:
+            mode: "thread" or "process"
+            workers: Pool size
+            detector: Loaded ActivityDetector (required in thread mode)
+            model_name: Model each worker process loads (process mode)
+            confidence_threshold: Detection threshold for worker processes
+            detector_options: Extra ActivityDetector arguments for worker processes
+                              (keypoint tracking is turned off in process mode)
+            warmup_runs: Blank-frame inferences per model before it counts as ready
+        """
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown executor mode: {mode}")
+        if mode == "thread" and detector is None:
+            raise ValueError("Thread mode needs a loaded detector")
+
+        self.mode = mode
+        self.workers = max(1, int(workers))
+        self.detector = detector
+        self.model_name = model_name
+        self.confidence_threshold = confidence_threshold
+        self.detector_options = detector_options or {}
+        if mode == "process" and self.detector_options.get("track_keypoints"):
+            # The tracker keeps the previous full grayscale frame in the session
+            # state, which would be pickled to the worker and back with every frame
+            print("⚠️ Keypoint tracking is not supported in process mode - disabled")
+            self.detector_options = {**self.detector_options, "track_keypoints": False}
+        self.warmup_runs = max(0, int(warmup_runs))
+        self._pool = None
+
+    def start(self):
+        """Create the worker pool"""
+        global _worker_detector
+
+        if self._pool is not None:
+            return
+
+        if self.mode == "thread":
+            _worker_detector = self.detector
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="frame-worker"
+            )
+        else:
+            # spawn: forking a process that already initialized torch is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+                initargs=(self.model_name, self.confidence_threshold, self.detector_options,
+                          self.warmup_runs)
+            )
+
+    def shutdown(self):
+        """Shut the worker pool down"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def is_running(self) -> bool:
+        """Check if the pool is accepting work"""
+        return self._pool is not None
+
+    async def run(self, fn, *args):
+        """Run any picklable function in the pool without blocking the event loop"""
+        if self._pool is None:
+            raise RuntimeError("Frame executor is not running")
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def warmup(self):
+        """
+        Load and warm up every model before real frames arrive
+
+        Thread mode warms up the shared detector. In process mode one job per
+        worker makes the pool start all processes, each of which loads and
+        warms up its own model in the initializer; jobs are resubmitted until
+        every worker process has answered.
+        """
+        if self.mode == "thread":
+            if self.warmup_runs > 0:
+                await self.run(_warmup_worker, self.warmup_runs)
+            return
+        ready = set(await asyncio.gather(*[self.run(_worker_ready) for _ in range(self.workers)]))
+        while len(ready) < self.workers:
+            await asyncio.sleep(0.05)
+            ready.update(await asyncio.gather(*[self.run(_worker_ready) for _ in range(self.workers)]))
+
+    async def process_jobs(self, jobs: List[Dict]) -> List[Optional[Dict]]:
+        """Decode, infer and encode a batch of jobs in the pool"""
+        return await self.run(process_jobs, jobs)
+
+    @property
+    def inference_lock(self) -> Optional[threading.Lock]:
+        """
+        Lock serializing use of the shared detector (thread mode), so other
+        in-process users such as offline video jobs can share the model
+        """
+        return _worker_lock if self.mode == "thread" else None
+
+    def get_status(self) -> Dict:
+        """Get executor configuration"""
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "running": self.is_running()
+        }
@@ -0,0 +1,106 @@
+"""
+Latest Frame Queue - Bounded per-session ingest queue with drop accounting
+When inference is slower than the phone's capture interval the oldest
+waiting frame is dropped ("latest frame wins"), so alarms are raised for
+what the driver is doing now instead of seconds ago
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, Tuple
+
+
+class QueueClosed(Exception):
+    """Raised by get() once the queue is closed and empty"""
+
+
+class LatestFrameQueue:
+    """Bounded FIFO that drops the oldest frame when full"""
+
+    def __init__(self, maxsize: int = 1):
+        """
+        Args:
+            maxsize: Frames allowed to wait while one is being processed
+        """
+        self.maxsize = max(1, int(maxsize))
+        self._frames = deque()
+        self._not_empty = asyncio.Event()
+        self._closed = False
+
+        # Counters
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self.last_queue_age = 0.0
+        self.max_queue_age = 0.0
+        self.total_queue_age = 0.0
+        self.dequeued = 0
+
+    def put(self, item: Any) -> int:
+        """
+        Add a frame, dropping the oldest waiting one if the queue is full
+
+        Returns:
+            Number of frames dropped to make room
+        """
+        self.received += 1
+        self._frames.append((item, time.perf_counter()))
+        dropped = 0
+        while len(self._frames) > self.maxsize:
+            # Stale frame: discarded before it is ever decoded
+            self._frames.popleft()
+            dropped += 1
+        self.dropped += dropped
+        self._not_empty.set()
+        return dropped
+
+    async def get(self) -> Tuple[Any, float]:
+        """
+        Wait for the next frame
+
+        Returns:
+            (item, queue_age_seconds)
+
+        Raises:
+            QueueClosed: The queue was closed
+        """
+        while not self._frames:
+            if self._closed:
+                raise QueueClosed()
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        item, queued_at = self._frames.popleft()
+        age = time.perf_counter() - queued_at
+
+        self.dequeued += 1
+        self.last_queue_age = age
+        self.max_queue_age = max(self.max_queue_age, age)
+        self.total_queue_age += age
+        return item, age
+
+    def mark_processed(self):
+        """Count a frame whose result was sent back"""
+        self.processed += 1
+
+    def close(self):
+        """Close the queue, discard waiting frames and wake the consumer"""
+        self._closed = True
+        self._frames.clear()
+        self._not_empty.set()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def get_stats(self) -> Dict:
+        """Get ingest counters (JSON serializable)"""
+        return {
+            "frames_received": self.received,
+            "frames_dropped": self.dropped,
+            "frames_processed": self.processed,
+            "queue_depth": len(self._frames),
+            "drop_rate": round(self.dropped / self.received, 3) if self.received else 0.0,
+            "last_queue_age_ms": round(self.last_queue_age * 1000, 1),
+            "average_queue_age_ms": round(self.total_queue_age / self.dequeued * 1000, 1) if self.dequeued else 0.0,
+            "max_queue_age_ms": round(self.max_queue_age * 1000, 1)
+        }
@@ -0,0 +1,185 @@
+"""
+Inference Scheduler - Dynamic micro-batching for concurrent sessions
+Collects frames from all live sessions for a few milliseconds and runs
+them through the detector in a single batched YOLO forward pass
+(dispatched to the FrameExecutor worker pool)
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+
+class InferenceScheduler:
+    """Batches frames from many sessions into one detector call"""
+
+    def __init__(self, executor, max_batch_size: int = 8, max_wait_ms: float = 10.0,
+                 max_concurrent_batches: int = 1):
+        """
+        Args:
+            executor: FrameExecutor that runs decode / inference / encode
+            max_batch_size: Maximum number of frames per forward pass
+            max_wait_ms: Maximum time the first frame of a batch waits for company
+            max_concurrent_batches: Batches allowed in flight (usually the pool size)
+        """
+        self.executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max(1, int(max_concurrent_batches))
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = set()
+
+        # Per-batch occupancy statistics
+        self.batches_run = 0
+        self.frames_processed = 0
+        self.batch_size_histogram: Dict[int, int] = {}
+        self.last_batch_size = 0
+        self.total_queue_wait = 0.0
+        self.total_batch_time = 0.0
+
+    def start(self):
+        """Start the background batching loop (call from the running event loop)"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and fail any frames still waiting"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for task in list(self._in_flight):
+            task.cancel()
+
+        pending = []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._fail(pending, RuntimeError("Inference scheduler stopped"))
+
+    async def submit(self, job: Dict) -> Optional[Dict]:
+        """
+        Queue a frame job for the next batch and wait for its result
+
+        Args:
+            job: Job dict for frame_executor.process_jobs
+                 (data, session, jpeg_quality)
+
+        Returns:
+            Result dict, or None if the image could not be decoded
+        """
+        if self._task is None:
+            raise RuntimeError("Inference scheduler is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        """Collect frames into batches and dispatch them"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            # Wait for a free worker before forming the next batch, so frames
+            # keep accumulating (bigger batches) while all workers are busy
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                # Take whatever is already waiting without yielding
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task):
+        """Release the worker slot of a finished batch"""
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    async def _run_batch(self, batch: List):
+        """Run one batched forward pass and fan results back to the callers"""
+        jobs = [item[0] for item in batch]
+
+        batch_start = time.perf_counter()
+        try:
+            # Keep the event loop free while the model runs
+            results = await self.executor.process_jobs(jobs)
+        except asyncio.CancelledError:
+            self._fail(batch, RuntimeError("Inference scheduler stopped"))
+            raise
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        batch_end = time.perf_counter()
+
+        for (_, future, queued_at), result in zip(batch, results):
+            self.total_queue_wait += batch_start - queued_at
+            if result is not None and 'timings' in result:
+                result['timings']['batch_wait'] = batch_start - queued_at
+            if not future.done():
+                future.set_result(result)
+
+        size = len(batch)
+        self.batches_run += 1
+        self.frames_processed += size
+        self.last_batch_size = size
+        self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+        self.total_batch_time += batch_end - batch_start
+
+    @staticmethod
+    def _fail(batch: List, error: Exception):
+        """Propagate an error to every caller waiting on a batch"""
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def queued_frames(self) -> int:
+        """Frames waiting to join a batch"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def batches_in_flight(self) -> int:
+        """Batches currently running in the executor"""
+        return len(self._in_flight)
+
+    def get_stats(self) -> Dict:
+        """Get batching statistics for throughput/latency tuning"""
+        batches = self.batches_run or 1
+        frames = self.frames_processed or 1
+        avg_batch_size = self.frames_processed / batches
+
+        return {
+            "running": self._task is not None,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "batches_in_flight": self.batches_in_flight(),
+            "queued_frames": self.queued_frames(),
+            "batches_run": self.batches_run,
+            "frames_processed": self.frames_processed,
+            "last_batch_size": self.last_batch_size,
+            "average_batch_size": round(avg_batch_size, 2),
+            "average_occupancy": round(avg_batch_size / self.max_batch_size, 3),
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+            "average_queue_wait_ms": round(self.total_queue_wait / frames * 1000, 2),
+            "average_batch_time_ms": round(self.total_batch_time / batches * 1000, 2)
+        }
@@ -0,0 +1,395 @@
+"""
+WebSocket load generator / capacity benchmark for /ws/monitor
+Opens N synthetic driver sessions that stream frames from a local video
+file at a fixed FPS and measures what one server can sustain.
+
+Frames are sent the way the mobile app sends them: JPEG (quality 70, like
+CameraView's takePictureAsync) as a base64 data URL inside
+{"type": "frame", "data": ...}, or with --protocol binary using the frame
+protocol in wire_protocol.py.
+
+Reports achieved throughput, p50/p95/p99 round-trip latency and drop rate
+(frames the server's latest-frame-wins queue discarded) and saves them as
+JSON so runs can be compared across commits. Runs fully offline.
+
+Usage:
+    python server.py                                  # in another terminal
+    python load_generator.py --video drive.mp4 --clients 8 --fps 5 --duration 30
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+import websockets
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_protocol
+
+
+def load_frames(video_path: str, max_frames: int = 300, max_width: int = 640,
+                jpeg_quality: int = 70) -> List[bytes]:
+    """
+    Read and JPEG-encode frames from a video file up front, so encoding
+    cost never limits the send rate
+
+    Args:
+        video_path: Local video file
+        max_frames: Frames to keep (clients loop over them)
+        max_width: Downscale wider frames to this width (phone capture size)
+        jpeg_quality: JPEG quality (CameraView uses 0.7)
+
+    Returns:
+        List of JPEG byte strings
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Cannot open video: {video_path}")
+
+    frames = []
+    try:
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            height, width = frame.shape[:2]
+            if width > max_width:
+                scale = max_width / width
+                frame = cv2.resize(frame, (max_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            frames.append(buffer.tobytes())
+    finally:
+        cap.release()
+
+    if not frames:
+        raise ValueError(f"No frames could be read from {video_path}")
+    return frames
+
+
+def latency_summary(latencies: List[float]) -> Dict:
+    """Round-trip latency percentiles in milliseconds"""
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+
+    values = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "mean_ms": round(float(values.mean()), 2),
+        "max_ms": round(float(values.max()), 2)
+    }
+
+
+class SyntheticClient:
+    """One simulated phone streaming frames over /ws/monitor"""
+
+    def __init__(self, client_id: int, url: str, frames: List[bytes], fps: float,
+                 protocol: str = "json", results_only: bool = False,
+                 skip_when_busy: bool = False):
+        """
+        Args:
+            client_id: Index of the client (used in the session id)
+            url: WebSocket URL of /ws/monitor
+            frames: Pre-encoded JPEG frames (looped)
+            fps: Frames sent per second
+            protocol: "json" (base64 data URL, like the app) or "binary"
+            results_only: Ask for keypoints/overlay only, no annotated JPEG
+            skip_when_busy: Skip a tick while a reply is outstanding
+                            (what CameraView does) instead of sending anyway
+        """
+        self.client_id = client_id
+        self.url = url
+        self.fps = fps
+        self.protocol = protocol
+        self.results_only = results_only
+        self.skip_when_busy = skip_when_busy
+
+        # Pre-build payloads (base64 is part of the app's cost, not ours)
+        if protocol == "json":
+            self.payloads = [
+                "data:image/jpeg;base64," + base64.b64encode(jpeg).decode('utf-8')
+                for jpeg in frames
+            ]
+        else:
+            self.payloads = frames
+
+        self.pending: Dict[int, float] = {}
+        self.latencies: List[float] = []
+        self.sent = 0
+        self.received = 0
+        self.skipped = 0
+        self.errors = 0
+        self.alarms = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connect_error: Optional[str] = None
+
+    def _message(self, sequence: int):
+        """Build the frame message for a sequence number"""
+        payload = self.payloads[sequence % len(self.payloads)]
+        if self.protocol == "json":
+            return json.dumps({"type": "frame", "seq": sequence, "data": payload})
+
+        flags = wire_protocol.FLAG_RESULTS_ONLY if self.results_only else 0
+        return wire_protocol.encode_frame(sequence, int(time.time() * 1000), payload, flags)
+
+    async def run(self, duration: float, drain_timeout: float = 5.0):
+        """Stream for `duration` seconds, then wait for outstanding replies"""
+        session_id = f"loadgen_{self.client_id}_{os.getpid()}"
+        url = f"{self.url}?session_id={session_id}"
+        if self.results_only:
+            url += "&annotate=false"
+
+        try:
+            async with websockets.connect(url, max_size=None) as websocket:
+                receiver = asyncio.create_task(self._receive(websocket))
+                try:
+                    await self._send(websocket, duration)
+                    drain_end = time.perf_counter() + drain_timeout
+                    while self.pending and time.perf_counter() < drain_end and not receiver.done():
+                        await asyncio.sleep(0.05)
+                finally:
+                    receiver.cancel()
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            self.connect_error = str(e)
+
+    async def _send(self, websocket, duration: float):
+        """Send frames on a fixed schedule (no drift from send time)"""
+        interval = 1.0 / self.fps
+        start = time.perf_counter()
+        tick = 0
+        sequence = 0
+
+        while True:
+            next_send = start + tick * interval
+            if next_send - start >= duration:
+                break
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tick += 1
+
+            if self.skip_when_busy and self.pending:
+                self.skipped += 1
+                continue
+
+            message = self._message(sequence)
+            self.pending[sequence] = time.perf_counter()
+            await websocket.send(message)
+            self.sent += 1
+            self.bytes_sent += len(message)
+            sequence += 1
+
+    async def _receive(self, websocket):
+        """Match replies to sent frames by sequence number"""
+        async for message in websocket:
+            now = time.perf_counter()
+            self.bytes_received += len(message)
+
+            if isinstance(message, bytes):
+                reply = wire_protocol.decode_result(message)
+                sequence = reply["sequence"]
+                alarm = bool(reply["flags"] & wire_protocol.FLAG_ALARM)
+            else:
+                reply = json.loads(message)
+                if reply.get("type") != "result":
+                    if reply.get("type") == "error":
+                        self.errors += 1
+                        self.pending.pop(reply.get("sequence"), None)
+                    continue
+                sequence = reply.get("seq")
+                alarm = bool(reply.get("trigger_alarm"))
+
+            sent_at = self.pending.pop(sequence, None)
+            if sent_at is None:
+                continue
+            self.received += 1
+            self.latencies.append(now - sent_at)
+            if alarm:
+                self.alarms += 1
+
+            # Frames sent before this one and still unanswered were dropped
+            # by the server (latest frame wins), stop waiting for them
+            for stale in [seq for seq in self.pending if seq < sequence]:
+                del self.pending[stale]
+
+    def get_stats(self, elapsed: float) -> Dict:
+        """Per-client results (JSON serializable)"""
+        dropped = self.sent - self.received - self.errors
+        return {
+            "client_id": self.client_id,
+            "frames_sent": self.sent,
+            "results_received": self.received,
+            "frames_dropped": dropped,
+            "frames_skipped": self.skipped,
+            "errors": self.errors,
+            "alarms": self.alarms,
+            "drop_rate": round(dropped / self.sent, 4) if self.sent else 0.0,
+            "throughput_fps": round(self.received / elapsed, 2) if elapsed > 0 else 0.0,
+            "connect_error": self.connect_error,
+            "latency": latency_summary(self.latencies)
+        }
+
+
+def get_git_commit() -> Optional[str]:
+    """Current commit of the checkout (to compare runs across commits)"""
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip() or None
+    except FileNotFoundError:
+        return None
+
+
+async def run_load_test(url: str, frames: List[bytes], clients: int = 4, fps: float = 5.0,
+                        duration: float = 30.0, protocol: str = "json",
+                        results_only: bool = False, skip_when_busy: bool = False,
+                        ramp_up: float = 0.0) -> Dict:
+    """
+    Run N synthetic clients against a server
+
+    Args:
+        ramp_up: Seconds over which client start times are spread
+
+    Returns:
+        Results dict (config, totals, latency percentiles, per-client stats)
+    """
+    synthetic_clients = [
+        SyntheticClient(i, url, frames, fps, protocol, results_only, skip_when_busy)
+        for i in range(clients)
+    ]
+
+    async def start_client(client: SyntheticClient):
+        if ramp_up > 0 and clients > 1:
+            await asyncio.sleep(ramp_up * client.client_id / (clients - 1))
+        await client.run(duration)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(start_client(client) for client in synthetic_clients))
+    elapsed = time.perf_counter() - start
+
+    sent = sum(client.sent for client in synthetic_clients)
+    received = sum(client.received for client in synthetic_clients)
+    errors = sum(client.errors for client in synthetic_clients)
+    dropped = sent - received - errors
+    latencies = [latency for client in synthetic_clients for latency in client.latencies]
+    stream_time = duration + ramp_up
+
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "git_commit": get_git_commit(),
+        "config": {
+            "url": url,
+            "clients": clients,
+            "fps_per_client": fps,
+            "duration": duration,
+            "ramp_up": ramp_up,
+            "protocol": protocol,
+            "results_only": results_only,
+            "skip_when_busy": skip_when_busy,
+            "unique_frames": len(frames),
+            "average_frame_bytes": int(sum(len(f) for f in frames) / len(frames))
+        },
+        "totals": {
+            "elapsed_seconds": round(elapsed, 2),
+            "frames_sent": sent,
+            "results_received": received,
+            "frames_dropped": dropped,
+            "frames_skipped": sum(client.skipped for client in synthetic_clients),
+            "errors": errors,
+            "alarms": sum(client.alarms for client in synthetic_clients),
+            "failed_clients": sum(1 for client in synthetic_clients if client.connect_error),
+            "offered_fps": round(sent / stream_time, 2) if stream_time > 0 else 0.0,
+            "throughput_fps": round(received / stream_time, 2) if stream_time > 0 else 0.0,
+            "drop_rate": round(dropped / sent, 4) if sent else 0.0,
+            "mbytes_sent": round(sum(c.bytes_sent for c in synthetic_clients) / 1e6, 2),
+            "mbytes_received": round(sum(c.bytes_received for c in synthetic_clients) / 1e6, 2)
+        },
+        "latency": latency_summary(latencies),
+        "clients": [client.get_stats(stream_time) for client in synthetic_clients]
+    }
+
+
+def print_report(results: Dict):
+    """Print a short human-readable summary"""
+    config = results["config"]
+    totals = results["totals"]
+    latency = results["latency"]
+
+    print("\n" + "=" * 60)
+    print(f"📊 LOAD TEST: {config['clients']} clients × {config['fps_per_client']} FPS "
+          f"({config['protocol']}{', results only' if config['results_only'] else ''})")
+    print("=" * 60)
+    print(f"   Offered:     {totals['offered_fps']} frames/s ({totals['frames_sent']} frames)")
+    print(f"   Throughput:  {totals['throughput_fps']} results/s ({totals['results_received']} results)")
+    print(f"   Drop rate:   {totals['drop_rate']:.1%} ({totals['frames_dropped']} dropped, {totals['errors']} errors)")
+    if latency["p50_ms"] is not None:
+        print(f"   RTT p50/p95/p99: {latency['p50_ms']} / {latency['p95_ms']} / {latency['p99_ms']} ms")
+    if totals["failed_clients"]:
+        print(f"   ❌ {totals['failed_clients']} clients failed to connect")
+    print("=" * 60)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test /ws/monitor with synthetic driver sessions")
+    parser.add_argument("--video", required=True, help="Local video file to stream")
+    parser.add_argument("--url", default="ws://localhost:8000/ws/monitor", help="WebSocket URL")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent sessions")
+    parser.add_argument("--fps", type=float, default=5.0, help="Frames per second per client (app default: 5)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds each client streams")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which clients connect")
+    parser.add_argument("--protocol", choices=("json", "binary"), default="json",
+                        help="json = base64 data URL like the app, binary = wire_protocol frames")
+    parser.add_argument("--results-only", action="store_true", help="Request keypoints/overlay only")
+    parser.add_argument("--skip-when-busy", action="store_true",
+                        help="Skip a tick while a reply is outstanding (CameraView behavior)")
+    parser.add_argument("--max-frames", type=int, default=300, help="Frames read from the video")
+    parser.add_argument("--max-width", type=int, default=640, help="Downscale frames to this width")
+    parser.add_argument("--jpeg-quality", type=int, default=70, help="JPEG quality of sent frames")
+    parser.add_argument("--output", default=None,
+                        help="Results JSON (default: load_test_<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    print(f"🎞️  Loading frames from {args.video}...")
+    frames = load_frames(args.video, args.max_frames, args.max_width, args.jpeg_quality)
+    print(f"✅ {len(frames)} frames ready")
+
+    print(f"🚀 Starting {args.clients} clients against {args.url}...")
+    results = asyncio.run(run_load_test(
+        args.url, frames,
+        clients=args.clients,
+        fps=args.fps,
+        duration=args.duration,
+        protocol=args.protocol,
+        results_only=args.results_only,
+        skip_when_busy=args.skip_when_busy,
+        ramp_up=args.ramp_up
+    ))
+
+    print_report(results)
+
+    output = args.output or f"load_test_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved: {output}")
+
+    return 1 if results["totals"]["results_received"] == 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,27 +2,36 @@
 FastAPI Backend Server for Driver Monitoring System
 Handles ML processing with YOLOv11 pose estimation
 """
-from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
-import cv2
-import numpy as np
-import base64
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 import json
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 import asyncio
 import sys
 import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from models.activity_detector import ActivityDetector
-from utils.video_recorder import VideoRecorder
+from models.inference_backend import export_model
 from utils.audio_alert import AudioAlert
+from utils.video_pipeline import VideoPipeline
+from utils.recording_files import list_recordings, resolve_recording_file, parse_range, iter_file, response_headers
 from whatsapp_service import whatsapp_service
 from alert_manager import AlertManager
+from inference_scheduler import InferenceScheduler
+from frame_executor import FrameExecutor
+from session_manager import SessionManager
+from session_recorder import SessionRecorder
+from frame_queue import LatestFrameQueue, QueueClosed
+import wire_protocol
+import metrics
+import config
 
 app = FastAPI(title="Driver Monitoring System API")
 
@@ -35,23 +44,185 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Extra settings for every ActivityDetector serving live sessions
+detector_options = {
+    "track_keypoints": config.TRACK_KEYPOINTS,
+    "tracking_interval": config.TRACKING_INTERVAL,
+    "max_tracking_interval": config.MAX_TRACKING_INTERVAL,
+    "roi_inference": config.ROI_INFERENCE,
+    "roi_imgsz": config.ROI_IMGSZ,
+    "roi_reacquire_interval": config.ROI_REACQUIRE_INTERVAL,
+    "backend": config.INFERENCE_BACKEND,
+    "int8": config.INT8,
+    "model_cache_dir": config.MODEL_CACHE_DIR,
+    "imgsz": config.MODEL_IMGSZ,
+    "fuse_model": config.FUSE_MODEL,
+    "fatigue_window": config.FATIGUE_WINDOW
+}
+
 # Global instances
 detector = None
-recorder = VideoRecorder()
-audio_alert = AudioAlert()
+frame_executor = None
+scheduler = None
+audio_alert = None  # Created on startup (initializes the audio device)
 alert_manager = AlertManager(whatsapp_service)
-active_sessions: Dict[str, Dict] = {}
+session_manager = SessionManager(
+    idle_timeout=config.SESSION_IDLE_TIMEOUT,
+    annotate_default=config.ANNOTATE_FRAMES,
+    fatigue_window=config.FATIGUE_WINDOW
+)
+
+# Cookie carrying the session id issued to REST clients that send none
+SESSION_COOKIE = "dms_session"
+
+# Offline video analysis jobs (one at a time, next to live inference)
+video_jobs: Dict[str, Dict] = {}
+video_job_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="video-job")
+video_detector = None
+
+# Startup progress: liveness only needs the process to answer, readiness
+# waits until the model is loaded and warmed up
+# state: starting -> loading_model -> warming_up -> ready (or failed)
+readiness = {
+    "state": "starting",
+    "error": None,
+    "load_seconds": None,
+    "warmup_seconds": None
+}
+startup_task = None
+
+def is_ready() -> bool:
+    """Check whether frames can be processed"""
+    return readiness["state"] == "ready"
+
+# Gauges read live state when /metrics is scraped
+metrics.registry.gauge("dms_active_sessions", "Connected driver sessions",
+                       function=lambda: len(session_manager))
+metrics.registry.gauge("dms_ingest_queue_depth", "Frames waiting in the per-session ingest queues",
+                       function=lambda: session_manager.total_queue_depth())
+metrics.registry.gauge("dms_scheduler_queue_depth", "Frames waiting to join an inference batch",
+                       function=lambda: scheduler.queued_frames() if scheduler is not None else 0)
+metrics.registry.gauge("dms_batches_in_flight", "Inference batches running in the worker pool",
+                       function=lambda: scheduler.batches_in_flight() if scheduler is not None else 0)
+metrics.registry.gauge("dms_recording_sessions", "Sessions recording video",
+                       function=lambda: len(session_manager.recording_sessions()))
+metrics.registry.gauge("dms_ready", "1 once the model is loaded and warmed up",
+                       function=lambda: 1 if is_ready() else 0)
+metrics.registry.counter("dms_whatsapp_sent_total", "WhatsApp alerts delivered",
+                         function=lambda: whatsapp_service.messages_sent)
+metrics.registry.counter("dms_whatsapp_failed_total", "WhatsApp alerts that failed to send",
+                         function=lambda: whatsapp_service.messages_failed)
+
+def record_frame_metrics(protocol: str, session_id: str, result: Dict, timings: Dict, received_at: float):
+    """Store the session result and record its stage timings, frame and alarm counters"""
+    timings.update(result['timings'])
+    metrics.observe_frame(protocol, timings)
+    metrics.frame_seconds.observe(time.perf_counter() - received_at, protocol=protocol)
+    if session_manager.update(session_id, result):
+        metrics.alarms_total.inc(activity=result['activity'])
+
+def record_session_frame(session_id: str, image, result: Dict, offset: int = 0):
+    """
+    Hand a processed frame to the session's recorder, if it is recording
+    (the annotated image when there is one, else the received image);
+    decoding and writing happen on the recorder's thread
+    """
+    session_recorder = session_manager.get_recorder(session_id)
+    if session_recorder is None:
+        return
+    if result['annotated_frame'] is not None:
+        image, offset = result['annotated_frame'], 0
+    session_recorder.submit(image, result['activity'], result['confidence'], result['details'],
+                            result.get('keypoints'), offset)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize the detector on startup"""
-    global detector
-    print("🔄 Loading YOLOv11 model...")
-    detector = ActivityDetector(
-        model_name='yolo11n-pose.pt',
-        confidence_threshold=0.3
-    )
-    print("✅ Model loaded successfully!")
+    """
+    Start serving immediately and load the model in the background
+    
+    /health/live answers right away; /health/ready (and frame processing)
+    waits until initialize_inference has loaded and warmed up the model.
+    """
+    global audio_alert, startup_task
+    audio_alert = AudioAlert()
+    startup_task = asyncio.create_task(initialize_inference())
+
+def load_detector() -> Optional[ActivityDetector]:
+    """Load the shared detector (thread mode) or prepare the cached model for worker processes"""
+    if config.EXECUTOR_MODE == "thread":
+        print("🔄 Loading YOLOv11 model...")
+        loaded = ActivityDetector(
+            model_name=config.MODEL_NAME,
+            confidence_threshold=config.CONFIDENCE_THRESHOLD,
+            **detector_options
+        )
+        print("✅ Model loaded successfully!")
+        return loaded
+    
+    # Export / fuse once here so worker processes don't race to build the cache
+    export_model(config.MODEL_NAME, config.INFERENCE_BACKEND, int8=config.INT8,
+                 imgsz=config.MODEL_IMGSZ, cache_dir=config.MODEL_CACHE_DIR,
+                 fuse=config.FUSE_MODEL and config.INFERENCE_BACKEND == "pytorch")
+    return None
+
+async def initialize_inference():
+    """Load and warm up the model, then start the worker pool and batching scheduler"""
+    global detector, frame_executor, scheduler
+    loop = asyncio.get_running_loop()
+    try:
+        readiness["state"] = "loading_model"
+        start = time.perf_counter()
+        detector = await loop.run_in_executor(None, load_detector)
+        
+        # Every worker process loads its own model in process mode
+        frame_executor = FrameExecutor(
+            mode=config.EXECUTOR_MODE,
+            workers=config.EXECUTOR_WORKERS,
+            detector=detector,
+            model_name=config.MODEL_NAME,
+            confidence_threshold=config.CONFIDENCE_THRESHOLD,
+            detector_options=detector_options,
+            warmup_runs=config.WARMUP_RUNS
+        )
+        frame_executor.start()
+        readiness["load_seconds"] = round(time.perf_counter() - start, 2)
+        print(f"✅ Frame executor started ({config.EXECUTOR_MODE} mode, {config.EXECUTOR_WORKERS} workers)")
+        
+        readiness["state"] = "warming_up"
+        start = time.perf_counter()
+        await frame_executor.warmup()
+        readiness["warmup_seconds"] = round(time.perf_counter() - start, 2)
+        print(f"✅ Model warmed up ({config.WARMUP_RUNS} runs, {readiness['warmup_seconds']}s)")
+        
+        scheduler = InferenceScheduler(
+            frame_executor,
+            max_batch_size=config.BATCH_MAX_SIZE,
+            max_wait_ms=config.BATCH_MAX_WAIT_MS,
+            max_concurrent_batches=config.EXECUTOR_WORKERS
+        )
+        scheduler.start()
+        print(f"✅ Inference scheduler started (batch ≤ {config.BATCH_MAX_SIZE}, wait ≤ {config.BATCH_MAX_WAIT_MS}ms)")
+        readiness["state"] = "ready"
+    except Exception as e:
+        readiness["state"] = "failed"
+        readiness["error"] = str(e)
+        print(f"❌ Model initialization failed: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Finish open recordings, stop the batching scheduler and the worker pool"""
+    if startup_task is not None and not startup_task.done():
+        startup_task.cancel()
+    recordings = [session_manager.detach_recorder(session_id)
+                  for session_id in session_manager.recording_sessions()]
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[loop.run_in_executor(None, session_recorder.finish, 10.0)
+                           for session_recorder in recordings])
+    if scheduler is not None:
+        await scheduler.stop()
+    if frame_executor is not None:
+        frame_executor.shutdown()
+    video_job_pool.shutdown(wait=False, cancel_futures=True)
 
 @app.get("/")
 async def root():
@@ -60,7 +231,8 @@ async def root():
         "status": "running",
         "service": "Driver Monitoring System API",
         "version": "1.0.0",
-        "model_loaded": detector is not None
+        "model_loaded": frame_executor is not None and frame_executor.is_running(),
+        "ready": is_ready()
     }
 
 @app.get("/health")
@@ -68,50 +240,128 @@ async def health_check():
     """Detailed health check"""
     return {
         "status": "healthy",
-        "detector_loaded": detector is not None,
-        "audio_available": audio_alert.is_available(),
-        "audio_backend": audio_alert.get_audio_backend() if audio_alert.is_available() else "None",
-        "active_sessions": len(active_sessions)
+        "detector_loaded": frame_executor is not None and frame_executor.is_running(),
+        "ready": is_ready(),
+        "startup": readiness,
+        "executor": frame_executor.get_status() if frame_executor is not None else None,
+        "audio_available": audio_alert is not None and audio_alert.is_available(),
+        "audio_backend": audio_alert.get_audio_backend() if audio_alert is not None and audio_alert.is_available() else "None",
+        "active_sessions": len(session_manager),
+        "queued_frames": session_manager.total_queue_depth()
     }
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and serving (the model may still be loading)"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before"""
+    return JSONResponse(
+        status_code=200 if is_ready() else 503,
+        content={"ready": is_ready(), **readiness}
+    )
+
+def parse_imgsz(value) -> Optional[int]:
+    """
+    Validate a client-requested inference size: a multiple of 32 between
+    96 and 1280, 0 to go back to the deployment default, None if not given
+    """
+    if value is None or value == "":
+        return None
+    size = int(value)
+    if size <= 0:
+        return 0
+    return min(max(int(round(size / 32)) * 32, 96), 1280)
+
+def not_ready_response() -> JSONResponse:
+    """503 for frame requests that arrive before the model is ready"""
+    return JSONResponse(
+        status_code=503,
+        content={"error": f"Model not ready ({readiness['state']})"},
+        headers={"Retry-After": "5"}
+    )
+
 @app.post("/api/process-frame")
-async def process_frame(file: UploadFile = File(...)):
+async def process_frame(request: Request, http_response: Response, file: UploadFile = File(...),
+                        session_id: Optional[str] = None, annotate: Optional[bool] = None,
+                        imgsz: Optional[int] = None):
     """
     Process a single frame from mobile camera
     Returns annotated frame and detection results
+    
+    Query:
+        session_id: Keeps this driver's eye/head timers isolated from other
+                    clients. Without it (older app builds) the session
+                    issued earlier is resumed from the dms_session cookie,
+                    or a new one is issued - returned as "session_id" and
+                    set as the cookie; clients are never merged by address
+                    (behind a tunnel every client has the same one)
+        annotate: false = results only (keypoints, box and overlay
+                  primitives in "pose", no annotated JPEG)
+        imgsz: Inference size for this session (multiple of 32, 0 = default);
+               smaller is faster, keypoints stay in original coordinates
     """
+    if not is_ready():
+        return not_ready_response()
     try:
         # Read image from upload
+        received_at = time.perf_counter()
         contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        timings = {"receive": time.perf_counter() - received_at}
+        
+        from_cookie = session_id is None
+        if from_cookie:
+            session_id = request.cookies.get(SESSION_COOKIE) or None
+        session_id = session_manager.open(session_id, kind="rest")
+        if from_cookie:
+            # (Re)issue the cookie - expires with the idle session
+            http_response.set_cookie(SESSION_COOKIE, session_id, max_age=int(config.SESSION_IDLE_TIMEOUT),
+                                     httponly=True, samesite="lax")
+        session_manager.set_options(session_id, imgsz=parse_imgsz(imgsz))
+        if annotate is None:
+            annotate = session_manager.get_options(session_id)["annotate"]
+        
+        # Decode, detect and encode in the worker pool
+        # (batched with other sessions' frames)
+        current_time = time.time()
+        result = await scheduler.submit({
+            "data": contents,
+            "session": session_manager.get_state(session_id),
+            "jpeg_quality": 85,
+            "annotate": annotate,
+            "imgsz": session_manager.get_options(session_id)["imgsz"],
+            "reduced_decode": config.REDUCED_DECODE
+        })
         
-        if frame is None:
+        if result is None:
+            metrics.frames_invalid_total.inc(protocol="rest")
             return JSONResponse(
                 status_code=400,
                 content={"error": "Invalid image format"}
             )
         
-        # Process frame with detector
-        current_time = time.time()
-        annotated_frame, activity, confidence, details = detector.process_frame(frame)
-        
-        # Encode annotated frame to base64
-        _, buffer = cv2.imencode('.jpg', annotated_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-        img_base64 = base64.b64encode(buffer).decode('utf-8')
+        record_frame_metrics("rest", session_id, result, timings, received_at)
+        record_session_frame(session_id, contents, result)
+        activity = result['activity']
+        confidence = result['confidence']
+        details = result['details']
         
         # Prepare response
         response = {
             "success": True,
+            "session_id": session_id,
             "timestamp": current_time,
             "activity": activity,
             "confidence": float(confidence),
-            "details": details,
-            "annotated_frame": f"data:image/jpeg;base64,{img_base64}",
-            "alert_level": details.get('alert_level', 'SAFE'),
-            "trigger_alarm": details.get('trigger_alarm', False),
-            "eyes_closed_duration": details.get('eyes_closed_duration', 0.0),
-            "looking_down_duration": details.get('looking_down_duration', 0.0)
+            "details": details.to_dict(),
+            "annotated_frame": result['annotated_frame'],
+            "pose": result['pose'],
+            "alert_level": details.alert_level.name,
+            "trigger_alarm": details.trigger_alarm,
+            "eyes_closed_duration": details.eyes_closed_duration,
+            "looking_down_duration": details.looking_down_duration
         }
         
         return response
@@ -122,128 +372,519 @@ async def process_frame(file: UploadFile = File(...)):
             content={"error": f"Processing error: {str(e)}"}
         )
 
+async def process_json_frame(websocket: WebSocket, session_id: str, message: Dict,
+                             timings: Dict, received_at: float) -> bool:
+    """Process a frame of the original base64-in-JSON protocol and send the result"""
+    # Decode, detect and encode in the worker pool
+    # (batched with other sessions' frames)
+    result = await scheduler.submit({
+        "data": message["data"],
+        "session": session_manager.get_state(session_id),
+        "jpeg_quality": 80,
+        "annotate": session_manager.get_options(session_id)["annotate"],
+        "imgsz": session_manager.get_options(session_id)["imgsz"],
+        "reduced_decode": config.REDUCED_DECODE
+    })
+    
+    if result is None:
+        metrics.frames_invalid_total.inc(protocol="json")
+        return False
+    
+    activity = result['activity']
+    confidence = result['confidence']
+    details = result['details']
+    
+    # Send response
+    response = {
+        "type": "result",
+        "session_id": session_id,
+        "timestamp": time.time(),
+        "activity": activity,
+        "confidence": float(confidence),
+        "details": details.to_dict(),
+        "annotated_frame": result['annotated_frame'],
+        "pose": result['pose'],
+        "alert_level": details.alert_level.name,
+        "trigger_alarm": details.trigger_alarm
+    }
+    if "seq" in message:
+        response["seq"] = message["seq"]
+    
+    send_start = time.perf_counter()
+    await websocket.send_json(response)
+    timings["send"] = time.perf_counter() - send_start
+    record_frame_metrics("json", session_id, result, timings, received_at)
+    record_session_frame(session_id, message["data"], result)
+    return True
+
+async def process_binary_frame(websocket: WebSocket, session_id: str, message: bytes, header: Dict,
+                               timings: Dict, received_at: float) -> bool:
+    """Process a binary protocol frame and reply with a binary result"""
+    annotate = session_manager.get_options(session_id)["annotate"]
+    if header["flags"] & wire_protocol.FLAG_RESULTS_ONLY:
+        annotate = False
+    
+    # The JPEG is decoded straight from the message buffer (no copies)
+    result = await scheduler.submit({
+        "data": message,
+        "data_offset": header["payload_offset"],
+        "session": session_manager.get_state(session_id),
+        "jpeg_quality": 80,
+        "image_format": "jpeg",
+        "annotate": annotate,
+        "imgsz": session_manager.get_options(session_id)["imgsz"],
+        "reduced_decode": config.REDUCED_DECODE
+    })
+    
+    if result is None:
+        metrics.frames_invalid_total.inc(protocol="binary")
+        await websocket.send_json({
+            "type": "error",
+            "sequence": header["sequence"],
+            "error": "Invalid image format"
+        })
+        return False
+    
+    details = result['details']
+    metadata = {
+        "session_id": session_id,
+        "activity": result['activity'],
+        "confidence": round(float(result['confidence']), 4),
+        "alert_level": details.alert_level.name,
+        "trigger_alarm": details.trigger_alarm,
+        "pose": result['pose']
+    }
+    
+    # Details are spliced in pre-serialized, or sent as a fixed-size
+    # binary record when the client asked for compact details
+    send_start = time.perf_counter()
+    await websocket.send_bytes(wire_protocol.encode_result(
+        header["sequence"],
+        header["timestamp_ms"],
+        metadata,
+        result['annotated_frame'],
+        details=details,
+        compact_details=bool(header["flags"] & wire_protocol.FLAG_COMPACT_DETAILS)
+    ))
+    timings["send"] = time.perf_counter() - send_start
+    record_frame_metrics("binary", session_id, result, timings, received_at)
+    record_session_frame(session_id, message, result, header["payload_offset"])
+    return True
+
+async def process_session_frames(websocket: WebSocket, session_id: str, queue: LatestFrameQueue):
+    """Consume a session's ingest queue, newest frames first to go through"""
+    while True:
+        try:
+            (kind, message, header, received_at, receive_time), queue_wait = await queue.get()
+        except QueueClosed:
+            return
+        
+        timings = {"receive": receive_time, "queue_wait": queue_wait}
+        if kind == "binary":
+            sent = await process_binary_frame(websocket, session_id, message, header, timings, received_at)
+        else:
+            sent = await process_json_frame(websocket, session_id, message, timings, received_at)
+        
+        if sent:
+            queue.mark_processed()
+
 @app.websocket("/ws/monitor")
 async def websocket_monitor(websocket: WebSocket):
     """
     WebSocket endpoint for real-time frame processing
     More efficient than REST API for continuous monitoring
+    
+    Binary messages use the versioned frame protocol in wire_protocol.py,
+    text messages the original JSON protocol (kept for old app builds)
+    
+    Frames go through a bounded per-session queue: when inference falls
+    behind, the oldest waiting frame is dropped before it is decoded
+    
+    Query:
+        session_id: Optional id to resume an earlier session's state
+        annotate: "false" starts the session in results-only mode
+        imgsz: Inference size for this session (also settable with
+               {"type": "config", "imgsz": 320})
+    
+    {"type": "recording", "action": "start"} / "stop" records this session
+    to its own files (same as /api/start-recording?session_id=...)
     """
+    if not is_ready():
+        # 1013 = try again later
+        await websocket.close(code=1013)
+        return
     await websocket.accept()
-    session_id = f"session_{int(time.time())}"
-    active_sessions[session_id] = {
-        "start_time": time.time(),
-        "frames_processed": 0
-    }
+    session_id = session_manager.open(websocket.query_params.get("session_id"), kind="websocket")
+    if "annotate" in websocket.query_params:
+        session_manager.set_options(
+            session_id,
+            annotate=websocket.query_params["annotate"].lower() in ("1", "true", "yes")
+        )
+    try:
+        session_manager.set_options(session_id, imgsz=parse_imgsz(websocket.query_params.get("imgsz")))
+    except ValueError:
+        pass
     
-    print(f"📱 New monitoring session: {session_id}")
+    queue, previous = session_manager.attach_queue(session_id, maxsize=config.INGEST_QUEUE_SIZE,
+                                                   owner=websocket)
+    processor = asyncio.create_task(process_session_frames(websocket, session_id, queue))
+    
+    if previous is not None:
+        # The phone reconnected before its old socket was noticed dropping:
+        # this connection takes the session over, the stale one is closed
+        print(f"📱 Session taken over by a new connection: {session_id}")
+        try:
+            await previous.close(code=4000, reason="Session taken over by a new connection")
+        except Exception:
+            pass  # Already gone
+    else:
+        print(f"📱 New monitoring session: {session_id}")
     
     try:
         while True:
             # Receive frame data from React Native
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            received_at = time.perf_counter()
             
-            if message.get("type") == "frame":
-                # Decode base64 frame
-                img_data = base64.b64decode(message["data"].split(",")[1] if "," in message["data"] else message["data"])
-                nparr = np.frombuffer(img_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if frame is not None:
-                    # Process frame
-                    annotated_frame, activity, confidence, details = detector.process_frame(frame)
-                    
-                    # Encode result
-                    _, buffer = cv2.imencode('.jpg', annotated_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                    img_base64 = base64.b64encode(buffer).decode('utf-8')
-                    
-                    # Send response
-                    response = {
-                        "type": "result",
-                        "timestamp": time.time(),
-                        "activity": activity,
-                        "confidence": float(confidence),
-                        "details": details,
-                        "annotated_frame": f"data:image/jpeg;base64,{img_base64}",
-                        "alert_level": details.get('alert_level', 'SAFE'),
-                        "trigger_alarm": details.get('trigger_alarm', False)
-                    }
-                    
-                    await websocket.send_json(response)
-                    
-                    # Update session stats
-                    active_sessions[session_id]["frames_processed"] += 1
+            if processor.done():
+                # Surface errors from the processing task
+                processor.result()
+            
+            if message.get("bytes") is not None:
+                # Binary protocol: header + raw JPEG
+                try:
+                    header = wire_protocol.decode_header(message["bytes"])
+                except wire_protocol.ProtocolError as e:
+                    await websocket.send_json({"type": "error", "error": str(e)})
+                    continue
+                receive_time = time.perf_counter() - received_at
+                dropped = queue.put(("binary", message["bytes"], header, received_at, receive_time))
+                if dropped:
+                    metrics.frames_dropped_total.inc(dropped)
+                continue
+            
+            if message.get("text") is None:
+                continue
+            
+            # Legacy JSON protocol (base64 data URL)
+            data = json.loads(message["text"])
             
-            elif message.get("type") == "ping":
+            if data.get("type") == "frame":
+                receive_time = time.perf_counter() - received_at
+                dropped = queue.put(("json", data, None, received_at, receive_time))
+                if dropped:
+                    metrics.frames_dropped_total.inc(dropped)
+            
+            elif data.get("type") == "config":
+                # Per-session options, e.g. {"type": "config", "annotate": false, "imgsz": 320}
+                try:
+                    imgsz = parse_imgsz(data.get("imgsz"))
+                except (TypeError, ValueError):
+                    await websocket.send_json({"type": "error", "error": "imgsz must be an integer"})
+                    continue
+                options = session_manager.set_options(session_id, annotate=data.get("annotate"), imgsz=imgsz)
+                await websocket.send_json({"type": "config", **options})
+            
+            elif data.get("type") == "recording":
+                # {"type": "recording", "action": "start" | "stop"} records this session
+                if data.get("action") == "stop":
+                    finished = await stop_session_recording(session_id)
+                    await websocket.send_json({"type": "recording", "recording": False,
+                                               **(finished or {})})
+                else:
+                    start_session_recording(session_id)
+                    await websocket.send_json({"type": "recording", "recording": True})
+            
+            elif data.get("type") == "ping":
                 await websocket.send_json({"type": "pong"})
                 
     except WebSocketDisconnect:
         print(f"📱 Session disconnected: {session_id}")
-        del active_sessions[session_id]
     except Exception as e:
         print(f"❌ WebSocket error: {e}")
         await websocket.close()
-        if session_id in active_sessions:
-            del active_sessions[session_id]
+    finally:
+        queue.close()
+        processor.cancel()
+        # No-op if a reconnect took the session over
+        session_manager.close(session_id, owner=websocket)
+
+def resolve_recording_session(session_id: Optional[str]) -> Optional[str]:
+    """
+    Session a recording request is for: the given one if it exists, or -
+    without an id, as sent by older app builds - the only connected session
+    """
+    if session_id is not None:
+        return session_id if session_id in session_manager else None
+    if len(session_manager) == 1:
+        return next(iter(session_manager.sessions))
+    return None
+
+def unknown_session_response(session_id: Optional[str]) -> JSONResponse:
+    """404 for recording requests without a matching session"""
+    message = (f"Unknown session: {session_id}" if session_id is not None
+               else "session_id is required unless exactly one session is connected")
+    return JSONResponse(status_code=404, content={"success": False, "message": message})
+
+def start_session_recording(session_id: str) -> bool:
+    """Start recording a session (False if it already is)"""
+    if session_manager.get_recorder(session_id) is not None:
+        return False
+    session_manager.attach_recorder(session_id, SessionRecorder(
+        session_id,
+        output_dir=config.RECORDINGS_DIR,
+        fps=config.RECORDING_FPS,
+        queue_size=config.RECORDING_QUEUE_SIZE
+    ))
+    return True
+
+async def stop_session_recording(session_id: str) -> Optional[Dict]:
+    """Stop recording a session and wait for its files off the event loop (None if not recording)"""
+    session_recorder = session_manager.detach_recorder(session_id)
+    if session_recorder is None:
+        return None
+    return await asyncio.get_running_loop().run_in_executor(None, session_recorder.finish)
 
 @app.post("/api/start-recording")
-async def start_recording():
-    """Start video recording session"""
+async def start_recording(session_id: Optional[str] = None):
+    """
+    Start recording a session
+    
+    The video opens with the session's next frame, at that frame's size;
+    every session records to its own files, so any number can record at once
+    
+    Query:
+        session_id: Session to record (optional when only one is connected)
+    """
+    resolved = resolve_recording_session(session_id)
+    if resolved is None:
+        return unknown_session_response(session_id)
+    if not start_session_recording(resolved):
+        return {
+            "success": False,
+            "session_id": resolved,
+            "message": "Already recording"
+        }
+    return {
+        "success": True,
+        "session_id": resolved,
+        "message": "Recording started",
+        "video_file": None  # Named when the first frame arrives (see /api/recording-status)
+    }
+
+@app.post("/api/stop-recording")
+async def stop_recording(session_id: Optional[str] = None):
+    """
+    Stop recording a session and get its summary
+    
+    Query:
+        session_id: Session to stop (optional when only one is connected)
+    """
+    resolved = resolve_recording_session(session_id)
+    if resolved is None:
+        return unknown_session_response(session_id)
     try:
-        if not recorder.is_recording():
-            # We'll get dimensions from first frame
-            video_file = recorder.start_recording(640, 480, fps=20)
-            return {
-                "success": True,
-                "message": "Recording started",
-                "video_file": video_file
-            }
-        else:
-            return {
-                "success": False,
-                "message": "Already recording"
-            }
+        finished = await stop_session_recording(resolved)
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"error": str(e)}
         )
+    if finished is None:
+        return {
+            "success": False,
+            "session_id": resolved,
+            "message": "Not recording"
+        }
+    return {
+        "success": True,
+        "session_id": resolved,
+        "message": "Recording stopped",
+        **finished
+    }
 
-@app.post("/api/stop-recording")
-async def stop_recording():
-    """Stop video recording and get summary"""
+@app.get("/api/recording-status")
+async def recording_status(session_id: Optional[str] = None):
+    """
+    Check which sessions are recording
+    
+    Query:
+        session_id: Status of one session instead of all
+    """
+    if session_id is not None:
+        session_recorder = session_manager.get_recorder(session_id)
+        return {
+            "session_id": session_id,
+            "is_recording": session_recorder is not None,
+            **(session_recorder.get_status() if session_recorder is not None else {})
+        }
+    recording = session_manager.recording_sessions()
+    return {
+        "is_recording": bool(recording),
+        "sessions": {
+            recording_id: session_manager.get_recorder(recording_id).get_status()
+            for recording_id in recording
+        }
+    }
+
+@app.get("/api/recordings")
+async def get_recordings():
+    """
+    List recorded sessions: video, activity log, summary, keypoint store and
+    event clips with sizes (download them from /api/recordings/{kind}/{name})
+    """
+    loop = asyncio.get_running_loop()
+    return {"recordings": await loop.run_in_executor(None, list_recordings, config.RECORDINGS_DIR)}
+
+@app.get("/api/recordings/{kind}/{name}")
+async def get_recording_file(kind: str, name: str, request: Request, download: bool = False):
+    """
+    Stream a recording file in chunks, with HTTP Range support so players
+    can seek and large videos never have to fit in memory
+    
+    Path:
+        kind: "videos", "logs" or "clips"
+        name: File name from /api/recordings
+    Query:
+        download: true = save as attachment instead of playing inline
+    """
+    path = resolve_recording_file(config.RECORDINGS_DIR, kind, name)
+    if path is None:
+        return JSONResponse(status_code=404, content={"error": "Recording not found"})
+    size = os.path.getsize(path)
     try:
-        if recorder.is_recording():
-            video_file, log_file, summary_file = recorder.stop_recording()
-            
-            summary = {}
-            if summary_file and os.path.exists(summary_file):
-                with open(summary_file, 'r') as f:
-                    summary = json.load(f)
-            
-            return {
-                "success": True,
-                "message": "Recording stopped",
-                "video_file": video_file,
-                "log_file": log_file,
-                "summary": summary
-            }
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return PlainTextResponse("", status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    
+    status, headers = response_headers(name, size, byte_range, download)
+    start, end = byte_range if byte_range is not None else (0, size - 1)
+    # A plain iterator is read in the threadpool, so file reads never block the loop
+    return StreamingResponse(iter_file(path, start, end), status_code=status, headers=headers,
+                             media_type=headers["Content-Type"])
+
+def run_video_job(job_id: str, video_path: str, write_video: bool):
+    """Run an offline video analysis job (in the video job thread)"""
+    global video_detector
+    job = video_jobs[job_id]
+    job["status"] = "running"
+    
+    def on_progress(frames_done, total_frames):
+        job["frames_processed"] = frames_done
+        job["total_frames"] = total_frames
+    
+    try:
+        if config.EXECUTOR_MODE == "thread":
+            # Share the live model, one forward pass at a time
+            job_detector, lock = detector, frame_executor.inference_lock
         else:
-            return {
-                "success": False,
-                "message": "Not recording"
-            }
+            # Worker processes own their models; load one for video jobs
+            if video_detector is None:
+                video_detector = ActivityDetector(
+                    model_name=config.MODEL_NAME,
+                    confidence_threshold=config.CONFIDENCE_THRESHOLD,
+                    backend=config.INFERENCE_BACKEND,
+                    int8=config.INT8,
+                    model_cache_dir=config.MODEL_CACHE_DIR,
+                    imgsz=config.MODEL_IMGSZ,
+                    fatigue_window=config.FATIGUE_WINDOW
+                )
+            job_detector, lock = video_detector, None
+        
+        pipeline = VideoPipeline(
+            job_detector,
+            batch_size=config.VIDEO_BATCH_SIZE,
+            queue_size=config.VIDEO_QUEUE_SIZE,
+            output_dir=config.RECORDINGS_DIR,
+            write_video=write_video,
+            inference_lock=lock
+        )
+        job["result"] = pipeline.run(video_path, progress_callback=on_progress)
+        job["status"] = "completed"
+        print(f"✅ Video job {job_id} done: {job['result']['frames_processed']} frames "
+              f"({job['result']['realtime_factor']}x real time)")
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+        print(f"❌ Video job {job_id} failed: {e}")
+    finally:
+        if os.path.exists(video_path):
+            os.remove(video_path)
+
+@app.post("/api/process-video")
+async def process_video(file: UploadFile = File(...), write_video: bool = True):
+    """
+    Analyze a recorded trip offline (decode, batched inference and writing
+    run in parallel, as fast as the hardware allows)
+    
+    Produces the same annotated video, JSONL activity log and summary as
+    a live recording. Returns a job id; poll /api/process-video/{job_id}.
+    
+    Query:
+        write_video: false = only the activity log and summary
+    """
+    if not is_ready():
+        return not_ready_response()
+    try:
+        job_id = uuid.uuid4().hex[:12]
+        upload_dir = os.path.join(config.RECORDINGS_DIR, "uploads")
+        os.makedirs(upload_dir, exist_ok=True)
+        video_path = os.path.join(upload_dir, f"{job_id}_{os.path.basename(file.filename or 'video.mp4')}")
+        
+        # Stream the upload to disk in chunks
+        with open(video_path, 'wb') as f:
+            while True:
+                chunk = await file.read(1024 * 1024)
+                if not chunk:
+                    break
+                f.write(chunk)
+        
+        video_jobs[job_id] = {
+            "job_id": job_id,
+            "filename": file.filename,
+            "status": "queued",
+            "created_at": time.time(),
+            "frames_processed": 0,
+            "total_frames": None,
+            "result": None,
+            "error": None
+        }
+        asyncio.get_running_loop().run_in_executor(
+            video_job_pool, run_video_job, job_id, video_path, write_video
+        )
+        
+        return {
+            "success": True,
+            "job_id": job_id,
+            "status": "queued"
+        }
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"error": str(e)}
         )
 
-@app.get("/api/recording-status")
-async def recording_status():
-    """Check if currently recording"""
+@app.get("/api/process-video/{job_id}")
+async def get_video_job(job_id: str):
+    """Get progress and results of an offline video job"""
+    job = video_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Unknown job"}
+        )
+    return job
+
+@app.get("/api/process-video")
+async def list_video_jobs():
+    """List offline video jobs"""
     return {
-        "is_recording": recorder.is_recording()
+        "jobs": [
+            {key: job[key] for key in ("job_id", "filename", "status", "frames_processed", "total_frames")}
+            for job in video_jobs.values()
+        ]
     }
 
 @app.post("/api/trigger-alert")
@@ -272,10 +913,28 @@ async def trigger_alert(alert_type: str = "critical"):
 async def get_active_sessions():
     """Get list of active monitoring sessions"""
     return {
-        "active_sessions": len(active_sessions),
-        "sessions": active_sessions
+        "active_sessions": len(session_manager),
+        "sessions": session_manager.get_summary()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics: per-stage frame latency histograms, frame / alarm /
+    WhatsApp counters and session / queue depth gauges
+    """
+    return PlainTextResponse(
+        metrics.registry.render(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/api/scheduler/stats")
+async def get_scheduler_stats():
+    """Get micro-batching statistics (batch occupancy, queue wait, batch time)"""
+    if scheduler is None:
+        return {"running": False}
+    return scheduler.get_stats()
+
 @app.post("/api/whatsapp/configure")
 async def configure_whatsapp(config: dict):
     """
@@ -0,0 +1,231 @@
+"""
+Session Manager - Isolated per-driver state for every connected client
+One loaded model serves all sessions; each session keeps its own
+SessionState (PoseAnalyzer timers) keyed by session id
+"""
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from models.session_state import SessionState
+from frame_queue import LatestFrameQueue
+
+
+class SessionManager:
+    """Keeps one SessionState per driver session"""
+
+    def __init__(self, idle_timeout: float = 300.0, eviction_interval: float = 30.0,
+                 annotate_default: bool = True, fatigue_window: float = 60.0):
+        """
+        Args:
+            idle_timeout: Seconds after which an idle REST session is dropped
+                          (WebSocket sessions are dropped on disconnect)
+            eviction_interval: Minimum seconds between idle sweeps
+            annotate_default: Whether new sessions get an annotated JPEG back
+                              (False = results-only: keypoints, box, overlay)
+            fatigue_window: Seconds covered by each session's PERCLOS and
+                            closure / head-down event statistics
+        """
+        self.idle_timeout = idle_timeout
+        self.annotate_default = annotate_default
+        self.eviction_interval = eviction_interval
+        self.fatigue_window = fatigue_window
+        self.sessions: Dict[str, Dict] = {}
+        self._last_eviction = time.time()
+
+    @staticmethod
+    def new_session_id(prefix: str = "session") -> str:
+        """Generate a unique session id"""
+        return f"{prefix}_{uuid.uuid4().hex[:12]}"
+
+    def open(self, session_id: Optional[str] = None, kind: str = "websocket") -> str:
+        """
+        Get or create a session
+
+        Args:
+            session_id: Existing id to resume, or None for a new session
+            kind: "websocket" or "rest"
+
+        Returns:
+            The session id
+        """
+        self.evict_idle()
+
+        if session_id is None:
+            session_id = self.new_session_id()
+
+        if session_id not in self.sessions:
+            self.sessions[session_id] = {
+                "state": SessionState(session_id, self.fatigue_window),
+                "queue": None,
+                "owner": None,  # Connection that owns the queue (the live WebSocket)
+                "recorder": None,  # SessionRecorder while the session is recording
+                "options": {
+                    "annotate": self.annotate_default,
+                    "imgsz": None  # Inference size override (None / 0 = deployment default)
+                },
+                "stats": {
+                    "kind": kind,
+                    "start_time": time.time(),
+                    "frames_processed": 0,
+                    "alarms": 0,
+                    "alarm_active": False
+                }
+            }
+        return session_id
+
+    def get_state(self, session_id: str) -> SessionState:
+        """Get the SessionState to send along with a frame"""
+        return self.sessions[session_id]["state"]
+
+    def attach_queue(self, session_id: str, maxsize: int = 1, owner=None):
+        """
+        Create the bounded ingest queue of a streaming (WebSocket) session
+
+        A client that reconnects with its session id before its old
+        connection was noticed dropping takes the session over: the old
+        queue is closed and the old owner returned, so the caller can close
+        that connection (whose close() then leaves the session alone).
+
+        Args:
+            owner: The connection the queue belongs to
+
+        Returns:
+            (queue, previous owner or None)
+        """
+        session = self.sessions[session_id]
+        previous = session["owner"]
+        if session["queue"] is not None:
+            session["queue"].close()
+        queue = LatestFrameQueue(maxsize)
+        session["queue"] = queue
+        session["owner"] = owner
+        return queue, previous
+
+    def attach_recorder(self, session_id: str, recorder):
+        """Start recording a session with the given SessionRecorder"""
+        self.sessions[session_id]["recorder"] = recorder
+
+    def get_recorder(self, session_id: str):
+        """The session's SessionRecorder, or None if it is not recording"""
+        session = self.sessions.get(session_id)
+        return session["recorder"] if session is not None else None
+
+    def detach_recorder(self, session_id: str):
+        """Take the session's SessionRecorder away (None if it was not recording)"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        recorder, session["recorder"] = session["recorder"], None
+        return recorder
+
+    def recording_sessions(self) -> List[str]:
+        """Ids of the sessions that are recording"""
+        return [session_id for session_id, session in self.sessions.items()
+                if session["recorder"] is not None]
+
+    def get_options(self, session_id: str) -> Dict:
+        """Get the per-session processing options"""
+        return self.sessions[session_id]["options"]
+
+    def set_options(self, session_id: str, **options) -> Dict:
+        """Change per-session processing options (unknown keys are ignored)"""
+        session_options = self.sessions[session_id]["options"]
+        for key, value in options.items():
+            if key in session_options and value is not None:
+                session_options[key] = value
+        return session_options
+
+    def update(self, session_id: str, result: Dict) -> bool:
+        """
+        Store the session state returned with a frame result
+        (a worker process returns an updated copy of the state)
+
+        Returns:
+            True if this frame started a new alarm (trigger_alarm went from
+            off to on), so alarms are counted once rather than per frame
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            return False
+
+        if result.get("session") is not None:
+            session["state"] = result["session"]
+        stats = session["stats"]
+        stats["frames_processed"] += 1
+
+        alarm = result["details"].trigger_alarm
+        alarm_started = alarm and not stats["alarm_active"]
+        stats["alarm_active"] = alarm
+        if alarm_started:
+            stats["alarms"] += 1
+        return alarm_started
+
+    def close(self, session_id: str, owner=None) -> bool:
+        """
+        Drop a session and its state (a recording is stopped and finishes in the background)
+
+        Args:
+            owner: The connection closing it; nothing happens if the session
+                   has been taken over by another connection since
+
+        Returns:
+            True if the session was dropped
+        """
+        session = self.sessions.get(session_id)
+        if session is None or (owner is not None and session["owner"] is not owner):
+            return False
+        del self.sessions[session_id]
+        if session["queue"] is not None:
+            session["queue"].close()
+        if session["recorder"] is not None:
+            session["recorder"].stop()
+        return True
+
+    def evict_idle(self):
+        """Drop REST sessions that have not sent a frame for idle_timeout seconds"""
+        now = time.time()
+        if now - self._last_eviction < self.eviction_interval:
+            return
+        self._last_eviction = now
+
+        expired = [
+            session_id for session_id, session in self.sessions.items()
+            if session["stats"]["kind"] == "rest"
+            and session["state"].idle_seconds(now) > self.idle_timeout
+        ]
+        for session_id in expired:
+            self.close(session_id)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+    def total_queue_depth(self) -> int:
+        """Frames waiting in all ingest queues"""
+        return sum(
+            len(session["queue"]) for session in self.sessions.values()
+            if session["queue"] is not None
+        )
+
+    def get_summary(self) -> Dict[str, Dict]:
+        """Get per-session stats (JSON serializable)"""
+        now = time.time()
+        summary = {}
+        for session_id, session in self.sessions.items():
+            summary[session_id] = {
+                **session["stats"],
+                **session["options"],
+                "idle_seconds": round(session["state"].idle_seconds(now), 1)
+            }
+            if session["queue"] is not None:
+                summary[session_id].update(session["queue"].get_stats())
+            if session["recorder"] is not None:
+                summary[session_id]["recording"] = session["recorder"].get_status()
+            if session["state"].tracker is not None:
+                summary[session_id]["tracking"] = session["state"].tracker.get_stats()
+            if session["state"].roi is not None:
+                summary[session_id]["roi"] = session["state"].roi.get_stats()
+        return summary
@@ -0,0 +1,184 @@
+"""
+Session Recorder - Live recording owned by one driver session
+Processed frames are handed over as the encoded image the session already
+has (the annotated JPEG / data URL, or the received image in results-only
+mode); a recorder thread decodes them, opens the session's VideoRecorder
+with the first frame's real size and writes video, activity log and
+keypoint store, so the event loop only appends to a queue
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import cv2
+
+from utils.video_recorder import VideoRecorder
+from frame_executor import decode_frame
+
+# Ends the recorder thread
+_STOP = object()
+
+
+def safe_session_name(session_id: str) -> str:
+    """Session id usable in file names (client-supplied ids may contain anything)"""
+    return re.sub(r"[^A-Za-z0-9_-]", "_", session_id)[:64] or "session"
+
+
+class SessionRecorder:
+    """Records one session's frames and results on its own thread"""
+
+    def __init__(self, session_id: str, output_dir: str = "recordings", fps: float = 15.0,
+                 queue_size: int = 32):
+        """
+        Args:
+            session_id: Session being recorded (part of the file names)
+            output_dir: VideoRecorder root directory
+            fps: Frame rate of the video file
+            queue_size: Frames allowed to wait for the recorder thread;
+                        when full the oldest is dropped
+        """
+        self.session_id = session_id
+        self.fps = fps
+        self.maxsize = max(1, int(queue_size))
+        self.recorder = VideoRecorder(output_dir=output_dir)
+        self.start_time = time.time()
+        self.frame_size = None  # (width, height) of the first frame, set when the video opens
+        self.video_file = None
+        self.result = None  # (video_file, log_file, summary_file) once finished
+        self.error = None
+
+        # Counters
+        self.frames_submitted = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+
+        self._items = deque()
+        self._ready = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"recorder-{safe_session_name(session_id)}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, image, activity: str, confidence: float, details, keypoints=None,
+               offset: int = 0) -> bool:
+        """
+        Queue a processed frame (never blocks; drops the oldest waiting frame when full)
+
+        Args:
+            image: Encoded frame - JPEG bytes, base64 string or data URL
+            activity, confidence, details: The frame's result
+            keypoints: (17, 3) keypoints for the keypoint store (None: nobody detected)
+            offset: Start of the image inside raw bytes
+
+        Returns:
+            False once the recording has been stopped
+        """
+        with self._ready:
+            if self._stopped:
+                return False
+            self.frames_submitted += 1
+            self._items.append((image, offset, activity, confidence, details, keypoints,
+                                time.time() - self.start_time))
+            if len(self._items) > self.maxsize:
+                self._items.popleft()
+                self.frames_dropped += 1
+            self._ready.notify()
+        return True
+
+    def stop(self):
+        """Stop accepting frames; the thread writes what is queued, then closes the files"""
+        with self._ready:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._items.append(_STOP)
+            self._ready.notify()
+
+    def finish(self, timeout: Optional[float] = None) -> Dict:
+        """
+        Stop and wait until the files are closed (blocking - run it off the event loop)
+
+        Returns:
+            video_file, log_file and the session summary (empty if no frame arrived)
+        """
+        self.stop()
+        self._thread.join(timeout)
+        video_file, log_file, summary_file = self.result or (None, None, None)
+        summary = {}
+        if summary_file and os.path.exists(summary_file):
+            with open(summary_file, 'r') as f:
+                summary = json.load(f)
+        return {
+            "video_file": video_file,
+            "log_file": log_file,
+            "summary": summary
+        }
+
+    def pending_frames(self) -> int:
+        """Frames waiting for the recorder thread"""
+        return len(self._items)
+
+    def get_status(self) -> Dict:
+        """Recording state and counters (JSON serializable)"""
+        return {
+            "recording": not self._stopped,
+            "video_file": self.video_file,
+            "frame_size": list(self.frame_size) if self.frame_size else None,
+            "fps": self.fps,
+            "frames_submitted": self.frames_submitted,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "pending_frames": self.pending_frames(),
+            "error": self.error
+        }
+
+    def _run(self):
+        """Recorder thread: decode and write queued frames in order until stopped"""
+        while True:
+            with self._ready:
+                while not self._items:
+                    self._ready.wait()
+                item = self._items.popleft()
+            if item is _STOP:
+                break
+            try:
+                self._write(*item)
+            except Exception as e:
+                self.error = str(e)
+                print(f"❌ Recording error ({self.session_id}): {e}")
+
+        try:
+            if self.frame_size is not None:
+                self.result = self.recorder.stop_recording()
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ Recording error ({self.session_id}): {e}")
+
+    def _write(self, image, offset, activity, confidence, details, keypoints, elapsed_seconds):
+        frame = decode_frame(image, offset)
+        if frame is None:
+            self.frames_dropped += 1
+            return
+
+        if self.frame_size is None:
+            # Lazy open: the video gets the real size of the session's frames
+            height, width = frame.shape[:2]
+            self.frame_size = (width, height)
+            self.video_file = self.recorder.start_recording(
+                width, height, fps=self.fps, session_name=safe_session_name(self.session_id)
+            )
+        elif frame.shape[1::-1] != self.frame_size:
+            # The client changed resolution mid-session
+            frame = cv2.resize(frame, self.frame_size)
+
+        self.recorder.write_frame(frame)
+        self.recorder.log_activity(activity, confidence, details,
+                                   elapsed_seconds=elapsed_seconds, keypoints=keypoints)
+        self.frames_written += 1
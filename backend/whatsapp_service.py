@@ -17,6 +17,10 @@ class WhatsAppService:
         self.enabled = False
         self.owner_phone = None
         self.api_key = None
+        
+        # Delivery counters (exported at /metrics)
+        self.messages_sent = 0
+        self.messages_failed = 0
     
     def configure(self, owner_phone: str, api_key: str, enabled: bool = True):
         """
@@ -86,22 +90,26 @@ class WhatsAppService:
             
             if response.status_code == 200:
                 self.last_sent_time = time.time()
+                self.messages_sent += 1
                 return {
                     "success": True,
                     "message": "WhatsApp alert sent successfully"
                 }
             else:
+                self.messages_failed += 1
                 return {
                     "success": False,
                     "error": f"API returned status {response.status_code}: {response.text}"
                 }
         
         except requests.exceptions.Timeout:
+            self.messages_failed += 1
             return {
                 "success": False,
                 "error": "Request timeout - check internet connection"
             }
         except Exception as e:
+            self.messages_failed += 1
             return {
                 "success": False,
                 "error": f"Failed to send WhatsApp: {str(e)}"
@@ -150,6 +158,8 @@ Driver is not responding to alarm. Please check immediately!"""
             "owner_phone": self.owner_phone if self.owner_phone else "Not set",
             "can_send": self.can_send(),
             "cooldown_remaining": int(cooldown_remaining),
+            "messages_sent": self.messages_sent,
+            "messages_failed": self.messages_failed,
             "last_sent": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.last_sent_time)) if self.last_sent_time > 0 else "Never"
         }
 
@@ -0,0 +1,443 @@
+"""
+Micro-benchmarks for the per-frame hot path - runs offline on CPU
+
+Times pose analysis, overlay drawing, the server's JPEG / base64 decode and
+encode, VideoRecorder writing and logging, and session summaries of long
+logs on stored fixtures (keypoint sequence + sample frames), so runs on
+different commits measure exactly the same inputs. No model is needed.
+
+Fixtures are generated (seeded, synthetic driver poses) on first use, or
+recorded from a real clip with --record-fixtures (needs the model).
+
+Usage:
+    python benchmark.py --output bench_base.json
+    python benchmark.py --output bench_new.json --baseline bench_base.json
+    python benchmark.py --compare bench_base.json bench_new.json --threshold 0.1
+    python benchmark.py --record-fixtures drive.mp4
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import subprocess
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from models.activity_detector import ActivityDetector
+from utils.pose_analyzer import PoseAnalyzer, analyze_poses
+from utils.video_recorder import VideoRecorder
+import frame_executor
+import wire_protocol
+
+DEFAULT_FIXTURES = os.path.join("benchmark_fixtures", "fixtures.npz")
+
+# Synthetic driver pose (COCO-17, 1280x720 frame): x, y, confidence
+_BASE_POSE = np.array([
+    [640, 260, 0.95],                    # nose
+    [610, 235, 0.9], [670, 235, 0.9],    # eyes
+    [580, 245, 0.8], [700, 245, 0.8],    # ears
+    [500, 400, 0.95], [780, 400, 0.95],  # shoulders
+    [460, 520, 0.9], [820, 520, 0.9],    # elbows
+    [540, 600, 0.85], [740, 600, 0.85],  # wrists
+    [540, 680, 0.7], [740, 680, 0.7],    # hips
+    [540, 710, 0.2], [740, 710, 0.2],    # knees (mostly out of frame)
+    [540, 719, 0.05], [740, 719, 0.05]   # ankles
+], dtype=np.float32)
+
+
+def synthetic_fixtures(frames=600, fps=20.0, seed=0):
+    """
+    Seeded driver pose sequence cycling through attentive driving, eye
+    closures, looking down, head turns and an empty seat, plus sample frames
+
+    Returns:
+        Dict of arrays: keypoints (N, 17, 3), present (N,), boxes (N, 4),
+        timestamps (N,) and frames (K, H, W, 3)
+    """
+    rng = np.random.default_rng(seed)
+    phases = ["attentive"] * 6 + ["eyes_closed", "attentive", "head_down", "turn_left",
+                                  "attentive", "turn_right", "eyes_closed", "absent"]
+    keypoints = np.zeros((frames, 17, 3), dtype=np.float32)
+    present = np.ones(frames, dtype=bool)
+    for i in range(frames):
+        phase = phases[(i // 40) % len(phases)]
+        pose = _BASE_POSE.copy()
+        pose[:, :2] += rng.normal(0, 2.0, (17, 2))
+        if phase == "eyes_closed":
+            pose[1:3, 2] = rng.uniform(0.05, 0.3, 2)
+        elif phase == "head_down":
+            pose[0:5, 1] += 70
+            pose[1:3, 2] = rng.uniform(0.3, 0.6, 2)
+        elif phase in ("turn_left", "turn_right"):
+            shift = -45 if phase == "turn_left" else 45
+            pose[0:3, 0] += shift
+            pose[3 if phase == "turn_left" else 4, 2] = 0.1
+        elif phase == "absent":
+            present[i] = False
+            pose[:] = 0
+        keypoints[i] = pose
+
+    boxes = np.zeros((frames, 4), dtype=np.float32)
+    visible = keypoints[..., 2] > 0.3
+    for i in np.flatnonzero(present):
+        points = keypoints[i, visible[i], :2]
+        boxes[i] = [*points.min(axis=0) - 20, *points.max(axis=0) + 20]
+
+    # Sample frames: textured scene (realistic JPEG sizes) with a driver shape
+    sample_frames = []
+    for k in range(4):
+        frame = cv2.GaussianBlur(rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8), (0, 0), 3 + k)
+        cv2.ellipse(frame, (640, 260), (90, 120), 0, 0, 360, (120, 140, 180), -1)
+        cv2.rectangle(frame, (460, 380), (820, 720), (60, 60, 90), -1)
+        sample_frames.append(frame)
+
+    return {
+        'keypoints': keypoints,
+        'present': present,
+        'boxes': boxes,
+        'timestamps': np.arange(frames, dtype=np.float64) / fps,
+        'frames': np.stack(sample_frames)
+    }
+
+
+def record_fixtures(video_path, model_name, max_frames=600, sample_frames=4):
+    """Fixtures with real keypoints and frames from a clip (runs the model)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Cannot open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0
+    if fps <= 0 or fps > 240:
+        fps = 20.0
+    detector = ActivityDetector(model_name=model_name)
+    session = detector.create_session("fixtures")
+
+    keypoints, present, boxes, frames = [], [], [], []
+    while len(keypoints) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        result = detector.process_batch([frame], [session], annotate=False)[0]
+        found = result['keypoints'] is not None
+        keypoints.append(result['keypoints'] if found else np.zeros((17, 3), dtype=np.float32))
+        boxes.append(result['box'] if result['box'] is not None else np.zeros(4, dtype=np.float32))
+        present.append(found)
+        frames.append(frame)
+    cap.release()
+    if not keypoints:
+        raise ValueError(f"No frames could be read from {video_path}")
+
+    picks = np.linspace(0, len(frames) - 1, min(sample_frames, len(frames))).astype(int)
+    return {
+        'keypoints': np.asarray(keypoints, dtype=np.float32),
+        'present': np.asarray(present, dtype=bool),
+        'boxes': np.asarray(boxes, dtype=np.float32),
+        'timestamps': np.arange(len(keypoints), dtype=np.float64) / fps,
+        'frames': np.stack([frames[i] for i in picks])
+    }
+
+
+def load_fixtures(path):
+    """Load stored fixtures, generating the synthetic set on first use"""
+    if not os.path.exists(path):
+        print(f"🧪 Generating fixtures: {path}")
+        save_fixtures(path, synthetic_fixtures())
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def save_fixtures(path, fixtures):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(path, **fixtures)
+
+
+def measure(fn, number, repeat):
+    """
+    Time fn() like timeit (garbage collector off)
+
+    Returns:
+        Dict with median / mean / min / stdev of the per-call time in
+        microseconds across repeats
+    """
+    fn()  # Warm-up (lazy imports, caches)
+    per_call = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            per_call.append((time.perf_counter() - start) / number * 1e6)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        'unit': 'us',
+        'median': round(statistics.median(per_call), 3),
+        'mean': round(statistics.mean(per_call), 3),
+        'min': round(min(per_call), 3),
+        'stdev': round(statistics.stdev(per_call), 3) if len(per_call) > 1 else 0.0,
+        'number': number,
+        'repeat': repeat
+    }
+
+
+def build_benchmarks(fixtures, workdir, scale=1.0, log_entries=50000):
+    """
+    Benchmarks as name -> (function, calls per repeat)
+
+    Args:
+        fixtures: Loaded fixtures
+        workdir: Scratch directory for recorder output
+        scale: Multiplier for the calls per repeat (--quick uses less)
+        log_entries: Activity log length for the session summary
+
+    Returns:
+        (benchmarks, recorders to stop when done)
+    """
+    keypoints = fixtures['keypoints']
+    present = fixtures['present']
+    boxes = fixtures['boxes']
+    timestamps = fixtures['timestamps'].tolist()
+    frame = np.ascontiguousarray(fixtures['frames'][0])
+    small = cv2.resize(frame, (640, 480), interpolation=cv2.INTER_AREA)
+    poses = [keypoints[i] if present[i] else None for i in range(len(keypoints))]
+    detected = [i for i in range(len(poses)) if poses[i] is not None]
+
+    def calls(n):
+        return max(1, int(n * scale))
+
+    benchmarks = {}
+
+    # --- Pose analysis ---
+    analyzer = PoseAnalyzer()
+    frame_index = itertools.cycle(range(len(poses)))
+    clock = {'t': 0.0}
+
+    def analyze_activity():
+        i = next(frame_index)
+        clock['t'] += 0.05
+        analyzer.analyze_activity(poses[i], clock['t'])
+    benchmarks['pose.analyze_activity'] = (analyze_activity, calls(2000))
+
+    batch_analyzers = [PoseAnalyzer() for _ in range(8)]
+    batch_start = itertools.cycle(range(0, len(detected) - 8, 8))
+
+    def analyze_poses_batch8():
+        start = next(batch_start)
+        clock['t'] += 0.05
+        analyze_poses(batch_analyzers, [poses[i] for i in detected[start:start + 8]], [clock['t']] * 8)
+    benchmarks['pose.analyze_poses_batch8'] = (analyze_poses_batch8, calls(500))
+
+    # --- Overlay drawing (drawn repeatedly into the same buffer) ---
+    detector = ActivityDetector(model_name=None)
+    analyzed = PoseAnalyzer()
+    results = [analyzed.analyze_activity(poses[i], timestamps[i]) for i in detected]
+    annotate_args = itertools.cycle([(keypoints[i], boxes[i], *result) for i, result in zip(detected, results)])
+    canvas = frame.copy()
+
+    def annotate_frame():
+        kp, box, activity, confidence, details = next(annotate_args)
+        detector.annotate_frame(canvas, kp, box, activity, confidence, details)
+    benchmarks['detector.annotate_frame'] = (annotate_frame, calls(500))
+
+    def draw_status():
+        detector.draw_status(canvas, "Eyes On Road (87.00%)", (0, 255, 0), "SAFE")
+    benchmarks['detector.draw_status'] = (draw_status, calls(1000))
+
+    # --- Server path: decode / encode (+ base64 data URLs) ---
+    jpeg = frame_executor.encode_frame(frame, 70)
+    data_url = frame_executor.encode_frame_data_url(frame, 70)
+    binary_message = wire_protocol.encode_frame(1, 0, jpeg)
+    header = wire_protocol.decode_header(binary_message)
+    benchmarks['server.decode_data_url'] = (lambda: frame_executor.decode_frame(data_url), calls(100))
+    benchmarks['server.decode_binary'] = (
+        lambda: frame_executor.decode_frame(binary_message, header['payload_offset']), calls(100))
+    benchmarks['server.decode_reduced_640'] = (
+        lambda: frame_executor.decode_frame_reduced(binary_message, header['payload_offset'], None, 640),
+        calls(200))
+    benchmarks['server.encode_jpeg'] = (lambda: frame_executor.encode_frame(small, 80), calls(200))
+    benchmarks['server.encode_data_url'] = (lambda: frame_executor.encode_frame_data_url(small, 80), calls(200))
+    details = results[0][2]
+    benchmarks['server.details_to_json'] = (details.to_json, calls(20000))
+    benchmarks['server.encode_result'] = (lambda: wire_protocol.encode_result(
+        1, 0, {"activity": results[0][0], "confidence": 0.87}, jpeg, details=details), calls(5000))
+
+    # --- VideoRecorder ---
+    recorder = VideoRecorder(output_dir=os.path.join(workdir, "recorder"))
+    recorder.start_recording(small.shape[1], small.shape[0], session_name="bench")
+    benchmarks['recorder.write_frame'] = (lambda: recorder.write_frame(small), calls(200))
+    async_recorder = VideoRecorder(output_dir=os.path.join(workdir, "async"), async_write=True,
+                                   overflow="drop_oldest")
+    async_recorder.start_recording(small.shape[1], small.shape[0], session_name="bench", keypoint_log=False)
+    benchmarks['recorder.write_frame_async'] = (lambda: async_recorder.write_frame(small), calls(200))
+    log_args = itertools.cycle([(keypoints[i], *result) for i, result in zip(detected, results)])
+
+    def log_activity():
+        kp, activity, confidence, details = next(log_args)
+        recorder.log_activity(activity, confidence, details, keypoints=kp)
+    benchmarks['recorder.log_activity'] = (log_activity, calls(20000))
+
+    summary_recorder = VideoRecorder(output_dir=os.path.join(workdir, "summary"))
+    summary_recorder.start_recording(640, 480, write_video=False, session_name="summary")
+    for k in range(log_entries):
+        activity, confidence, details = results[k % len(results)]
+        summary_recorder.log_activity(activity, confidence, details, elapsed_seconds=k / 20.0)
+    benchmarks[f'recorder.generate_session_summary_{log_entries // 1000}k'] = (
+        summary_recorder.generate_session_summary, calls(5))
+
+    return benchmarks, [recorder, async_recorder, summary_recorder]
+
+
+def get_git_commit():
+    """Short commit hash of the working tree (None outside git)"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(fixtures, repeat=5, scale=1.0, name_filter=None):
+    """Run all (or the matching) benchmarks and return the results document"""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmarks, recorders = build_benchmarks(fixtures, workdir, scale)
+        for name, (fn, number) in benchmarks.items():
+            if name_filter and not any(pattern in name for pattern in name_filter):
+                continue
+            results[name] = measure(fn, number, repeat)
+            print(f"  {name:<42}{results[name]['median']:>12.2f} us")
+        for recorder in recorders:
+            recorder.stop_recording()
+
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'git_commit': get_git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'fixture_frames': int(len(fixtures['keypoints'])),
+        'benchmarks': results
+    }
+
+
+def compare_runs(baseline, current, threshold=0.10):
+    """
+    Compare median times of two runs
+
+    Args:
+        baseline, current: Results documents (run_benchmarks / saved JSON)
+        threshold: Relative slowdown that counts as a regression
+
+    Returns:
+        List of dicts (name, baseline_us, current_us, change, status) with
+        status "regression", "improved", "ok", "new" or "removed"
+    """
+    rows = []
+    base, new = baseline['benchmarks'], current['benchmarks']
+    for name in list(base) + [n for n in new if n not in base]:
+        if name not in new:
+            rows.append({'name': name, 'baseline_us': base[name]['median'], 'current_us': None,
+                         'change': None, 'status': 'removed'})
+            continue
+        if name not in base:
+            rows.append({'name': name, 'baseline_us': None, 'current_us': new[name]['median'],
+                         'change': None, 'status': 'new'})
+            continue
+        before, after = base[name]['median'], new[name]['median']
+        change = (after - before) / before if before > 0 else 0.0
+        status = 'regression' if change > threshold else 'improved' if change < -threshold else 'ok'
+        rows.append({'name': name, 'baseline_us': before, 'current_us': after,
+                     'change': round(change, 4), 'status': status})
+    return rows
+
+
+def print_comparison(rows, threshold):
+    icons = {'regression': '🔴', 'improved': '🟢', 'ok': '  ', 'new': '🆕', 'removed': '➖'}
+    print()
+    print(f"{'benchmark':<44}{'base us':>12}{'new us':>12}{'change':>9}")
+    for row in rows:
+        change = f"{row['change']:+.1%}" if row['change'] is not None else '-'
+        base = f"{row['baseline_us']:.2f}" if row['baseline_us'] is not None else '-'
+        current = f"{row['current_us']:.2f}" if row['current_us'] is not None else '-'
+        print(f"{icons[row['status']]} {row['name']:<42}{base:>12}{current:>12}{change:>9}")
+    regressions = [row for row in rows if row['status'] == 'regression']
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) slower than +{threshold:.0%}")
+    else:
+        print(f"\n✅ No regressions (threshold +{threshold:.0%})")
+    return len(regressions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the frame hot path")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="Fixture file (.npz), generated if missing")
+    parser.add_argument("--record-fixtures", metavar="VIDEO", default=None,
+                        help="Record fixtures from a clip with the model, then exit")
+    parser.add_argument("--model", default="yolo11n-pose.pt", help="Model for --record-fixtures")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats per benchmark")
+    parser.add_argument("--quick", action="store_true", help="Fewer calls per repeat (noisier)")
+    parser.add_argument("--filter", nargs="+", default=None, help="Only benchmarks containing one of these")
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="Compare this run against a saved run")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), default=None,
+                        help="Only compare two saved runs")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        return 1 if print_comparison(compare_runs(baseline, current, args.threshold), args.threshold) else 0
+
+    if args.record_fixtures:
+        try:
+            fixtures = record_fixtures(args.record_fixtures, args.model)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"❌ {e}")
+            return 1
+        save_fixtures(args.fixtures, fixtures)
+        print(f"💾 {len(fixtures['keypoints'])} frames of fixtures saved to {args.fixtures}")
+        return 0
+
+    fixtures = load_fixtures(args.fixtures)
+    print(f"⏱️  Benchmarking on {len(fixtures['keypoints'])} fixture poses ({args.fixtures})")
+    results = run_benchmarks(fixtures, repeat=args.repeat, scale=0.2 if args.quick else 1.0,
+                             name_filter=args.filter)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📊 Results: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if args.filter:
+            # Benchmarks filtered out of this run are not "removed"
+            baseline['benchmarks'] = {name: entry for name, entry in baseline['benchmarks'].items()
+                                      if name in results['benchmarks']}
+        return 1 if print_comparison(compare_runs(baseline, results, args.threshold), args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Inference backend comparison - accuracy and speed of ONNX Runtime / OpenVINO
+(optionally INT8) against the PyTorch model on a reference clip.
+
+Every backend analyzes the same frames with its own session on video time,
+so keypoints, activities and alarms can be compared frame by frame.
+
+Usage:
+    python compare_backends.py reference.mp4
+    python compare_backends.py reference.mp4 --backends onnx openvino --int8 --output comparison.json
+"""
+import argparse
+import json
+import sys
+import time
+import cv2
+import numpy as np
+from models.activity_detector import ActivityDetector
+from models.inference_backend import BACKENDS
+
+
+def read_frames(video_path, max_frames=None):
+    """Decode the reference clip once (frames, fps)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Cannot open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0
+    if fps <= 0 or fps > 240:
+        fps = 20.0
+    frames = []
+    while max_frames is None or len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames, fps
+
+
+def run_backend(detector, frames, fps, batch_size=1):
+    """
+    Analyze all frames with one detector
+
+    Returns:
+        (results, seconds per frame spent in the model)
+    """
+    session = detector.create_session(detector.backend)
+    results = []
+    inference_seconds = 0.0
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+        timestamps = [(start + i) / fps for i in range(len(batch))]
+        batch_results = detector.process_batch(
+            batch, [session] * len(batch), annotate=False, timestamps=timestamps
+        )
+        for result in batch_results:
+            inference_seconds += result['timings'].get('inference', 0.0)
+            results.append(result)
+    return results, inference_seconds / max(len(frames), 1)
+
+
+def compare_results(reference, candidate, keypoint_confidence=0.5, pck_threshold=0.05):
+    """
+    Frame-by-frame agreement of a candidate backend with the reference
+
+    Keypoint error is measured on keypoints the reference is confident
+    about, in pixels and relative to the person box diagonal; PCK is the
+    share of those keypoints within pck_threshold of the diagonal.
+    """
+    pixel_errors = []
+    relative_errors = []
+    confidence_errors = []
+    detection_agree = activity_agree = alert_agree = alarm_agree = 0
+
+    for ref, cand in zip(reference, candidate):
+        ref_details, cand_details = ref['details'] or {}, cand['details'] or {}
+        activity_agree += ref['activity'] == cand['activity']
+        alert_agree += ref_details.get('alert_level') == cand_details.get('alert_level')
+        alarm_agree += bool(ref_details.get('trigger_alarm')) == bool(cand_details.get('trigger_alarm'))
+
+        ref_kp, cand_kp = ref['keypoints'], cand['keypoints']
+        detection_agree += (ref_kp is None) == (cand_kp is None)
+        if ref_kp is None or cand_kp is None:
+            continue
+
+        visible = ref_kp[:, 2] >= keypoint_confidence
+        if not visible.any():
+            continue
+        distances = np.linalg.norm(ref_kp[visible, :2] - cand_kp[visible, :2], axis=1)
+        pixel_errors.extend(distances.tolist())
+        if ref['box'] is not None:
+            x1, y1, x2, y2 = ref['box']
+            diagonal = max(float(np.hypot(x2 - x1, y2 - y1)), 1.0)
+            relative_errors.extend((distances / diagonal).tolist())
+        confidence_errors.extend(np.abs(ref_kp[:, 2] - cand_kp[:, 2]).tolist())
+
+    frames = max(len(reference), 1)
+    return {
+        'frames': len(reference),
+        'detection_agreement': round(detection_agree / frames, 4),
+        'activity_agreement': round(activity_agree / frames, 4),
+        'alert_level_agreement': round(alert_agree / frames, 4),
+        'alarm_agreement': round(alarm_agree / frames, 4),
+        'keypoint_error_px_mean': round(float(np.mean(pixel_errors)), 3) if pixel_errors else None,
+        'keypoint_error_px_p95': round(float(np.percentile(pixel_errors, 95)), 3) if pixel_errors else None,
+        'keypoint_error_relative_mean': round(float(np.mean(relative_errors)), 5) if relative_errors else None,
+        f'pck@{pck_threshold}': round(float(np.mean(np.array(relative_errors) <= pck_threshold)), 4) if relative_errors else None,
+        'keypoint_confidence_error_mean': round(float(np.mean(confidence_errors)), 4) if confidence_errors else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare inference backends against PyTorch on a reference clip")
+    parser.add_argument("video", help="Reference video clip")
+    parser.add_argument("--model", default="yolo11n-pose.pt", help="YOLO pose model")
+    parser.add_argument("--confidence", type=float, default=0.3, help="Detection confidence threshold")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "openvino"],
+                        choices=[b for b in BACKENDS if b != "pytorch"], help="Backends to compare")
+    parser.add_argument("--int8", action="store_true", help="Also compare INT8-quantized exports")
+    parser.add_argument("--imgsz", type=int, default=640, help="Export input size")
+    parser.add_argument("--cache-dir", default="model_cache", help="Exported model cache")
+    parser.add_argument("--batch-size", type=int, default=1, help="Frames per forward pass")
+    parser.add_argument("--max-frames", type=int, default=None, help="Only use the first N frames")
+    parser.add_argument("--output", default=None, help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        frames, fps = read_frames(args.video, args.max_frames)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"🎞️  {len(frames)} reference frames from {args.video}")
+
+    variants = [("pytorch", False)]
+    for backend in args.backends:
+        variants.append((backend, False))
+        if args.int8:
+            variants.append((backend, True))
+
+    report = {
+        'video': args.video,
+        'frames': len(frames),
+        'model': args.model,
+        'imgsz': args.imgsz,
+        'batch_size': args.batch_size,
+        'backends': {}
+    }
+    reference = None
+    for backend, int8 in variants:
+        name = f"{backend}-int8" if int8 else backend
+        print(f"🔄 Loading {name}...")
+        load_start = time.perf_counter()
+        detector = ActivityDetector(
+            model_name=args.model,
+            confidence_threshold=args.confidence,
+            backend=backend,
+            int8=int8,
+            model_cache_dir=args.cache_dir,
+            imgsz=args.imgsz
+        )
+        load_seconds = time.perf_counter() - load_start
+
+        # Untimed warm-up pass so one-off graph compilation isn't measured
+        detector.process_batch(frames[:1], [detector.create_session("warmup")], annotate=False)
+        results, seconds_per_frame = run_backend(detector, frames, fps, args.batch_size)
+
+        entry = {
+            'load_seconds': round(load_seconds, 2),
+            'inference_ms_per_frame': round(seconds_per_frame * 1000, 2),
+            'inference_fps': round(1.0 / seconds_per_frame, 1) if seconds_per_frame > 0 else None
+        }
+        if reference is None:
+            reference = results
+        else:
+            entry.update(compare_results(reference, results))
+            pytorch_ms = report['backends']['pytorch']['inference_ms_per_frame']
+            entry['speedup_vs_pytorch'] = round(pytorch_ms / entry['inference_ms_per_frame'], 2) \
+                if entry['inference_ms_per_frame'] else None
+        report['backends'][name] = entry
+
+    print()
+    print(f"{'backend':<16}{'ms/frame':>10}{'speedup':>9}{'kp err px':>11}{'activity':>10}{'alarm':>8}")
+    for name, entry in report['backends'].items():
+        kp_error = entry.get('keypoint_error_px_mean')
+        print(f"{name:<16}{entry['inference_ms_per_frame']:>10}"
+              f"{entry.get('speedup_vs_pytorch', 1.0) or '-':>9}"
+              f"{kp_error if kp_error is not None else '-':>11}"
+              f"{entry.get('activity_agreement', 1.0):>10}"
+              f"{entry.get('alarm_agreement', 1.0):>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📊 Report: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,82 @@
-from ultralytics import YOLO
 import numpy as np
 import cv2
-from utils.pose_analyzer import PoseAnalyzer
+import time
+from models.session_state import SessionState
+from models.keypoint_tracker import KeypointTracker
+from models.driver_roi import DriverROI
+from models.inference_backend import load_model
+from utils.activity_result import NO_PERSON_DETAILS
+from utils.pose_analyzer import analyze_poses
+
+# COCO-17 skeleton (pairs of keypoint indices) used for drawing
+SKELETON = [
+    (15, 13), (13, 11), (16, 14), (14, 12), (11, 12),   # Legs and hips
+    (5, 11), (6, 12), (5, 6),                           # Torso
+    (5, 7), (6, 8), (7, 9), (8, 10),                    # Arms
+    (1, 2), (0, 1), (0, 2), (1, 3), (2, 4), (3, 5), (4, 6)  # Face
+]
 
 class ActivityDetector:
     """
     Main activity detection class using YOLOv11 pose estimation
     """
     
-    def __init__(self, model_name='yolo11n-pose.pt', confidence_threshold=0.3):
+    def __init__(self, model_name='yolo11n-pose.pt', confidence_threshold=0.3,
+                 track_keypoints=False, tracking_interval=5, max_tracking_interval=15,
+                 roi_inference=False, roi_imgsz=320, roi_reacquire_interval=30,
+                 backend="pytorch", int8=False, model_cache_dir="model_cache", imgsz=640,
+                 fuse_model=False, fatigue_window=60.0):
         """
         Initialize the activity detector with OPTIMIZED settings
         
         Args:
-            model_name: YOLOv11 pose model (default: yolo11n-pose.pt - fast & accurate)
+            model_name: YOLOv11 pose model (default: yolo11n-pose.pt - fast & accurate);
+                        None skips loading (analysis / drawing only, e.g. benchmarks)
             confidence_threshold: OPTIMIZED to 0.3 (was 0.5) for better detection
+            track_keypoints: Adaptive mode - run pose inference only every N
+                             frames and track keypoints with optical flow in between
+            tracking_interval: Initial N (adapts to driver motion)
+            max_tracking_interval: Upper bound for the adaptive N
+            roi_inference: After a confident detection, run the next frames on
+                           a crop around the driver at a smaller input size
+            roi_imgsz: Inference size for driver crops (full frames use the
+                       model default)
+            roi_reacquire_interval: Full-frame detection every N frames in ROI mode
+            backend: Inference backend - "pytorch", "onnx" or "openvino"
+                     (exported once and cached in model_cache_dir)
+            int8: Use an INT8-quantized export (onnx/openvino only)
+            model_cache_dir: Directory for exported models
+            imgsz: Inference input size for full frames (and the export
+                   size for onnx/openvino); sessions can override it
+            fuse_model: PyTorch - load a cached checkpoint with layers
+                        already fused (created on first use)
+            fatigue_window: Seconds covered by each session's sliding-window
+                            fatigue statistics (PERCLOS, closure events)
         """
-        self.model = YOLO(model_name)
+        self.backend = backend
+        self.imgsz = imgsz
+        self.model = None
+        if model_name is not None:
+            self.model = load_model(model_name, backend=backend, int8=int8, imgsz=imgsz,
+                                    cache_dir=model_cache_dir, fuse=fuse_model)
         # OPTIMIZED: Lower confidence threshold for better detection
         self.confidence_threshold = confidence_threshold
-        self.pose_analyzer = PoseAnalyzer()
+        
+        # Keypoint tracking between inferences (per-session trackers)
+        self.track_keypoints = track_keypoints
+        self.tracking_interval = tracking_interval
+        self.max_tracking_interval = max_tracking_interval
+        
+        # Driver-ROI cropped inference (per-session regions)
+        self.roi_inference = roi_inference
+        self.roi_imgsz = roi_imgsz
+        self.roi_reacquire_interval = roi_reacquire_interval
+        
+        # Temporal state used when the caller does not pass its own session
+        # (single-driver use such as the Streamlit app)
+        self.fatigue_window = fatigue_window
+        self.default_session = SessionState("default", fatigue_window)
+        self.pose_analyzer = self.default_session.pose_analyzer
         
         # Driver monitoring color mapping for visualization (OPTIMIZED)
         self.activity_colors = {
@@ -43,92 +100,413 @@ class ActivityDetector:
             'CRITICAL': '🚨'
         }
     
-    def process_frame(self, frame):
+    def warmup(self, runs=2, frame_size=(480, 640), batch_size=1):
+        """
+        Run the model on blank frames so the first real frame doesn't pay for
+        lazy initialization (predictor setup, layer fusion, kernel selection)
+        
+        Sessions are not touched. In ROI mode the crop size is warmed up too.
+        
+        Args:
+            runs: Forward passes per input size
+            frame_size: (height, width) of the warmup frames
+            batch_size: Frames per warmup pass
+            
+        Returns:
+            Seconds spent warming up
+        """
+        start = time.perf_counter()
+        frames = [np.zeros((frame_size[0], frame_size[1], 3), dtype=np.uint8)] * max(1, batch_size)
+        sizes = [self.imgsz, self.roi_imgsz] if self.roi_inference else [self.imgsz]
+        for imgsz in sizes:
+            for _ in range(max(0, runs)):
+                self._predict(frames, imgsz)
+        return time.perf_counter() - start
+    
+    def create_session(self, session_id=None):
+        """
+        Create isolated per-driver state for this detector
+        
+        Args:
+            session_id: Identifier of the driver session
+            
+        Returns:
+            SessionState to pass to process_frame / process_batch
+        """
+        return SessionState(session_id, self.fatigue_window)
+    
+    def process_frame(self, frame, session=None, annotate=True, track=None, roi=None):
         """
         Process a single frame and detect activities
         
         Args:
             frame: Input frame (BGR format)
+            session: SessionState holding the driver's temporal state
+                     (default: the detector's own session)
+            annotate: Draw the overlay (False returns annotated_frame=None
+                      and skips all drawing)
+            track: Use keypoint tracking instead of inference when possible
+                   (default: the detector's track_keypoints setting)
+            roi: Run inference on a crop around the driver when possible
+                 (default: the detector's roi_inference setting)
             
         Returns:
-            annotated_frame: Frame with annotations
+            annotated_frame: Frame with annotations (None if annotate=False)
             activity: Detected activity
             confidence: Confidence score
-            details: Additional details
+            details: ActivityDetails (alert level, timers, alarm reason)
         """
-        # Run YOLOv11 pose estimation
-        results = self.model(frame, conf=self.confidence_threshold, verbose=False)
+        result = self.process_batch([frame], [session], annotate=annotate, track=track, roi=roi)[0]
+        return result['annotated_frame'], result['activity'], result['confidence'], result['details']
+    
+    def process_batch(self, frames, sessions=None, annotate=True, timestamps=None, track=None, roi=None,
+                      scales=None, imgsz=None):
+        """
+        Process several frames with a single batched YOLO forward pass
         
-        activity = "no_person"
-        confidence = 0.0
-        details = {}
+        Args:
+            frames: List of input frames (BGR format)
+            sessions: Optional list of SessionState objects, one per frame.
+                      None entries fall back to the detector's own session.
+            annotate: Draw the overlay on a copy of each frame. A list of
+                      booleans sets it per frame.
+            timestamps: Optional per-frame times in seconds used for the
+                        eye-closure / looking-down timers (e.g. video
+                        position when processing a file faster than real
+                        time). Default: the current wall-clock time.
+            track: Track keypoints between inferences for frames whose
+                   session's tracker allows it (default: track_keypoints)
+            roi: Crop inference to each session's driver region when it
+                 has one (default: roi_inference)
+            scales: Per-frame factor from frame pixels to original image
+                    pixels, for frames decoded at reduced resolution.
+                    Keypoints are rescaled before analysis and in the
+                    results; the overlay is drawn on the reduced frame.
+            imgsz: Full-frame inference size, one value or one per frame
+                   (default / None entries: the detector's imgsz)
+            
+        Returns:
+            List of dicts (one per frame) with keys annotated_frame, activity,
+            confidence, details, keypoints (17x3 array or None, original
+            image coordinates), box (x1, y1, x2, y2 array or None), tracked (keypoints came from the
+            tracker instead of the model) and timings (seconds spent in
+            inference or tracking, analyze and annotate)
+        """
+        if not frames:
+            return []
+        
+        if sessions is None:
+            sessions = [None] * len(frames)
+        sessions = [session or self.default_session for session in sessions]
+        if isinstance(annotate, bool):
+            annotate = [annotate] * len(frames)
+        if track is None:
+            track = self.track_keypoints
+        if roi is None:
+            roi = self.roi_inference
+        if scales is None:
+            scales = [1.0] * len(frames)
+        if not isinstance(imgsz, (list, tuple)):
+            imgsz = [imgsz] * len(frames)
+        sizes = [size or self.imgsz for size in imgsz]
+        
+        poses = [None] * len(frames)
+        timings = [{} for _ in frames]
+        grays = [None] * len(frames)
+        infer = list(range(len(frames)))
+        
+        if track:
+            # Frames of a session that appears more than once in the batch
+            # always get inference (their tracker updates depend on each other)
+            counts = {}
+            for session in sessions:
+                counts[id(session)] = counts.get(id(session), 0) + 1
+            
+            infer = []
+            for i, (frame, session) in enumerate(zip(frames, sessions)):
+                track_start = time.perf_counter()
+                grays[i] = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                tracker = self.get_tracker(session)
+                if counts[id(session)] == 1 and not tracker.needs_inference(grays[i]):
+                    keypoints, box = tracker.track(grays[i])
+                    if keypoints is not None:
+                        poses[i] = (keypoints, box, True)
+                        timings[i]['tracking'] = time.perf_counter() - track_start
+                        continue
+                infer.append(i)
+        
+        if infer:
+            # Run YOLOv11 pose estimation on all frames that need it at once
+            inference_start = time.perf_counter()
+            detections = self._detect(
+                [frames[i] for i in infer], [sessions[i] for i in infer], roi, [sizes[i] for i in infer]
+            )
+            inference_time = time.perf_counter() - inference_start
+            
+            for i, (keypoints, box) in zip(infer, detections):
+                if track:
+                    self.get_tracker(sessions[i]).update(grays[i], keypoints, box)
+                poses[i] = (keypoints, box, False)
+                # Every frame of the batch waited for the whole forward pass
+                timings[i]['inference'] = inference_time
+        
+        current_time = time.time()
+        if timestamps is None:
+            timestamps = [current_time] * len(frames)
+        
+        # Analyze every detected pose of the batch in one vectorized pass
+        # (in original image coordinates, so pixel thresholds hold)
+        originals = [self._to_original(keypoints, box, scale) for (keypoints, box, _), scale in zip(poses, scales)]
+        detected = [i for i, (keypoints, _) in enumerate(originals) if keypoints is not None]
+        analyses = {}
+        if detected:
+            stage_start = time.perf_counter()
+            results = analyze_poses(
+                [sessions[i].pose_analyzer for i in detected],
+                [originals[i][0] for i in detected],
+                [timestamps[i] for i in detected]
+            )
+            analyze_time = (time.perf_counter() - stage_start) / len(detected)
+            for i, result in zip(detected, results):
+                analyses[i] = result
+                timings[i]['analyze'] = analyze_time
         
-        # Process results
-        if len(results) > 0 and results[0].keypoints is not None:
-            result = results[0]
+        outputs = []
+        for i, (frame, session, draw) in enumerate(zip(frames, sessions, annotate)):
+            session.touch(current_time)
+            keypoints, box, tracked = poses[i]
+            output = self._build_output(frame, keypoints, box, originals[i], analyses.get(i), draw, timings[i])
+            output['tracked'] = tracked
+            outputs.append(output)
+        return outputs
+    
+    def _predict(self, frames, imgsz=None):
+        """Run the pose model on a list of frames"""
+        if imgsz is None:
+            return self.model(frames, conf=self.confidence_threshold, verbose=False)
+        return self.model(frames, conf=self.confidence_threshold, imgsz=imgsz, verbose=False)
+    
+    def _detect(self, frames, sessions, roi=False, sizes=None):
+        """
+        Detect the driver's pose in each frame
+        
+        In ROI mode, frames of sessions with a driver region are cropped and
+        run at roi_imgsz; crops that miss the driver fall back to full frame.
+        Full frames run at their entry in sizes (one forward pass per size).
+        
+        Returns:
+            List of (keypoints, box) in full-frame coordinates
+        """
+        detections = [None] * len(frames)
+        full = list(range(len(frames)))
+        
+        if roi:
+            crops = {}
+            for j, (frame, session) in enumerate(zip(frames, sessions)):
+                region = self.get_roi(session).get_crop(frame.shape)
+                if region is not None:
+                    crops[j] = region
+            full = [j for j in full if j not in crops]
             
-            # Check if person detected
-            if len(result.keypoints.data) > 0:
+            if crops:
+                crop_frames = [frames[j][y1:y2, x1:x2] for j, (x1, y1, x2, y2) in crops.items()]
+                results = self._predict(crop_frames, imgsz=self.roi_imgsz)
+                for (j, (x1, y1, _, _)), result in zip(crops.items(), results):
+                    keypoints, box = self.extract_pose(result)
+                    driver_roi = self.get_roi(sessions[j])
+                    if not driver_roi.is_confident(keypoints):
+                        # Driver left the crop: detect on the whole frame instead
+                        driver_roi.lost()
+                        full.append(j)
+                        continue
+                    
+                    # Map back to full-frame coordinates
+                    keypoints = keypoints.copy()
+                    keypoints[:, 0] += x1
+                    keypoints[:, 1] += y1
+                    if box is not None:
+                        box = box + np.array([x1, y1, x1, y1], dtype=box.dtype)
+                    driver_roi.update(keypoints, box, frames[j].shape, cropped=True)
+                    detections[j] = (keypoints, box)
+                full.sort()
+        
+        if sizes is None:
+            sizes = [self.imgsz] * len(frames)
+        groups = {}
+        for j in full:
+            groups.setdefault(sizes[j], []).append(j)
+        for size, group in groups.items():
+            results = self._predict([frames[j] for j in group], imgsz=size)
+            for j, result in zip(group, results):
                 # Get keypoints for the first person (can be extended for multiple people)
-                keypoints = result.keypoints.data[0].cpu().numpy()
-                
-                # Analyze activity (with time for eye closure tracking)
-                import time
-                current_time = time.time()
-                activity, confidence, details = self.pose_analyzer.analyze_activity(keypoints, current_time)
-                
-                # Annotate frame
-                annotated_frame = self.annotate_frame(frame.copy(), result, activity, confidence, details)
-            else:
-                annotated_frame = frame.copy()
-                self.draw_status(annotated_frame, "No Driver Detected", (200, 200, 200), "CAUTION")
-        else:
-            annotated_frame = frame.copy()
-            self.draw_status(annotated_frame, "No Driver Detected", (200, 200, 200), "CAUTION")
-        
-        return annotated_frame, activity, confidence, details
-    
-    def annotate_frame(self, frame, result, activity, confidence, details):
-        """
-        Draw annotations on the frame
+                keypoints, box = self.extract_pose(result)
+                if roi:
+                    self.get_roi(sessions[j]).update(keypoints, box, frames[j].shape, cropped=False)
+                detections[j] = (keypoints, box)
+        
+        return detections
+    
+    def get_roi(self, session=None):
+        """Get (or create) the driver region of a session"""
+        session = session or self.default_session
+        if session.roi is None:
+            session.roi = DriverROI(reacquire_interval=self.roi_reacquire_interval)
+        return session.roi
+    
+    def get_roi_stats(self, session=None):
+        """
+        Get ROI inference counters of a session (full-frame vs cropped passes)
+        
+        Returns:
+            Dict of counters, or None if the session never used ROI mode
+        """
+        session = session or self.default_session
+        return session.roi.get_stats() if session.roi is not None else None
+    
+    def get_tracker(self, session=None):
+        """Get (or create) the keypoint tracker of a session"""
+        session = session or self.default_session
+        if session.tracker is None:
+            session.tracker = KeypointTracker(
+                interval=self.tracking_interval,
+                max_interval=self.max_tracking_interval
+            )
+        return session.tracker
+    
+    def get_tracking_stats(self, session=None):
+        """
+        Get keypoint tracking counters of a session (inferences run and skipped)
+        
+        Returns:
+            Dict of counters, or None if the session never used tracking
+        """
+        session = session or self.default_session
+        return session.tracker.get_stats() if session.tracker is not None else None
+    
+    @staticmethod
+    def _to_original(keypoints, box, scale=1.0):
+        """Map keypoints / box from frame pixels to the original image (reduced-resolution decode)"""
+        if scale == 1.0:
+            return keypoints, box
+        if keypoints is not None:
+            keypoints = keypoints.copy()
+            keypoints[:, :2] *= scale
+        if box is not None:
+            box = box * scale
+        return keypoints, box
+    
+    def _build_output(self, frame, keypoints, box, original, analysis, annotate=True, timings=None):
+        """
+        Assemble one frame's result and draw the overlay
+        
+        keypoints / box are in frame pixels (used for drawing); original
+        holds them in original image coordinates (reported); analysis is
+        the PoseAnalyzer result, None if nobody was detected.
+        """
+        activity, confidence, details = analysis if analysis is not None else ("no_person", 0.0, NO_PERSON_DETAILS)
+        if timings is None:
+            timings = {}
+        
+        annotated_frame = None
+        if annotate:
+            stage_start = time.perf_counter()
+            annotated_frame = self.annotate_frame(frame.copy(), keypoints, box, activity, confidence, details)
+            timings['annotate'] = time.perf_counter() - stage_start
+        
+        return {
+            'annotated_frame': annotated_frame,
+            'activity': activity,
+            'confidence': confidence,
+            'details': details,
+            'keypoints': original[0],
+            'box': original[1],
+            'timings': timings
+        }
+    
+    def extract_pose(self, result):
+        """
+        Get the first detected person from a YOLO result
+        
+        Returns:
+            keypoints: (17, 3) array of x, y, confidence (None if no person)
+            box: (4,) array x1, y1, x2, y2 (None if unavailable)
+        """
+        if result.keypoints is None or len(result.keypoints.data) == 0:
+            return None, None
+        
+        keypoints = result.keypoints.data[0].cpu().numpy()
+        box = None
+        if result.boxes is not None and len(result.boxes) > 0:
+            box = result.boxes.xyxy[0].cpu().numpy()
+        return keypoints, box
+    
+    def get_overlay(self, activity, confidence, details):
+        """
+        Overlay primitives for a detection (what annotate_frame draws)
+        
+        Returns:
+            Dict with label (status text), color (BGR) and alert_level
+        """
+        if activity == "no_person":
+            return {
+                'label': "No Driver Detected",
+                'color': (200, 200, 200),
+                'alert_level': "CAUTION"
+            }
+        
+        activity_text = activity.replace('_', ' ').title()
+        return {
+            'label': f"{activity_text} ({confidence:.2%})",
+            'color': self.activity_colors.get(activity, (255, 255, 255)),
+            'alert_level': details.alert_level.name
+        }
+    
+    def annotate_frame(self, frame, keypoints, box, activity, confidence, details):
+        """
+        Draw annotations on the frame (in place)
         
         Args:
             frame: Input frame
-            result: YOLO result object
+            keypoints: (17, 3) keypoints or None
+            box: Person bounding box (x1, y1, x2, y2) or None
             activity: Detected activity
             confidence: Confidence score
-            details: Additional details dictionary
+            details: ActivityDetails of the frame
             
         Returns:
             annotated_frame: Frame with annotations
         """
-        # Draw pose keypoints and skeleton
-        if result.keypoints is not None and len(result.keypoints.data) > 0:
-            annotated_frame = result.plot()
-        else:
-            annotated_frame = frame
+        overlay = self.get_overlay(activity, confidence, details)
         
-        # Get activity color and alert level
-        color = self.activity_colors.get(activity, (255, 255, 255))
-        alert_level = details.get('alert_level', 'SAFE')
+        # Draw pose keypoints and skeleton
+        if keypoints is not None:
+            self.draw_pose(frame, keypoints)
         
         # Draw bounding box if available
-        if result.boxes is not None and len(result.boxes) > 0:
-            box = result.boxes[0]
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 3)
+        if box is not None:
+            x1, y1, x2, y2 = map(int, box)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), overlay['color'], 3)
         
         # Draw activity label with alert level
-        activity_text = activity.replace('_', ' ').title()
-        self.draw_status(annotated_frame, f"{activity_text} ({confidence:.2%})", color, alert_level)
+        self.draw_status(frame, overlay['label'], overlay['color'], overlay['alert_level'])
         
-        return annotated_frame
+        return frame
+    
+    def draw_pose(self, frame, keypoints, min_confidence=0.5):
+        """Draw the COCO-17 skeleton and keypoints"""
+        visible = keypoints[:, 2] >= min_confidence
+        points = keypoints[:, :2].astype(int)
+        
+        for start, end in SKELETON:
+            if visible[start] and visible[end]:
+                cv2.line(frame, tuple(points[start]), tuple(points[end]), (255, 128, 0), 2, cv2.LINE_AA)
+        
+        for (x, y), is_visible in zip(points, visible):
+            if is_visible:
+                cv2.circle(frame, (int(x), int(y)), 4, (0, 255, 0), -1, cv2.LINE_AA)
     
     def draw_status(self, frame, text, color, alert_level="SAFE"):
         """Draw status text on frame with alert level"""
-        # Add semi-transparent background
-        overlay = frame.copy()
-        
         # Color-code background based on alert level
         bg_colors = {
             'SAFE': (0, 100, 0),      # Dark green
@@ -138,8 +516,13 @@ class ActivityDetector:
         }
         bg_color = bg_colors.get(alert_level, (0, 0, 0))
         
-        cv2.rectangle(overlay, (10, 10), (650, 80), bg_color, -1)
-        cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
+        # Add semi-transparent background (blend only the status box,
+        # not a copy of the whole frame)
+        box_region = frame[10:81, 10:651]
+        if box_region.size > 0:
+            background = np.empty_like(box_region)
+            background[:] = bg_color
+            cv2.addWeighted(background, 0.7, box_region, 0.3, 0, box_region)
         
         # Draw alert icon and text
         icon = self.alert_icons.get(alert_level, '')
@@ -0,0 +1,107 @@
+import numpy as np
+
+class DriverROI:
+    """
+    Region of interest around the driver for cropped, low-resolution inference
+
+    The driver stays in roughly the same part of the cab, so after a confident
+    full-frame detection the next frames only need the area around the last
+    person box. The crop is run at a smaller inference size and the keypoints
+    are mapped back to full-frame coordinates. The ROI is dropped (next frame
+    runs full-frame) when the driver is lost, and a full-frame pass is forced
+    every reacquire_interval frames to pick up a driver who moved away.
+    One ROI belongs to one driver session.
+    """
+
+    def __init__(self, margin=0.5, min_confidence=0.5, reacquire_interval=30, min_size=96):
+        """
+        Args:
+            margin: Expansion of the person box on each side (fraction of its size)
+            min_confidence: Mean face/shoulder keypoint confidence needed to
+                            trust a detection (and keep cropping)
+            reacquire_interval: Force a full-frame detection every N frames
+            min_size: Minimum crop side in pixels
+        """
+        self.margin = margin
+        self.min_confidence = min_confidence
+        self.reacquire_interval = max(1, int(reacquire_interval))
+        self.min_size = min_size
+
+        self.region = None  # (x1, y1, x2, y2) in full-frame pixels
+        self.frame_shape = None
+        self.frames_since_full = 0
+
+        # Counters
+        self.full_frame_inferences = 0
+        self.roi_inferences = 0
+        self.fallbacks = 0
+
+    def get_crop(self, frame_shape):
+        """
+        Region to run inference on for the next frame
+
+        Returns:
+            (x1, y1, x2, y2) crop, or None for a full-frame pass
+        """
+        if (self.region is None
+                or self.frame_shape != frame_shape[:2]
+                or self.frames_since_full + 1 >= self.reacquire_interval):
+            return None
+        return self.region
+
+    def is_confident(self, keypoints):
+        """Check whether a detection is good enough to crop around"""
+        return keypoints is not None and float(np.mean(keypoints[:7, 2])) >= self.min_confidence
+
+    def update(self, keypoints, box, frame_shape, cropped):
+        """
+        Record a detection (in full-frame coordinates) and set the next crop
+
+        Args:
+            keypoints: (17, 3) keypoints or None
+            box: Person box (x1, y1, x2, y2) or None
+            frame_shape: Shape of the full frame
+            cropped: The detection came from a crop
+        """
+        if cropped:
+            self.roi_inferences += 1
+            self.frames_since_full += 1
+        else:
+            self.full_frame_inferences += 1
+            self.frames_since_full = 0
+
+        self.frame_shape = frame_shape[:2]
+        if box is None or not self.is_confident(keypoints):
+            self.region = None
+            return
+        self.region = self._expand(box, frame_shape)
+
+    def lost(self):
+        """The crop missed the driver: fall back to full-frame detection"""
+        self.fallbacks += 1
+        self.region = None
+
+    def _expand(self, box, frame_shape):
+        """Person box grown by the margin, at least min_size, clipped to the frame"""
+        height, width = frame_shape[:2]
+        x1, y1, x2, y2 = [float(v) for v in box]
+        half_w = max((x2 - x1) * (0.5 + self.margin), self.min_size / 2)
+        half_h = max((y2 - y1) * (0.5 + self.margin), self.min_size / 2)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        return (
+            int(max(0, cx - half_w)),
+            int(max(0, cy - half_h)),
+            int(min(width, cx + half_w)),
+            int(min(height, cy + half_h))
+        )
+
+    def get_stats(self):
+        """Get ROI counters (JSON serializable)"""
+        inferences = self.full_frame_inferences + self.roi_inferences
+        return {
+            'full_frame_inferences': self.full_frame_inferences,
+            'roi_inferences': self.roi_inferences,
+            'roi_rate': round(self.roi_inferences / inferences, 3) if inferences else 0.0,
+            'fallbacks': self.fallbacks,
+            'region': list(self.region) if self.region is not None else None
+        }
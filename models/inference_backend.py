@@ -0,0 +1,164 @@
+import os
+import shutil
+import cv2
+import numpy as np
+
+# Supported inference backends
+BACKENDS = ("pytorch", "onnx", "openvino")
+
+def _yolo(path, **kwargs):
+    """Construct an Ultralytics model (imported on first use - importing torch is slow)"""
+    from ultralytics import YOLO
+    return YOLO(path, **kwargs)
+
+def get_artifact_path(model_name, backend, int8=False, imgsz=640, cache_dir="model_cache", fuse=False):
+    """
+    Path of the cached exported model for a backend configuration
+
+    Returns:
+        For the PyTorch backend model_name itself, or the cached fused
+        checkpoint when fuse is set; otherwise a file (ONNX) or directory
+        (OpenVINO) inside cache_dir
+    """
+    stem = os.path.splitext(os.path.basename(model_name))[0]
+    if backend == "pytorch":
+        return os.path.join(cache_dir, f"{stem}_fused.pt") if fuse else model_name
+
+    suffix = "_int8" if int8 else ""
+    if backend == "onnx":
+        return os.path.join(cache_dir, f"{stem}_{imgsz}{suffix}.onnx")
+    return os.path.join(cache_dir, f"{stem}_{imgsz}{suffix}_openvino_model")
+
+def export_model(model_name, backend, int8=False, imgsz=640, cache_dir="model_cache",
+                 calibration_video=None, int8_data="coco8-pose.yaml", fuse=False):
+    """
+    Export a YOLO pose model for a CPU backend (cached: exported once)
+
+    Args:
+        model_name: PyTorch weights, e.g. yolo11n-pose.pt
+        backend: "pytorch", "onnx" or "openvino"
+        int8: Quantize weights/activations to INT8
+        imgsz: Export input size (exports use dynamic shapes so batches
+               and smaller ROI sizes still work)
+        cache_dir: Where exported models are kept
+        calibration_video: ONNX INT8 - video whose frames calibrate static
+                           quantization (without it weights-only dynamic
+                           quantization is used)
+        int8_data: OpenVINO INT8 - dataset YAML for NNCF calibration
+        fuse: PyTorch - cache a checkpoint with Conv+BatchNorm already fused,
+              so loading skips the fuse pass on every start
+
+    Returns:
+        Path to load with YOLO(path)
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend} (choose from {', '.join(BACKENDS)})")
+
+    artifact = get_artifact_path(model_name, backend, int8, imgsz, cache_dir, fuse)
+    if artifact == model_name or os.path.exists(artifact):
+        return artifact
+
+    os.makedirs(cache_dir, exist_ok=True)
+    print(f"📦 Exporting {model_name} to {backend}{' INT8' if int8 else ''}{' (fused)' if fuse else ''} (one-time)...")
+    model = _yolo(model_name)
+
+    if backend == "pytorch":
+        model.fuse()
+        # Write next to the target and rename, so a concurrent loader never
+        # sees a half-written checkpoint
+        partial = artifact + ".partial"
+        model.save(partial)
+        os.replace(partial, artifact)
+    elif backend == "onnx":
+        exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            quantize_onnx(exported, artifact, calibration_video, imgsz)
+        else:
+            shutil.move(exported, artifact)
+    else:
+        exported = model.export(format="openvino", imgsz=imgsz, dynamic=True,
+                                int8=int8, data=int8_data if int8 else None)
+        shutil.move(exported, artifact)
+
+    print(f"✅ Cached model: {artifact}")
+    return artifact
+
+def quantize_onnx(source, target, calibration_video=None, imgsz=640, calibration_frames=64):
+    """
+    Quantize an ONNX pose model to INT8
+
+    With a calibration video, activations and weights are quantized (static
+    QDQ, best CPU speedup); otherwise only weights are (dynamic)
+    """
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    )
+
+    if calibration_video is None:
+        quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+        return
+
+    class FrameReader(CalibrationDataReader):
+        """Feeds letterboxed video frames to the calibrator"""
+
+        def __init__(self, input_name, frames):
+            self.samples = iter([{input_name: frame} for frame in frames])
+
+        def get_next(self):
+            return next(self.samples, None)
+
+    import onnxruntime
+    input_name = onnxruntime.InferenceSession(source, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    frames = read_calibration_frames(calibration_video, imgsz, calibration_frames)
+    quantize_static(
+        source, target, FrameReader(input_name, frames),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8
+    )
+
+def read_calibration_frames(video_path, imgsz=640, count=64):
+    """Evenly spaced frames of a video, preprocessed like YOLO input (1, 3, imgsz, imgsz)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Cannot open calibration video: {video_path}")
+
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    step = max(1, total // count)
+    frames = []
+    index = 0
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % step == 0:
+            frames.append(letterbox(frame, imgsz))
+        index += 1
+    cap.release()
+    return frames
+
+def letterbox(frame, imgsz=640):
+    """Resize keeping aspect ratio, pad to a square, BGR->RGB, CHW float32 in [0, 1]"""
+    height, width = frame.shape[:2]
+    scale = imgsz / max(height, width)
+    resized = cv2.resize(frame, (int(round(width * scale)), int(round(height * scale))))
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top = (imgsz - resized.shape[0]) // 2
+    left = (imgsz - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return blob[np.newaxis]
+
+def load_model(model_name='yolo11n-pose.pt', backend="pytorch", int8=False, imgsz=640,
+               cache_dir="model_cache", fuse=False, **export_options):
+    """
+    Load a pose model on the selected backend
+
+    Exported backends go through the same Ultralytics predictor, so results
+    (keypoints (17, 3) per person, boxes) look exactly like the PyTorch ones
+    and ActivityDetector / PoseAnalyzer need no changes.
+    """
+    path = export_model(model_name, backend, int8, imgsz, cache_dir, fuse=fuse, **export_options)
+    if backend == "pytorch":
+        return _yolo(path)
+    return _yolo(path, task="pose")
@@ -0,0 +1,176 @@
+import cv2
+import numpy as np
+
+# Face (nose, eyes, ears) and shoulders - the keypoints the driver-state
+# rules depend on and that have enough texture to track
+TRACKED_KEYPOINTS = np.array([0, 1, 2, 3, 4, 5, 6])
+
+class KeypointTracker:
+    """
+    Propagates pose keypoints between YOLO inferences with sparse optical flow
+
+    Full pose inference runs every N frames (or sooner when tracking looks
+    unreliable); in between, the face and shoulder keypoints are moved with
+    pyramidal Lucas-Kanade flow and every other keypoint follows their median
+    motion. N adapts to how much the driver moves: it grows while the driver
+    sits still and shrinks on fast motion.
+
+    Keypoint confidences (used for eye-closure detection) are those of the
+    last inference, so eye state is refreshed at least every N frames.
+    One tracker belongs to one driver session.
+    """
+
+    def __init__(self, interval=5, min_interval=1, max_interval=15,
+                 min_confidence=0.5, keypoint_confidence=0.5,
+                 low_motion=0.005, high_motion=0.03):
+        """
+        Args:
+            interval: Initial frames between inferences (N)
+            min_interval, max_interval: Bounds for the adaptive N
+            min_confidence: Run inference when tracking confidence falls below this
+            keypoint_confidence: Only keypoints at least this confident are tracked
+            low_motion: Motion (fraction of shoulder width per frame) below
+                        which N grows
+            high_motion: Motion above which N shrinks and the next frame
+                         gets a fresh inference
+        """
+        self.min_interval = max(1, int(min_interval))
+        self.max_interval = max(self.min_interval, int(max_interval))
+        self.interval = min(max(int(interval), self.min_interval), self.max_interval)
+        self.min_confidence = min_confidence
+        self.keypoint_confidence = keypoint_confidence
+        self.low_motion = low_motion
+        self.high_motion = high_motion
+
+        self.prev_gray = None
+        self.keypoints = None
+        self.box = None
+        self.confidence = 0.0
+        self.motion = 0.0
+        self.frames_since_inference = 0
+
+        # Counters
+        self.inferences = 0
+        self.tracked_frames = 0
+
+    def needs_inference(self, gray):
+        """Check whether the next frame must go through the pose model"""
+        return (
+            self.keypoints is None
+            or self.prev_gray is None
+            or self.prev_gray.shape != gray.shape
+            or self.frames_since_inference + 1 >= self.interval
+            or self.confidence < self.min_confidence
+        )
+
+    def update(self, gray, keypoints, box):
+        """
+        Use a fresh inference result as the new tracking reference and adapt N
+
+        Args:
+            gray: Grayscale frame the keypoints were detected on
+            keypoints: (17, 3) keypoints or None if nobody was detected
+            box: Person box (x1, y1, x2, y2) or None
+        """
+        self.inferences += 1
+
+        if self.keypoints is not None and keypoints is not None:
+            # Motion since the last reference, per frame
+            visible = TRACKED_KEYPOINTS[
+                (self.keypoints[TRACKED_KEYPOINTS, 2] >= self.keypoint_confidence)
+                & (keypoints[TRACKED_KEYPOINTS, 2] >= self.keypoint_confidence)
+            ]
+            if len(visible) > 0:
+                shift = np.median(keypoints[visible, :2] - self.keypoints[visible, :2], axis=0)
+                frame_motion = self._relative_motion(shift) / (self.frames_since_inference + 1)
+                self.motion = 0.7 * self.motion + 0.3 * frame_motion
+
+            if self.motion > self.high_motion:
+                self.interval = max(self.min_interval, self.interval // 2)
+            elif self.motion < self.low_motion:
+                self.interval = min(self.max_interval, self.interval + 1)
+
+        self.prev_gray = gray
+        self.keypoints = keypoints.copy() if keypoints is not None else None
+        self.box = box.copy() if box is not None else None
+        self.confidence = 1.0 if keypoints is not None else 0.0
+        self.frames_since_inference = 0
+
+    def track(self, gray):
+        """
+        Propagate the keypoints to a new frame
+
+        Args:
+            gray: Grayscale frame
+
+        Returns:
+            keypoints: (17, 3) propagated keypoints, or None if tracking failed
+            box: Shifted person box (None if unavailable)
+        """
+        indices = TRACKED_KEYPOINTS[self.keypoints[TRACKED_KEYPOINTS, 2] >= self.keypoint_confidence]
+        if len(indices) < 2:
+            self.confidence = 0.0
+            return None, None
+
+        p0 = self.keypoints[indices, :2].astype(np.float32).reshape(-1, 1, 2)
+        lk_params = dict(
+            winSize=(21, 21),
+            maxLevel=3,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+        )
+        p1, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, p0, None, **lk_params)
+        # Forward-backward check rejects points that drifted onto other texture
+        p0_back, status_back, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, p1, None, **lk_params)
+        fb_error = np.linalg.norm((p0 - p0_back).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (status_back.ravel() == 1) & (fb_error < 1.0)
+
+        if not good.any():
+            self.confidence = 0.0
+            return None, None
+
+        displacement = (p1 - p0).reshape(-1, 2)
+        shift = np.median(displacement[good], axis=0)
+
+        frame_motion = self._relative_motion(shift)
+        self.motion = 0.7 * self.motion + 0.3 * frame_motion
+
+        keypoints = self.keypoints.copy()
+        keypoints[:, :2] += shift
+        keypoints[indices[good], :2] = p1.reshape(-1, 2)[good]
+
+        box = None
+        if self.box is not None:
+            box = self.box.copy()
+            box[[0, 2]] += shift[0]
+            box[[1, 3]] += shift[1]
+
+        self.confidence *= good.mean()
+        if frame_motion > self.high_motion:
+            # Fast movement: re-detect on the next frame
+            self.confidence = 0.0
+
+        self.prev_gray = gray
+        self.keypoints = keypoints
+        self.box = box
+        self.frames_since_inference += 1
+        self.tracked_frames += 1
+        return keypoints.copy(), box
+
+    def _relative_motion(self, shift):
+        """Length of a displacement relative to body size (shoulder width, else box width)"""
+        scale = abs(self.keypoints[5, 0] - self.keypoints[6, 0])
+        if scale < 1 and self.box is not None:
+            scale = self.box[2] - self.box[0]
+        return float(np.linalg.norm(shift)) / max(scale, 1.0)
+
+    def get_stats(self):
+        """Get tracking counters (JSON serializable)"""
+        frames = self.inferences + self.tracked_frames
+        return {
+            'inferences': self.inferences,
+            'skipped_inferences': self.tracked_frames,
+            'skip_rate': round(self.tracked_frames / frames, 3) if frames else 0.0,
+            'current_interval': self.interval,
+            'tracking_confidence': round(self.confidence, 3),
+            'motion': round(self.motion, 4)
+        }
@@ -0,0 +1,35 @@
+import time
+from utils.pose_analyzer import PoseAnalyzer
+
+class SessionState:
+    """
+    Lightweight per-driver state kept separately from the YOLO model
+
+    One ActivityDetector (heavy, model weights) can serve any number of
+    SessionState objects (small, plain Python attributes), so drivers never
+    share eye-closure / looking-down timers. Instances are picklable and can
+    travel to a worker process and back with each frame.
+    """
+
+    def __init__(self, session_id=None, fatigue_window=60.0):
+        """
+        Args:
+            session_id: Identifier of the driver session (optional)
+            fatigue_window: Seconds covered by the PERCLOS / event statistics
+        """
+        self.session_id = session_id
+        self.pose_analyzer = PoseAnalyzer(fatigue_window)
+        self.tracker = None  # KeypointTracker, created when tracking is used
+        self.roi = None      # DriverROI, created when ROI inference is used
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+
+    def touch(self, current_time=None):
+        """Mark the session as active"""
+        self.last_seen = current_time if current_time is not None else time.time()
+
+    def idle_seconds(self, current_time=None):
+        """Seconds since the session last processed a frame"""
+        if current_time is None:
+            current_time = time.time()
+        return current_time - self.last_seen
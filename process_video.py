@@ -0,0 +1,82 @@
+"""
+Offline video analysis - process a recorded trip without the Streamlit UI
+Runs decode, batched inference and writing in parallel and produces the same
+annotated video, JSONL activity log and summary as a live recording
+(utils.video_recorder.export_csv converts the log to CSV).
+
+Usage:
+    python process_video.py trip.mp4
+    python process_video.py trip.mp4 --batch-size 16 --no-video
+"""
+import argparse
+import json
+import sys
+from models.activity_detector import ActivityDetector
+from models.inference_backend import BACKENDS
+from utils.video_pipeline import VideoPipeline
+
+
+def print_progress(frames_done, total_frames):
+    """Single-line progress indicator"""
+    if frames_done % 50 and frames_done != total_frames:
+        return
+    if total_frames:
+        print(f"\r   {frames_done}/{total_frames} frames ({frames_done / total_frames:.0%})", end="", flush=True)
+    else:
+        print(f"\r   {frames_done} frames", end="", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a recorded driving video offline")
+    parser.add_argument("video", help="Input video file")
+    parser.add_argument("--model", default="yolo11n-pose.pt", help="YOLO pose model")
+    parser.add_argument("--backend", default="pytorch", choices=BACKENDS, help="Inference backend")
+    parser.add_argument("--int8", action="store_true", help="Use an INT8-quantized export (onnx/openvino)")
+    parser.add_argument("--confidence", type=float, default=0.3, help="Detection confidence threshold")
+    parser.add_argument("--batch-size", type=int, default=8, help="Frames per inference batch")
+    parser.add_argument("--queue-size", type=int, default=32, help="Frames buffered between stages")
+    parser.add_argument("--output-dir", default="recordings", help="Where videos and logs are written")
+    parser.add_argument("--max-frames", type=int, default=None, help="Only process the first N frames")
+    parser.add_argument("--no-video", action="store_true",
+                        help="Only write the activity log and summary (no annotated video)")
+    args = parser.parse_args(argv)
+
+    print("🔄 Loading YOLOv11 model...")
+    detector = ActivityDetector(
+        model_name=args.model,
+        confidence_threshold=args.confidence,
+        backend=args.backend,
+        int8=args.int8
+    )
+    print("✅ Model loaded successfully!")
+
+    pipeline = VideoPipeline(
+        detector,
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
+        output_dir=args.output_dir,
+        write_video=not args.no_video
+    )
+
+    print(f"🎞️  Processing {args.video}...")
+    try:
+        result = pipeline.run(args.video, max_frames=args.max_frames, progress_callback=print_progress)
+    except (FileNotFoundError, OSError) as e:
+        print(f"\n❌ {e}")
+        return 1
+    print()
+    if result['cancelled']:
+        print("⏹️ Cancelled - partial results saved")
+
+    print(f"✅ {result['frames_processed']} frames in {result['processing_seconds']}s "
+          f"({result['processing_fps']} FPS, {result['realtime_factor']}x real time)")
+    if result['video_file']:
+        print(f"🎥 Video:   {result['video_file']}")
+    print(f"📝 Log:     {result['log_file']}")
+    print(f"📊 Summary: {result['summary_file']}")
+    print(json.dumps(result['summary'].get('activity_counts', {}), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import json
+import struct
+from collections import namedtuple
+from collections.abc import Mapping
+from enum import IntEnum
+
+
+class Activity(IntEnum):
+    """Activity codes in priority order (classify_activities returns these)"""
+    NO_DRIVER_DETECTED = 0
+    SLEEPING_EYES_CLOSED = 1
+    LOOKING_DOWN_PHONE = 2
+    DROWSY_EYES_CLOSING = 3
+    LOOKING_DOWN_WARNING = 4
+    SLEEPING_HORIZONTAL = 5
+    EYES_ON_ROAD = 6
+    LOOKING_LEFT = 7
+    LOOKING_RIGHT = 8
+    DRIVER_DETECTED = 9
+    NO_PERSON = 10  # Detector found nobody to analyze (empty details)
+
+    @property
+    def label(self):
+        """Name used in responses and logs, e.g. 'eyes_on_road'"""
+        return _LABELS[self]
+
+
+class AlertLevel(IntEnum):
+    SAFE = 0
+    CAUTION = 1
+    WARNING = 2
+    CRITICAL = 3
+
+
+class Danger(IntEnum):
+    LOW = 0
+    MEDIUM = 1
+    HIGH = 2
+
+
+# Sliding-window drowsiness figures (DrowsinessWindow.stats)
+FatigueStats = namedtuple("FatigueStats", (
+    "perclos", "head_down_ratio", "eye_closure_events", "head_down_events",
+    "mean_closure_duration", "closures_per_minute", "observed_seconds"
+))
+
+_BY_CODE = tuple(Activity)
+_LABELS = {activity: activity.name.lower() for activity in Activity}
+ACTIVITY_CODES = {label: activity for activity, label in _LABELS.items()}
+
+# activity -> (alert_level, danger, trigger_alarm, alarm_reason template)
+ACTIVITY_RULES = {
+    Activity.NO_DRIVER_DETECTED: (AlertLevel.CRITICAL, Danger.LOW, False, None),
+    Activity.SLEEPING_EYES_CLOSED: (AlertLevel.CRITICAL, Danger.HIGH, True, "Eyes closed for {eyes:.1f}s"),
+    Activity.LOOKING_DOWN_PHONE: (AlertLevel.CRITICAL, Danger.HIGH, True, "Looking down for {down:.1f}s"),
+    Activity.DROWSY_EYES_CLOSING: (AlertLevel.WARNING, Danger.HIGH, False, "Eyes closing... {eyes:.1f}s"),
+    Activity.LOOKING_DOWN_WARNING: (AlertLevel.WARNING, Danger.HIGH, False, "Looking down... {down:.1f}s"),
+    Activity.SLEEPING_HORIZONTAL: (AlertLevel.CRITICAL, Danger.HIGH, True, "Body horizontal (sleeping)"),
+    Activity.EYES_ON_ROAD: (AlertLevel.SAFE, Danger.LOW, False, "Eyes open, looking forward"),
+    Activity.LOOKING_LEFT: (AlertLevel.CAUTION, Danger.MEDIUM, False, "Looking left"),
+    Activity.LOOKING_RIGHT: (AlertLevel.CAUTION, Danger.MEDIUM, False, "Looking right"),
+    Activity.DRIVER_DETECTED: (AlertLevel.SAFE, Danger.LOW, False, "Driver detected"),
+    Activity.NO_PERSON: (AlertLevel.SAFE, Danger.LOW, False, None)
+}
+
+# Activities whose details report the running timer
+EYE_TIMER_ACTIVITIES = frozenset((Activity.SLEEPING_EYES_CLOSED, Activity.DROWSY_EYES_CLOSING))
+HEAD_TIMER_ACTIVITIES = frozenset((Activity.LOOKING_DOWN_PHONE, Activity.LOOKING_DOWN_WARNING))
+
+# Keys of the details mapping per activity (same keys the details dicts had)
+_FULL_KEYS = ("alert_level", "danger", "eyes_closed_duration", "looking_down_duration",
+              "trigger_alarm", "alarm_reason")
+_KEYS = {activity: _FULL_KEYS for activity in Activity}
+_KEYS[Activity.NO_DRIVER_DETECTED] = ("alert_level", "eyes_closed_duration",
+                                      "looking_down_duration", "trigger_alarm")
+_KEYS[Activity.NO_PERSON] = ()
+_FATIGUE_KEYS = {activity: keys + ("fatigue",) for activity, keys in _KEYS.items()}
+_KEY_SETS = {activity: frozenset(keys) for activity, keys in _KEYS.items()}
+_FATIGUE_KEY_SETS = {activity: frozenset(keys) for activity, keys in _FATIGUE_KEYS.items()}
+
+_GETTERS = {
+    "alert_level": lambda d: d.alert_level.name,
+    "danger": lambda d: d.danger.name,
+    "eyes_closed_duration": lambda d: d.eyes_closed_duration,
+    "looking_down_duration": lambda d: d.looking_down_duration,
+    "trigger_alarm": lambda d: d.trigger_alarm,
+    "alarm_reason": lambda d: d.alarm_reason,
+    "fatigue": lambda d: d.fatigue._asdict()
+}
+
+
+def _json_fragments(activity):
+    """Constant JSON pieces around the two durations (and the reason)"""
+    alert_level, danger, trigger_alarm, _ = ACTIVITY_RULES[activity]
+    keys = _KEYS[activity]
+    head = '{"alert_level":"%s",' % alert_level.name
+    if "danger" in keys:
+        head += '"danger":"%s",' % danger.name
+    tail = ',"trigger_alarm":%s' % ("true" if trigger_alarm else "false")
+    return head + '"eyes_closed_duration":', ',"looking_down_duration":', tail
+
+
+_JSON = {activity: _json_fragments(activity) for activity in Activity}
+_JSON[Activity.NO_PERSON] = None
+
+
+class ActivityDetails(Mapping):
+    """
+    Per-frame analysis details, replacing the details dict
+
+    Holds only the activity code and the two timers; alert level, danger,
+    alarm flag and reason come from ACTIVITY_RULES, and the reason string
+    is formatted on first access. Attributes are typed (AlertLevel,
+    Danger, ...), while the read-only mapping interface returns the
+    strings the details dicts held, so details['alert_level'] and
+    details.get('trigger_alarm') keep working. NO_PERSON details are an
+    empty (falsy) mapping like the old {}.
+    """
+    __slots__ = ("activity", "eyes_closed_duration", "looking_down_duration", "fatigue", "_reason")
+
+    # activity, alert_level, danger, flags, eyes, down, then the FatigueStats
+    # fields (perclos, head_down_ratio, mean_closure_duration,
+    # closures_per_minute, observed_seconds, eye_closure_events, head_down_events)
+    BINARY = struct.Struct("!BBBBfffffffHH")
+    FLAG_TRIGGER_ALARM = 0x01
+    FLAG_FATIGUE = 0x02
+
+    def __init__(self, activity, eyes_closed_duration=0.0, looking_down_duration=0.0, fatigue=None):
+        """
+        Args:
+            activity: Activity code
+            eyes_closed_duration, looking_down_duration: Timer values; only
+                kept for the activities that report them, as before
+            fatigue: FatigueStats of the driver's sliding window (adds a
+                     "fatigue" key), None when there was nobody to analyze
+        """
+        self.activity = activity = _BY_CODE[activity]  # Faster than Activity(code)
+        self.eyes_closed_duration = float(eyes_closed_duration) if activity in EYE_TIMER_ACTIVITIES else 0.0
+        self.looking_down_duration = float(looking_down_duration) if activity in HEAD_TIMER_ACTIVITIES else 0.0
+        self.fatigue = fatigue
+        self._reason = None
+
+    @property
+    def alert_level(self):
+        return ACTIVITY_RULES[self.activity][0]
+
+    @property
+    def danger(self):
+        return ACTIVITY_RULES[self.activity][1]
+
+    @property
+    def trigger_alarm(self):
+        return ACTIVITY_RULES[self.activity][2]
+
+    @property
+    def alarm_reason(self):
+        """Reason text, or None for activities without one"""
+        if self._reason is None:
+            template = ACTIVITY_RULES[self.activity][3]
+            if template is not None:
+                self._reason = template.format(eyes=self.eyes_closed_duration, down=self.looking_down_duration)
+        return self._reason
+
+    # Read-only mapping with the keys of the old details dicts
+    def _keys(self):
+        return _KEYS[self.activity] if self.fatigue is None else _FATIGUE_KEYS[self.activity]
+
+    def _key_set(self):
+        return _KEY_SETS[self.activity] if self.fatigue is None else _FATIGUE_KEY_SETS[self.activity]
+
+    def __getitem__(self, key):
+        if key not in self._key_set():
+            raise KeyError(key)
+        return _GETTERS[key](self)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __contains__(self, key):
+        return key in self._key_set()
+
+    def get(self, key, default=None):
+        if key not in self._key_set():
+            return default
+        return _GETTERS[key](self)
+
+    def to_dict(self):
+        """Plain dict (the old details dicts, plus "fatigue")"""
+        return {key: _GETTERS[key](self) for key in self._keys()}
+
+    def to_json(self):
+        """Compact JSON object, built from per-activity constant pieces"""
+        fragments = _JSON[self.activity]
+        if fragments is None:
+            return "{}"
+        head, middle, tail = fragments
+        text = f"{head}{self.eyes_closed_duration!r}{middle}{self.looking_down_duration!r}{tail}"
+        if self.activity != Activity.NO_DRIVER_DETECTED:
+            text = f'{text},"alarm_reason":{json.dumps(self.alarm_reason)}'
+        fatigue = self.fatigue
+        if fatigue is None:
+            return text + "}"
+        return (f'{text},"fatigue":{{"perclos":{fatigue[0]!r},"head_down_ratio":{fatigue[1]!r},'
+                f'"eye_closure_events":{fatigue[2]},"head_down_events":{fatigue[3]},'
+                f'"mean_closure_duration":{fatigue[4]!r},"closures_per_minute":{fatigue[5]!r},'
+                f'"observed_seconds":{fatigue[6]!r}}}}}')
+
+    def to_bytes(self):
+        """Fixed-size binary record (BINARY layout, 36 bytes)"""
+        alert_level, danger, trigger_alarm, _ = ACTIVITY_RULES[self.activity]
+        flags = self.FLAG_TRIGGER_ALARM if trigger_alarm else 0
+        fatigue = self.fatigue
+        if fatigue is None:
+            fatigue = _NO_FATIGUE
+        else:
+            flags |= self.FLAG_FATIGUE
+        return self.BINARY.pack(
+            self.activity, alert_level, danger, flags,
+            self.eyes_closed_duration, self.looking_down_duration,
+            fatigue.perclos, fatigue.head_down_ratio, fatigue.mean_closure_duration,
+            fatigue.closures_per_minute, fatigue.observed_seconds,
+            min(fatigue.eye_closure_events, 0xFFFF), min(fatigue.head_down_events, 0xFFFF)
+        )
+
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        """Rebuild details from to_bytes() output (floats come back as float32)"""
+        (activity, _, _, flags, eyes, down, perclos, head_down_ratio, mean_closure,
+         closures_per_minute, observed, closure_events, head_down_events) = cls.BINARY.unpack_from(data, offset)
+        fatigue = None
+        if flags & cls.FLAG_FATIGUE:
+            fatigue = FatigueStats(perclos, head_down_ratio, closure_events, head_down_events,
+                                   mean_closure, closures_per_minute, observed)
+        return cls(activity, eyes, down, fatigue)
+
+    def __repr__(self):
+        return (f"ActivityDetails({self.activity.label}, eyes_closed_duration={self.eyes_closed_duration:.3f}, "
+                f"looking_down_duration={self.looking_down_duration:.3f})")
+
+    def __str__(self):
+        # Log/CSV text stays the same as for the details dicts
+        return str(self.to_dict())
+
+
+_NO_FATIGUE = FatigueStats(0.0, 0.0, 0, 0, 0.0, 0.0, 0.0)
+NO_PERSON_DETAILS = ActivityDetails(Activity.NO_PERSON)
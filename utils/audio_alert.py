@@ -2,21 +2,36 @@ import threading
 import time
 import sys
 
-# Try pygame first
-try:
-    import pygame
-    PYGAME_AVAILABLE = True
-except ImportError:
-    PYGAME_AVAILABLE = False
+# Audio libraries are imported when the first AudioAlert is created, so
+# importing this module (e.g. by the backend) stays fast and silent
+pygame = None
+winsound = None
+PYGAME_AVAILABLE = False
+WINSOUND_AVAILABLE = False
+_backends_loaded = False
 
-# Windows native audio (always available on Windows)
-if sys.platform == 'win32':
-    import winsound
-    WINSOUND_AVAILABLE = True
-else:
-    WINSOUND_AVAILABLE = False
-
-print(f"Audio systems available: pygame={PYGAME_AVAILABLE}, winsound={WINSOUND_AVAILABLE}")
+def _load_audio_backends():
+    """Import pygame / winsound once"""
+    global pygame, winsound, PYGAME_AVAILABLE, WINSOUND_AVAILABLE, _backends_loaded
+    if _backends_loaded:
+        return
+    _backends_loaded = True
+    
+    # Try pygame first
+    try:
+        import pygame as pygame_module
+        pygame = pygame_module
+        PYGAME_AVAILABLE = True
+    except ImportError:
+        PYGAME_AVAILABLE = False
+    
+    # Windows native audio (always available on Windows)
+    if sys.platform == 'win32':
+        import winsound as winsound_module
+        winsound = winsound_module
+        WINSOUND_AVAILABLE = True
+    
+    print(f"Audio systems available: pygame={PYGAME_AVAILABLE}, winsound={WINSOUND_AVAILABLE}")
 
 class AudioAlert:
     """
@@ -29,6 +44,7 @@ class AudioAlert:
         self.last_alert_time = 0
         self.alert_cooldown = 3.0  # seconds between repeated alerts
         self.use_winsound = False
+        _load_audio_backends()
         
         # Try pygame first
         if PYGAME_AVAILABLE:
@@ -0,0 +1,144 @@
+from collections import deque
+from utils.activity_result import FatigueStats
+
+
+class DrowsinessWindow:
+    """
+    Sliding-window fatigue statistics for one driver, updated per frame
+
+    Keeps the last window_seconds as run-length ring buffers (one entry per
+    stretch of unchanged eye / head state, one per closure or head-down
+    event) with running sums, so each update only appends at the right and
+    evicts expired entries at the left - history is never rescanned, and
+    the state stays small enough to pickle with the session every frame.
+
+    The time between two frames is attributed to the state seen at the
+    first of them. Gaps longer than max_frame_gap (no person, paused
+    stream) are not counted as observed time.
+    """
+
+    def __init__(self, window_seconds=60.0, max_frame_gap=1.0):
+        """
+        Args:
+            window_seconds: Length of the sliding window
+            max_frame_gap: Longest frame interval still counted as observed
+        """
+        self.window_seconds = window_seconds
+        self.max_frame_gap = max_frame_gap
+
+        # [start, end, eyes_closed, head_down] runs of unchanged state
+        self.runs = deque()
+        self.observed_time = 0.0
+        self.eyes_closed_time = 0.0
+        self.head_down_time = 0.0
+
+        # [start, end] per event, end is None while the event is ongoing
+        self.closure_events = deque()
+        self.head_down_events = deque()
+        self.completed_closures = 0
+        self.completed_closure_time = 0.0
+
+        self.last_time = None
+        self.last_eyes_closed = False
+        self.last_head_down = False
+
+    def update(self, eyes_closed, head_down, current_time):
+        """
+        Add one frame's eye / head state
+
+        Args:
+            eyes_closed, head_down: Detector decisions for the frame
+            current_time: Frame time in seconds (increasing)
+        """
+        last_time = self.last_time
+        if last_time is not None and 0 < current_time - last_time <= self.max_frame_gap:
+            self._add_run(last_time, current_time, self.last_eyes_closed, self.last_head_down)
+
+        # Event boundaries
+        if eyes_closed and not self.last_eyes_closed:
+            self.closure_events.append([current_time, None])
+        elif not eyes_closed and self.last_eyes_closed and self.closure_events:
+            event = self.closure_events[-1]
+            if event[1] is None:
+                event[1] = current_time
+                self.completed_closures += 1
+                self.completed_closure_time += current_time - event[0]
+        if head_down and not self.last_head_down:
+            self.head_down_events.append([current_time, None])
+        elif not head_down and self.last_head_down and self.head_down_events:
+            self.head_down_events[-1][1] = current_time
+
+        self.last_time = current_time
+        self.last_eyes_closed = bool(eyes_closed)
+        self.last_head_down = bool(head_down)
+        self._evict(current_time - self.window_seconds)
+
+    def _add_run(self, start, end, eyes_closed, head_down):
+        """Extend the newest run, or start one when the state changed"""
+        runs = self.runs
+        if runs and runs[-1][1] == start and runs[-1][2] == eyes_closed and runs[-1][3] == head_down:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end, eyes_closed, head_down])
+        self._account(end - start, eyes_closed, head_down)
+
+    def _account(self, seconds, eyes_closed, head_down):
+        self.observed_time += seconds
+        if eyes_closed:
+            self.eyes_closed_time += seconds
+        if head_down:
+            self.head_down_time += seconds
+
+    def _evict(self, cutoff):
+        """Drop everything before cutoff (the oldest run is trimmed)"""
+        runs = self.runs
+        while runs and runs[0][1] <= cutoff:
+            start, end, eyes_closed, head_down = runs.popleft()
+            self._account(start - end, eyes_closed, head_down)
+        if runs and runs[0][0] < cutoff:
+            oldest = runs[0]
+            self._account(oldest[0] - cutoff, oldest[2], oldest[3])
+            oldest[0] = cutoff
+        if not runs:
+            # Reset running sums so rounding errors can't accumulate
+            self.observed_time = self.eyes_closed_time = self.head_down_time = 0.0
+
+        # Events count while they started inside the window (ongoing ones stay)
+        closures = self.closure_events
+        while closures and closures[0][0] < cutoff and closures[0][1] is not None:
+            start, end = closures.popleft()
+            self.completed_closures -= 1
+            self.completed_closure_time -= end - start
+        if not self.completed_closures:
+            self.completed_closure_time = 0.0
+        head_events = self.head_down_events
+        while head_events and head_events[0][0] < cutoff and head_events[0][1] is not None:
+            head_events.popleft()
+
+    def stats(self):
+        """
+        Current window statistics
+
+        Returns:
+            FatigueStats with perclos (share of observed time with eyes
+            closed), head_down_ratio, closure and head-down event counts,
+            mean duration of completed closures, closures per minute and
+            the observed seconds the figures are based on
+        """
+        observed = self.observed_time
+        closures = len(self.closure_events)
+        if observed > 0:
+            perclos = min(max(self.eyes_closed_time / observed, 0.0), 1.0)
+            head_down_ratio = min(max(self.head_down_time / observed, 0.0), 1.0)
+        else:
+            perclos = head_down_ratio = 0.0
+        mean_closure = self.completed_closure_time / self.completed_closures if self.completed_closures else 0.0
+        return FatigueStats(
+            round(perclos, 4),
+            round(head_down_ratio, 4),
+            closures,
+            len(self.head_down_events),
+            round(mean_closure, 3),
+            round(closures * 60.0 / max(observed, 1.0), 2),
+            round(observed, 2)
+        )
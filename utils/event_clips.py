@@ -0,0 +1,256 @@
+import cv2
+import json
+import math
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+
+# How frames are kept in the pre-roll ring buffer
+CLIP_BUFFER_MODES = ("jpeg", "downscale", "raw")
+
+
+class EventClipRecorder:
+    """
+    Write short clips around alarms instead of the whole session
+
+    The last pre_seconds of frames are kept in a bounded in-memory ring
+    buffer (JPEG-compressed, downscaled or raw). When an alarm fires, a clip
+    is opened with the buffered pre-roll and kept open for post_seconds
+    after the last alarm frame; each clip gets a JSON file next to it with
+    the alarms it covers. Packing and encoding run on a background thread,
+    so push only queues the frame (frames must not be modified after they
+    are passed in).
+
+    Memory at 640x480, 20 FPS and 10 s pre-roll: ~8 MB as JPEG, ~45 MB
+    downscaled by half, ~180 MB raw.
+    """
+
+    def __init__(self, clips_dir, session_id, frame_width, frame_height, fps=20.0,
+                 pre_seconds=10.0, post_seconds=10.0, buffer="jpeg", jpeg_quality=80,
+                 downscale=0.5, max_clip_seconds=120.0, queue_size=64, block=False):
+        """
+        Args:
+            clips_dir: Directory for the clips and their metadata
+            session_id: Recording session the clips belong to (file names, metadata)
+            frame_width, frame_height: Size of the pushed frames
+            fps: Frame rate of the source (frames are counted, not timed)
+            pre_seconds: Pre-roll kept in memory and written before the alarm
+            post_seconds: Recording continues this long after the last alarm frame
+            buffer: "jpeg" (compressed), "downscale" (resized by downscale,
+                    scaled back up in the clip) or "raw"
+            jpeg_quality: JPEG quality of the "jpeg" buffer
+            downscale: Scale factor of the "downscale" buffer
+            max_clip_seconds: A continuous alarm is split into clips of at most this length
+            queue_size: Frames the background thread may fall behind
+            block: When the queue is full, wait for the background thread
+                   (offline processing) instead of dropping the frame (live)
+        """
+        if buffer not in CLIP_BUFFER_MODES:
+            raise ValueError(f"buffer must be one of {CLIP_BUFFER_MODES}, got {buffer!r}")
+        self.clips_dir = clips_dir
+        self.session_id = session_id
+        self.frame_size = (int(frame_width), int(frame_height))
+        self.fps = float(fps)
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.buffer = buffer
+        self.jpeg_quality = int(jpeg_quality)
+        self.downscale = downscale
+        self.block = block
+        self.pre_frames = max(1, math.ceil(pre_seconds * self.fps))  # At least the alarm frame
+        self.post_frames = max(1, math.ceil(post_seconds * self.fps))
+        self.max_clip_frames = max(self.pre_frames + 1, math.ceil(max_clip_seconds * self.fps))
+        os.makedirs(clips_dir, exist_ok=True)
+
+        self.clips = []  # Metadata of the finished clips
+        self.frames_pushed = 0
+        self.frames_dropped = 0
+
+        # Background thread state
+        self._ring = deque(maxlen=self.pre_frames)
+        self._writer = None
+        self._clip = None
+        self._clip_end = 0  # Frame index after which the open clip is closed
+        self._inbox = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._thread = threading.Thread(target=self._run, name="event-clip-writer", daemon=True)
+        self._thread.start()
+
+    def push(self, frame):
+        """Queue a frame (without block: dropped and counted if the background thread is behind)"""
+        index = self.frames_pushed
+        self.frames_pushed += 1
+        if self.block:
+            if not self._send(("frame", (index, frame))):
+                self.frames_dropped += 1
+            return
+        try:
+            self._inbox.put_nowait(("frame", (index, frame)))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def alarm(self, activity, alert_level=None, alarm_reason=None, details=None,
+              elapsed_seconds=None, new_event=True):
+        """
+        Mark the last pushed frame as alarming: start a clip or extend the post-roll
+
+        Args:
+            activity: Detected activity
+            alert_level, alarm_reason: From the result details
+            details: Details dict stored in the clip metadata
+            elapsed_seconds: Session time of the frame
+            new_event: The alarm just started (False while it continues) -
+                       only new events are listed in the clip metadata
+        """
+        event = {
+            'activity': activity,
+            'alert_level': alert_level,
+            'alarm_reason': alarm_reason,
+            'elapsed_seconds': elapsed_seconds,
+            'timestamp': datetime.now().isoformat(),
+            'details': details or {}
+        }
+        self._send(("alarm", (self.frames_pushed - 1, event, new_event)))
+
+    def stop(self):
+        """Finish the open clip and end the background thread - Returns clip metadata"""
+        if self._thread is not None:
+            self._send(("stop", None))
+            self._thread.join()
+            self._thread = None
+        return self.clips
+
+    def _send(self, message):
+        """Queue a message, waiting for room only while the background thread is alive"""
+        while self._thread is not None and self._thread.is_alive():
+            try:
+                self._inbox.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        """Background thread: handle queued frames and alarms in order"""
+        while True:
+            kind, payload = self._inbox.get()
+            try:
+                if kind == "frame":
+                    self._on_frame(*payload)
+                elif kind == "alarm":
+                    self._on_alarm(*payload)
+                else:
+                    self._close_clip()
+                    return
+            except Exception as e:
+                # Drop the open clip but keep draining, so callers never block on the inbox
+                print(f"❌ Event clip error: {e}")
+                self._abort_clip()
+
+    def _on_frame(self, index, frame):
+        if frame is None:
+            return
+        if self._writer is None:
+            self._ring.append((index, self._pack(frame)))
+            return
+
+        self._writer.write(frame)
+        self._clip['frames'] += 1
+        self._clip['end_frame'] = index
+        if index >= self._clip_end or index - self._clip['start_frame'] + 1 >= self.max_clip_frames:
+            self._close_clip()
+
+    def _on_alarm(self, index, event, new_event):
+        if self._writer is None:
+            self._open_clip(index)
+            new_event = True  # The clip's first alarm is always listed
+        if self._writer is None:
+            return
+        self._clip_end = index + self.post_frames
+        if new_event:
+            event['frame'] = index
+            self._clip['alarms'].append(event)
+
+    def _open_clip(self, index):
+        """Start a clip with the buffered pre-roll (the alarm frame is the last one in the ring)"""
+        number = len(self.clips) + 1
+        clip_file = os.path.join(self.clips_dir, f"clip_{self.session_id}_{number:03d}.mp4")
+        writer = cv2.VideoWriter(clip_file, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, self.frame_size)
+        if not writer.isOpened():
+            print(f"❌ Cannot open event clip {clip_file}")
+            return
+
+        pre_roll = [(i, packed) for i, packed in self._ring if packed is not None]
+        self._ring.clear()
+        for _, packed in pre_roll:
+            frame = self._unpack(packed)
+            if frame is not None:
+                writer.write(frame)
+
+        self._writer = writer
+        self._clip = {
+            'clip_file': clip_file,
+            'metadata_file': os.path.splitext(clip_file)[0] + ".json",
+            'session_id': self.session_id,
+            'start_frame': pre_roll[0][0] if pre_roll else index + 1,
+            'end_frame': pre_roll[-1][0] if pre_roll else index,
+            'pre_roll_frames': len(pre_roll),
+            'frames': len(pre_roll),
+            'fps': self.fps,
+            'pre_seconds': self.pre_seconds,
+            'post_seconds': self.post_seconds,
+            'buffer': self.buffer,
+            'alarms': []
+        }
+
+    def _close_clip(self):
+        if self._writer is None:
+            return
+        self._writer.release()
+        self._writer = None
+        clip = self._clip
+        self._clip = None
+        clip['duration_seconds'] = round(clip['frames'] / self.fps, 2)
+        with open(clip['metadata_file'], 'w') as f:
+            json.dump(clip, f, indent=2)
+        self.clips.append(clip)
+        print(f"🎬 Event clip saved: {clip['clip_file']}")
+
+    def _abort_clip(self):
+        """Release the open clip's writer and delete the unfinished file (it would look like a valid clip)"""
+        writer, clip = self._writer, self._clip
+        self._writer = None
+        self._clip = None
+        if writer is not None:
+            try:
+                writer.release()
+            except Exception:
+                pass
+        if clip is not None:
+            try:
+                os.remove(clip['clip_file'])
+            except OSError:
+                pass
+
+    def _pack(self, frame):
+        if self.buffer == "jpeg":
+            ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            return encoded if ok else None
+        if self.buffer == "downscale":
+            return cv2.resize(frame, None, fx=self.downscale, fy=self.downscale,
+                              interpolation=cv2.INTER_AREA)
+        return frame
+
+    def _unpack(self, packed):
+        if self.buffer == "jpeg":
+            frame = cv2.imdecode(packed, cv2.IMREAD_COLOR)
+        elif self.buffer == "downscale":
+            frame = cv2.resize(packed, self.frame_size, interpolation=cv2.INTER_LINEAR)
+        else:
+            frame = packed
+        if frame is None:
+            return None  # Corrupt buffered JPEG
+        if frame.shape[1::-1] != self.frame_size:
+            frame = cv2.resize(frame, self.frame_size)
+        return frame
@@ -0,0 +1,198 @@
+import json
+import os
+import numpy as np
+from utils.activity_result import Activity, AlertLevel, ACTIVITY_CODES
+
+KEYPOINT_LOG_VERSION = 1
+UNKNOWN_CODE = 255  # Activity / alert code when the details didn't carry one
+
+# column -> (file name, dtype, shape of one frame)
+COLUMNS = {
+    'timestamps': ("timestamps.f64", np.dtype('<f8'), ()),
+    'keypoints': ("keypoints.f32", np.dtype('<f4'), (17, 3)),
+    'confidence': ("confidence.f32", np.dtype('<f4'), ()),
+    'activity': ("activity.u8", np.dtype('u1'), ()),
+    'alert': ("alert.u8", np.dtype('u1'), ())
+}
+
+
+def result_codes(activity, details):
+    """(activity code, alert code) for a logged result"""
+    if hasattr(details, 'alert_level'):
+        return int(details.activity), int(details.alert_level)
+    activity_code = ACTIVITY_CODES.get(activity, UNKNOWN_CODE)
+    alert_name = details.get('alert_level') if details else None
+    alert_code = AlertLevel[alert_name] if alert_name in AlertLevel.__members__ else UNKNOWN_CODE
+    return int(activity_code), int(alert_code)
+
+
+class KeypointLogWriter:
+    """
+    Append-only columnar keypoint store for one recording session
+
+    A directory with one raw little-endian file per column (timestamps,
+    keypoints frames x 17 x 3 float32 in original image pixels - NaN when
+    nobody was detected -, confidence, activity and alert codes) plus
+    meta.json. Frames are buffered in fixed-size numpy chunks and appended
+    to every column file when a chunk fills, so a crash loses at most one
+    chunk and the files can be memory-mapped at any time (KeypointLog).
+    """
+
+    def __init__(self, path, session_id=None, start_time=None, chunk_frames=256):
+        """
+        Args:
+            path: Directory to create
+            session_id: Stored in meta.json
+            start_time: Session start (ISO string), stored in meta.json
+            chunk_frames: Frames buffered before they are appended to disk
+        """
+        self.path = path
+        self.session_id = session_id
+        self.start_time = start_time
+        self.frames = 0
+        os.makedirs(path, exist_ok=True)
+        self._files = {name: open(os.path.join(path, file_name), 'ab')
+                       for name, (file_name, _, _) in COLUMNS.items()}
+        self._chunk = {name: np.empty((chunk_frames,) + shape, dtype=dtype)
+                       for name, (_, dtype, shape) in COLUMNS.items()}
+        self._buffered = 0
+        self._write_meta()
+
+    def append(self, timestamp, keypoints, activity_code, alert_code, confidence=0.0):
+        """
+        Add one frame
+
+        Args:
+            timestamp: Seconds since the session started
+            keypoints: (17, 3) keypoints, or None when nobody was detected
+            activity_code, alert_code: Activity / AlertLevel codes
+            confidence: Activity confidence
+        """
+        i = self._buffered
+        chunk = self._chunk
+        chunk['timestamps'][i] = timestamp
+        if keypoints is None:
+            chunk['keypoints'][i] = np.nan
+        else:
+            chunk['keypoints'][i] = keypoints
+        chunk['confidence'][i] = confidence
+        chunk['activity'][i] = activity_code
+        chunk['alert'][i] = alert_code
+        self._buffered += 1
+        self.frames += 1
+        if self._buffered == len(chunk['timestamps']):
+            self.flush()
+
+    def flush(self):
+        """Append the buffered frames to the column files"""
+        count = self._buffered
+        if count:
+            for name, handle in self._files.items():
+                handle.write(self._chunk[name][:count].tobytes())
+            self._buffered = 0
+        for handle in self._files.values():
+            handle.flush()
+
+    def close(self):
+        """Flush and record the final frame count"""
+        if self._files is None:
+            return
+        self.flush()
+        for handle in self._files.values():
+            handle.close()
+        self._files = None
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {
+            'version': KEYPOINT_LOG_VERSION,
+            'session_id': self.session_id,
+            'start_time': self.start_time,
+            'frames': self.frames,
+            'complete': self._files is None,
+            'columns': {name: {'file': file_name, 'dtype': dtype.str, 'shape': list(shape)}
+                        for name, (file_name, dtype, shape) in COLUMNS.items()},
+            'activities': [activity.label for activity in Activity],
+            'alert_levels': [level.name for level in AlertLevel]
+        }
+        with open(os.path.join(self.path, "meta.json"), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+
+class KeypointLog:
+    """
+    Read-only view of a keypoint store, every column memory-mapped
+
+    Opening is instant whatever the trip length; only the pages that are
+    actually read are loaded. Works on stores still being written (frames
+    appended so far) and ones left behind by a crash (the shortest column
+    wins).
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Store directory (KeypointLogWriter path)
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != KEYPOINT_LOG_VERSION:
+            raise ValueError(f"Unsupported keypoint log version {self.meta.get('version')}")
+
+        frames = None
+        for name, (file_name, dtype, shape) in COLUMNS.items():
+            frame_bytes = dtype.itemsize * int(np.prod(shape, dtype=int))
+            count = os.path.getsize(os.path.join(path, file_name)) // frame_bytes
+            frames = count if frames is None else min(frames, count)
+        self.frames = frames
+
+        for name, (file_name, dtype, shape) in COLUMNS.items():
+            if frames:
+                column = np.memmap(os.path.join(path, file_name), dtype=dtype, mode='r',
+                                   shape=(frames,) + shape)
+            else:
+                column = np.empty((0,) + shape, dtype=dtype)
+            setattr(self, name, column)
+
+    def __len__(self):
+        return self.frames
+
+    @property
+    def present(self):
+        """Frames with a detected person"""
+        return ~np.isnan(self.keypoints[:, 0, 0])
+
+    def activity_labels(self):
+        """Activity names per frame (materializes a list - prefer the codes)"""
+        labels = self.meta['activities']
+        return [labels[code] if code < len(labels) else None for code in self.activity.tolist()]
+
+    def reanalyze(self, analyzer=None, chunk_frames=20000):
+        """
+        Re-score the trip with PoseAnalyzer rules (e.g. changed thresholds)
+        without decoding the video, in chunks so memory stays bounded
+
+        Args:
+            analyzer: PoseAnalyzer to use (default: a fresh one); its timers
+                      carry over from chunk to chunk
+            chunk_frames: Frames per vectorized pass
+
+        Returns:
+            Dict of arrays like PoseAnalyzer.analyze_sequence(as_arrays=True)
+        """
+        if analyzer is None:
+            from utils.pose_analyzer import PoseAnalyzer
+            analyzer = PoseAnalyzer()
+
+        parts = []
+        for start in range(0, self.frames, chunk_frames):
+            keypoints = np.asarray(self.keypoints[start:start + chunk_frames])
+            present = ~np.isnan(keypoints[:, 0, 0])
+            poses = [kp if found else None for kp, found in zip(keypoints, present.tolist())]
+            parts.append(analyzer.analyze_sequence(
+                poses, self.timestamps[start:start + chunk_frames], as_arrays=True
+            ))
+        if not parts:
+            return analyzer.analyze_sequence([], [], as_arrays=True)
+        return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import deque
+
+
+class RateMeter:
+    """Events per second over a sliding time window (thread-safe enough for stats)"""
+
+    def __init__(self, window_seconds=2.0):
+        """
+        Args:
+            window_seconds: Events older than this no longer count
+        """
+        self.window_seconds = window_seconds
+        self.times = deque()
+        self.count = 0
+        self.start = None
+
+    def tick(self):
+        """Record one event"""
+        now = time.perf_counter()
+        if self.start is None:
+            self.start = now
+        self.times.append(now)
+        self.count += 1
+        while now - self.times[0] > self.window_seconds:
+            self.times.popleft()
+
+    def rate(self):
+        """Events per second in the window (drops to 0 when the stage stalls)"""
+        if self.start is None:
+            return 0.0
+        now = time.perf_counter()
+        recent = sum(1 for t in tuple(self.times) if now - t <= self.window_seconds)
+        span = min(self.window_seconds, now - self.start)
+        return recent / span if span > 0 else 0.0
+
+
+class LivePipeline:
+    """
+    Capture, inference and display decoupled for the live app
+
+    A capture thread reads the source, an inference thread runs the detector
+    on the frames and records the results, and the caller's display loop
+    pulls the newest finished result (next_result). Each stage runs at its
+    own rate instead of the sum of all of them; per-stage FPS are in
+    get_stats().
+    """
+
+    def __init__(self, cap, detector, recorder=None, annotate=True, track=False, roi=False,
+                 drop_frames=True, queue_size=2, history_size=50):
+        """
+        Args:
+            cap: Opened cv2.VideoCapture
+            detector: ActivityDetector
+            recorder: VideoRecorder every analyzed frame is written and logged to (or None)
+            annotate, track, roi: ActivityDetector.process_batch options
+            drop_frames: Live camera - when inference falls behind, the oldest
+                         captured frame is skipped; False (video files) makes
+                         capture wait so every frame is analyzed
+            queue_size: Frames allowed to wait between capture and inference
+            history_size: Recent activities kept for the timeline
+        """
+        self.cap = cap
+        self.detector = detector
+        self.recorder = recorder
+        self.annotate = annotate
+        self.track = track
+        self.roi = roi
+        self.drop_frames = drop_frames
+        self.queue_size = max(1, int(queue_size))
+
+        self.capture_rate = RateMeter()
+        self.inference_rate = RateMeter()
+        self.display_rate = RateMeter()
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.history = deque(maxlen=history_size)
+        self.capture_finished = False
+        self.finished = False
+        self.error = None
+
+        self._frames = deque()
+        self._frames_changed = threading.Condition()
+        self._result = None  # (sequence, display frame, detector result)
+        self._result_ready = threading.Condition()
+        self._stop = threading.Event()
+        self._capture_thread = None
+        self._inference_thread = None
+
+    def start(self):
+        """Start the capture and inference threads"""
+        self._capture_thread = threading.Thread(target=self._capture_loop, name="live-capture", daemon=True)
+        self._inference_thread = threading.Thread(target=self._inference_loop, name="live-inference",
+                                                  daemon=True)
+        self._capture_thread.start()
+        self._inference_thread.start()
+        return self
+
+    def stop(self, capture_timeout=2.0):
+        """
+        Stop both threads (the recorder is left to the caller)
+
+        The inference thread is always joined without a timeout - it writes
+        to the recorder, so the caller may only stop the recorder once it
+        has finished its current frame. The capture thread, which may hang
+        in a camera read, is waited for at most capture_timeout seconds.
+        """
+        self._stop.set()
+        with self._frames_changed:
+            self._frames_changed.notify_all()
+        with self._result_ready:
+            self._result_ready.notify_all()
+        if self._inference_thread is not None:
+            self._inference_thread.join()
+            self._inference_thread = None
+        if self._capture_thread is not None:
+            self._capture_thread.join(capture_timeout)
+            self._capture_thread = None
+
+    def next_result(self, last_sequence=0, timeout=0.5):
+        """
+        Wait for a result newer than last_sequence
+
+        Returns:
+            (sequence, display frame, detector result) - the newest one, so
+            a slow display skips results instead of falling behind - or None
+            on timeout / once the pipeline has finished
+        """
+        with self._result_ready:
+            self._result_ready.wait_for(
+                lambda: (self._result is not None and self._result[0] > last_sequence)
+                or self.finished or self._stop.is_set(),
+                timeout
+            )
+            if self._result is not None and self._result[0] > last_sequence:
+                return self._result
+            return None
+
+    def get_stats(self):
+        """Achieved FPS per stage and frame counters"""
+        return {
+            'capture_fps': round(self.capture_rate.rate(), 1),
+            'inference_fps': round(self.inference_rate.rate(), 1),
+            'display_fps': round(self.display_rate.rate(), 1),
+            'frames_processed': self.frames_processed,
+            'frames_dropped': self.frames_dropped
+        }
+
+    def _capture_loop(self):
+        """Capture thread: read frames until the source ends or stop()"""
+        try:
+            while not self._stop.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                self.capture_rate.tick()
+                with self._frames_changed:
+                    if not self.drop_frames:
+                        self._frames_changed.wait_for(
+                            lambda: len(self._frames) < self.queue_size or self._stop.is_set()
+                        )
+                    self._frames.append(frame)
+                    if len(self._frames) > self.queue_size:
+                        self._frames.popleft()
+                        self.frames_dropped += 1
+                    self._frames_changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._frames_changed:
+                self.capture_finished = True
+                self._frames_changed.notify_all()
+
+    def _inference_loop(self):
+        """Inference thread: detect, record and publish until capture ends and the queue is drained"""
+        try:
+            while True:
+                with self._frames_changed:
+                    self._frames_changed.wait_for(
+                        lambda: self._frames or self.capture_finished or self._stop.is_set()
+                    )
+                    if self._stop.is_set() or not self._frames:
+                        break
+                    frame = self._frames.popleft()
+                    self._frames_changed.notify_all()
+
+                # process_batch also returns the keypoints for the recorder's keypoint store
+                result = self.detector.process_batch(
+                    [frame], [None], annotate=self.annotate, track=self.track, roi=self.roi
+                )[0]
+                display_frame = result['annotated_frame'] if result['annotated_frame'] is not None else frame
+                if self.recorder is not None:
+                    self.recorder.write_frame(display_frame)
+                    self.recorder.log_activity(result['activity'], result['confidence'], result['details'],
+                                               keypoints=result['keypoints'])
+
+                self.frames_processed += 1
+                self.history.append({
+                    'frame': self.frames_processed,
+                    'activity': result['activity'],
+                    'confidence': result['confidence']
+                })
+                self.inference_rate.tick()
+                with self._result_ready:
+                    self._result = (self.frames_processed, display_frame, result)
+                    self._result_ready.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._result_ready:
+                self.finished = True
+                self._result_ready.notify_all()
@@ -1,13 +1,54 @@
 import numpy as np
 import math
+import time
+from utils.activity_result import Activity, ActivityDetails
+from utils.drowsiness_window import DrowsinessWindow
+
+# Activity names in priority order (classify_activities returns indices)
+ACTIVITIES = tuple(activity.label for activity in Activity if activity != Activity.NO_PERSON)
+
+# Turn directions (pose_features 'turn' indices)
+TURN_DIRECTIONS = ("forward", "left", "right")
+
+# Below this many poses analyze_poses uses the per-frame rules
+VECTORIZE_MIN_POSES = 3
 
 class PoseAnalyzer:
     """
     Analyze human pose keypoints to determine activities
     Uses YOLOv11 pose estimation keypoints (17 points)
+    
+    Holds only lightweight per-driver temporal state (timers), so one
+    instance per session is cheap - the YOLO model lives in ActivityDetector
     """
     
-    def __init__(self):
+    # YOLOv11 Pose keypoint indices (shared by all instances)
+    KEYPOINT_DICT = {
+        'nose': 0,
+        'left_eye': 1,
+        'right_eye': 2,
+        'left_ear': 3,
+        'right_ear': 4,
+        'left_shoulder': 5,
+        'right_shoulder': 6,
+        'left_elbow': 7,
+        'right_elbow': 8,
+        'left_wrist': 9,
+        'right_wrist': 10,
+        'left_hip': 11,
+        'right_hip': 12,
+        'left_knee': 13,
+        'right_knee': 14,
+        'left_ankle': 15,
+        'right_ankle': 16
+    }
+    
+    def __init__(self, fatigue_window=60.0):
+        """
+        Args:
+            fatigue_window: Seconds covered by the sliding-window fatigue
+                            statistics (PERCLOS, closure / head-down events)
+        """
         # Eye closure detection state (OPTIMIZED)
         self.eyes_closed_start_time = None
         self.eyes_closed_duration = 0.0
@@ -23,26 +64,8 @@ class PoseAnalyzer:
         self.head_down_threshold = 20  # pixels - Lower = more sensitive
         self.warning_threshold = 2.0  # seconds - Show warning before alarm
         
-        # YOLOv11 Pose keypoint indices
-        self.KEYPOINT_DICT = {
-            'nose': 0,
-            'left_eye': 1,
-            'right_eye': 2,
-            'left_ear': 3,
-            'right_ear': 4,
-            'left_shoulder': 5,
-            'right_shoulder': 6,
-            'left_elbow': 7,
-            'right_elbow': 8,
-            'left_wrist': 9,
-            'right_wrist': 10,
-            'left_hip': 11,
-            'right_hip': 12,
-            'left_knee': 13,
-            'right_knee': 14,
-            'left_ankle': 15,
-            'right_ankle': 16
-        }
+        # Fatigue trends beyond the current closure / head-down run
+        self.drowsiness = DrowsinessWindow(fatigue_window)
     
     def calculate_angle(self, point1, point2, point3):
         """Calculate angle between three points"""
@@ -412,12 +435,7 @@ class PoseAnalyzer:
             current_time = time.time()
         
         if keypoints is None or len(keypoints) == 0:
-            return "no_driver_detected", 0.0, {
-                "alert_level": "CRITICAL",
-                "eyes_closed_duration": 0.0,
-                "looking_down_duration": 0.0,
-                "trigger_alarm": False
-            }
+            return build_result(0, 0.0, 0.0, 0.0)
         
         # === STEP 1: Check Eye Status (MOST CRITICAL) ===
         eyes_closed, eye_closed_conf, _ = self.detect_eyes_closed(keypoints)
@@ -426,104 +444,356 @@ class PoseAnalyzer:
         # === STEP 2: Check Head Position (SECOND CRITICAL) ===
         is_head_down, head_down_conf = self.detect_head_down(keypoints)
         looking_down_duration = self.update_looking_down_time(is_head_down, current_time)
+        self.drowsiness.update(eyes_closed, is_head_down, current_time)
         
+        # Priority order matches ACTIVITIES (and classify_activities)
         # === PRIORITY 1: EYES CLOSED > 5 SECONDS = CRITICAL ALARM ===
         if eyes_closed and eyes_closed_duration >= self.eyes_closed_threshold:
-            return "sleeping_eyes_closed", 0.95, {
-                "alert_level": "CRITICAL", 
-                "danger": "HIGH",
-                "eyes_closed_duration": eyes_closed_duration,
-                "looking_down_duration": 0.0,
-                "trigger_alarm": True,
-                "alarm_reason": f"Eyes closed for {eyes_closed_duration:.1f}s"
-            }
-        
+            code, confidence = 1, 0.95
         # === PRIORITY 2: LOOKING DOWN > 5 SECONDS = CRITICAL ALARM ===
-        if is_head_down and looking_down_duration >= self.looking_down_threshold:
-            return "looking_down_phone", 0.95, {
-                "alert_level": "CRITICAL", 
-                "danger": "HIGH",
-                "eyes_closed_duration": 0.0,
-                "looking_down_duration": looking_down_duration,
-                "trigger_alarm": True,
-                "alarm_reason": f"Looking down for {looking_down_duration:.1f}s"
-            }
-        
+        elif is_head_down and looking_down_duration >= self.looking_down_threshold:
+            code, confidence = 2, 0.95
         # === WARNING: Eyes closing (2-5 seconds) ===
-        if eyes_closed and eyes_closed_duration > 2.0:
-            return "drowsy_eyes_closing", 0.80, {
-                "alert_level": "WARNING",
-                "danger": "HIGH",
-                "eyes_closed_duration": eyes_closed_duration,
-                "looking_down_duration": 0.0,
-                "trigger_alarm": False,
-                "alarm_reason": f"Eyes closing... {eyes_closed_duration:.1f}s"
-            }
-        
+        elif eyes_closed and eyes_closed_duration > 2.0:
+            code, confidence = 3, 0.80
         # === WARNING: Looking down (2-5 seconds) ===
-        if is_head_down and looking_down_duration > 2.0:
-            return "looking_down_warning", 0.80, {
-                "alert_level": "WARNING",
-                "danger": "HIGH",
-                "eyes_closed_duration": 0.0,
-                "looking_down_duration": looking_down_duration,
-                "trigger_alarm": False,
-                "alarm_reason": f"Looking down... {looking_down_duration:.1f}s"
-            }
+        elif is_head_down and looking_down_duration > 2.0:
+            code, confidence = 4, 0.80
+        else:
+            code, confidence = self._classify_state(keypoints, eyes_closed)
         
+        return build_result(code, confidence, eyes_closed_duration, looking_down_duration,
+                            self.drowsiness.stats())
+    
+    def _classify_state(self, keypoints, eyes_closed):
+        """Non-timer states in priority order: sleeping, eyes on road, turns, present"""
         # === Check for sleeping (horizontal body) ===
         is_sleep, sleep_conf = self.is_sleeping(keypoints)
         if is_sleep and sleep_conf > 0.6:
-            return "sleeping_horizontal", 0.90, {
-                "alert_level": "CRITICAL", 
-                "danger": "HIGH",
-                "eyes_closed_duration": 0.0,
-                "looking_down_duration": 0.0,
-                "trigger_alarm": True,
-                "alarm_reason": "Body horizontal (sleeping)"
-            }
+            return 5, 0.90
         
         # === SAFE: Eyes on road (normal driving) ===
         eyes_on_road, eyes_conf = self.detect_eyes_on_road(keypoints)
         if eyes_on_road and eyes_conf > 0.6 and not eyes_closed:
-            return "eyes_on_road", eyes_conf, {
-                "alert_level": "SAFE", 
-                "danger": "LOW",
-                "eyes_closed_duration": 0.0,
-                "looking_down_duration": 0.0,
-                "trigger_alarm": False,
-                "alarm_reason": "Eyes open, looking forward"
-            }
+            return 6, eyes_conf
         
         # === Check turn direction (minor distractions) ===
         turn_direction, turn_conf = self.detect_turn_direction(keypoints)
-        
         if turn_direction == "left" and turn_conf > 0.5:
-            return "looking_left", turn_conf, {
-                "alert_level": "CAUTION", 
-                "danger": "MEDIUM",
-                "eyes_closed_duration": 0.0,
-                "looking_down_duration": 0.0,
-                "trigger_alarm": False,
-                "alarm_reason": "Looking left"
-            }
+            return 7, turn_conf
         elif turn_direction == "right" and turn_conf > 0.5:
-            return "looking_right", turn_conf, {
-                "alert_level": "CAUTION", 
-                "danger": "MEDIUM",
-                "eyes_closed_duration": 0.0,
-                "looking_down_duration": 0.0,
-                "trigger_alarm": False,
-                "alarm_reason": "Looking right"
-            }
+            return 8, turn_conf
         
         # === Default: Driver present, monitoring ===
-        return "driver_detected", 0.6, {
-            "alert_level": "SAFE", 
-            "danger": "LOW",
-            "eyes_closed_duration": 0.0,
-            "looking_down_duration": 0.0,
-            "trigger_alarm": False,
-            "alarm_reason": "Driver detected"
-        }
+        return 9, 0.6
+    
+    def analyze_sequence(self, keypoints, timestamps, as_arrays=False):
+        """
+        Analyze consecutive frames of this driver in one vectorized pass
+        (offline reprocessing). Same decisions as calling analyze_activity
+        frame by frame, including the timers carried over from earlier frames.
+        
+        Args:
+            keypoints: (N, 17, 3) array, or a list with None for frames
+                       without a person
+            timestamps: N frame times in seconds (increasing)
+            as_arrays: Return arrays instead of per-frame tuples
+            
+        Returns:
+            List of (activity_name, confidence, details), or with as_arrays
+            a dict of arrays: activity (index into ACTIVITIES), confidence,
+            eyes_closed_duration, looking_down_duration and perclos
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if isinstance(keypoints, np.ndarray) and keypoints.ndim == 3:
+            present = np.arange(len(keypoints))
+            stacked = keypoints
+        else:
+            present = np.array([i for i, kp in enumerate(keypoints) if kp is not None and len(kp) > 0], dtype=int)
+            stacked = np.stack([np.asarray(keypoints[i]) for i in present]) if len(present) else None
+        
+        count = len(timestamps)
+        codes = np.zeros(count, dtype=np.int64)  # no_driver_detected
+        confidences = np.zeros(count)
+        eyes_closed_durations = np.zeros(count)
+        looking_down_durations = np.zeros(count)
+        fatigue = [None] * count
+        
+        if stacked is not None and len(stacked):
+            features = pose_features(stacked)
+            times = timestamps[present]
+            eyes_durations, self.eyes_closed_start_time = run_durations(
+                features['eyes_closed'], times, self.eyes_closed_start_time
+            )
+            down_durations, self.looking_down_start_time = run_durations(
+                features['head_down'], times, self.looking_down_start_time
+            )
+            self.eyes_closed_duration = float(eyes_durations[-1])
+            self.looking_down_duration = float(down_durations[-1])
+            
+            codes[present], confidences[present] = classify_activities(
+                features, eyes_durations, down_durations,
+                self.eyes_closed_threshold, self.looking_down_threshold
+            )
+            eyes_closed_durations[present] = eyes_durations
+            looking_down_durations[present] = down_durations
+            
+            # The window update is O(1) per frame, so a plain loop is fine
+            for i, eyes_closed, head_down, current_time in zip(
+                    present.tolist(), features['eyes_closed'].tolist(),
+                    features['head_down'].tolist(), times.tolist()):
+                self.drowsiness.update(eyes_closed, head_down, current_time)
+                fatigue[i] = self.drowsiness.stats()
+        
+        if as_arrays:
+            return {
+                'activity': codes,
+                'confidence': confidences,
+                'eyes_closed_duration': eyes_closed_durations,
+                'looking_down_duration': looking_down_durations,
+                'perclos': np.array([stats.perclos if stats is not None else 0.0 for stats in fatigue])
+            }
+        return [
+            build_result(code, confidence, eyes, down, stats)
+            for code, confidence, eyes, down, stats in zip(
+                codes.tolist(), confidences.tolist(),
+                eyes_closed_durations.tolist(), looking_down_durations.tolist(), fatigue
+            )
+        ]
 
+
+def pose_features(keypoints):
+    """
+    Compute every geometric feature the driver-state rules use, for N poses at once
+    
+    Mirrors the per-frame rules exactly (a keypoint counts when its
+    confidence is at least 0.2; float32 sums and ratios are rounded the same
+    way as the original scalar code), so decisions are identical.
+    
+    Args:
+        keypoints: (N, 17, 3) array of x, y, confidence ((N, 17, 2) is
+                   treated as all keypoints valid with confidence 0)
+        
+    Returns:
+        Dict of (N,) arrays: eyes_closed / _confidence, head_down /
+        _confidence, sleeping / _confidence, eyes_on_road / _confidence,
+        turn (index into TURN_DIRECTIONS) / turn_confidence
+    """
+    keypoints = np.asarray(keypoints)
+    x = keypoints[:, :, 0]
+    y = keypoints[:, :, 1]
+    if keypoints.shape[2] > 2:
+        conf = keypoints[:, :, 2].astype(np.float64)
+        valid = ~(conf < 0.2)
+    else:
+        conf = np.zeros(x.shape)
+        valid = np.ones(x.shape, dtype=bool)
+    
+    def f64(values):
+        return values.astype(np.float64)
+    
+    nose, l_eye, r_eye, l_ear, r_ear, l_sh, r_sh, l_hip, r_hip = 0, 1, 2, 3, 4, 5, 6, 11, 12
+    has_nose = valid[:, nose]
+    has_eyes = valid[:, l_eye] & valid[:, r_eye]
+    has_ears = valid[:, l_ear] & valid[:, r_ear]
+    has_shoulders = valid[:, l_sh] & valid[:, r_sh]
+    has_hips = valid[:, l_hip] & valid[:, r_hip]
+    
+    nose_x, nose_y = f64(x[:, nose]), f64(y[:, nose])
+    shoulder_x = f64(x[:, l_sh] + x[:, r_sh]) / 2
+    shoulder_y = f64(y[:, l_sh] + y[:, r_sh]) / 2
+    shoulder_width = f64(np.abs(x[:, r_sh] - x[:, l_sh]))
+    eye_y = f64(y[:, l_eye] + y[:, r_eye]) / 2
+    ear_y = f64(y[:, l_ear] + y[:, r_ear]) / 2
+    head_pose = has_nose & has_shoulders
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Sleeping: nose about level with the shoulders (horizontal body)
+        hip_y = np.where(has_hips, f64(y[:, l_hip] + y[:, r_hip]) / 2, shoulder_y)
+        vertical_distance = np.abs(nose_y - shoulder_y)
+        body_height = np.abs(shoulder_y - hip_y)
+        horizontal_ratio = vertical_distance / (body_height + 1)
+        sleeping = (head_pose & valid[:, l_hip]) & (body_height > 0) & (horizontal_ratio > 1.5)
+        sleeping_confidence = np.where(sleeping, np.minimum(0.95, horizontal_ratio / 2), 0.0)
+        
+        # Turn direction: nose offset from the shoulder midpoint
+        narrow = shoulder_width < 10
+        offset_ratio = (nose_x - shoulder_x) / (shoulder_width / 2)
+        # Nested where: the innermost case has the highest priority
+        turning = np.abs(offset_ratio) > 0.3
+        turn = np.where(offset_ratio > 0.3, 2, np.where(offset_ratio < -0.3, 1, 0))
+        turn = np.where(narrow, np.where(x[:, l_sh] > x[:, r_sh], 2, 1), turn)
+        turn = np.where(head_pose, turn, 0)
+        turn_confidence = np.where(turning, np.minimum(0.9, np.abs(offset_ratio)), 0.5)
+        turn_confidence = np.where(head_pose, np.where(narrow, 0.8, turn_confidence), 0.0)
+        
+        # Head down: four cues adding up to a confidence
+        head_drop = nose_y - shoulder_y
+        drop_cue = head_drop > 20
+        eyes_below_cue = has_eyes & (eye_y - nose_y > 5)
+        ears_cue = has_ears & (nose_y - ear_y > 15)
+        forward_cue = (head_drop > 10) & (head_drop / (np.abs(nose_x - shoulder_x) + 1) > 0.5)
+        score = np.where(drop_cue, np.minimum(0.5, head_drop / 40), 0.0)
+        score = score + np.where(eyes_below_cue, 0.25, 0.0)
+        score = score + np.where(ears_cue, 0.3, 0.0)
+        score = score + np.where(forward_cue, 0.2, 0.0)
+        head_down_score = np.minimum(0.95, score)
+        head_down = head_pose & (drop_cue | eyes_below_cue | ears_cue | forward_cue) & (head_down_score > 0.3)
+        head_down_confidence = np.where(head_down, head_down_score, 0.0)
+        
+        # Eyes closed: low eye confidence, eyes close to the nose, narrow eye span
+        low_confidence_cue = (conf[:, l_eye] < 0.4) & (conf[:, r_eye] < 0.4)
+        close_cue = has_eyes & (np.abs(eye_y - nose_y) < 20)
+        face_width = np.abs(x[:, l_ear] - x[:, r_ear])
+        eye_distance = np.abs(x[:, l_eye] - x[:, r_eye])
+        ratio_cue = has_eyes & has_ears & (face_width > 10) & (f64(eye_distance / face_width) < 0.25)
+        visible_eyes = ((valid[:, l_eye] & (conf[:, l_eye] > 0.3)).astype(int)
+                        + (valid[:, r_eye] & (conf[:, r_eye] > 0.3)))
+        hidden_cue = visible_eyes == 0
+        score = np.where(low_confidence_cue, 0.4, 0.0)
+        score = score + np.where(close_cue, 0.3, 0.0)
+        score = score + np.where(ratio_cue, 0.2, 0.0)
+        score = score + np.where(hidden_cue, 0.35, 0.0)
+        eyes_closed = has_nose & (low_confidence_cue | close_cue | ratio_cue | hidden_cue)
+        eyes_closed_confidence = np.where(has_nose, np.minimum(0.95, score), 0.0)
+        
+        # Eyes on road: head centered over the shoulders and up
+        centered = np.abs(nose_x - shoulder_x) / (shoulder_width / 2) < 0.3
+        eyes_on_road = head_pose & ~narrow & centered & (shoulder_y - nose_y > 20)
+        eyes_on_road_confidence = np.where(eyes_on_road, 0.85, 0.0)
+    
+    return {
+        'eyes_closed': eyes_closed,
+        'eyes_closed_confidence': eyes_closed_confidence,
+        'head_down': head_down,
+        'head_down_confidence': head_down_confidence,
+        'sleeping': sleeping,
+        'sleeping_confidence': sleeping_confidence,
+        'eyes_on_road': eyes_on_road,
+        'eyes_on_road_confidence': eyes_on_road_confidence,
+        'turn': turn,
+        'turn_confidence': turn_confidence
+    }
+
+
+def run_durations(active, timestamps, start_time=None):
+    """
+    Vectorized timer: how long each frame's condition has been active
+    
+    Args:
+        active: (N,) bool array, condition per frame
+        timestamps: (N,) frame times
+        start_time: Start of a run already active before the first frame
+        
+    Returns:
+        (durations, start time of the run active at the last frame or None)
+    """
+    count = len(active)
+    index = np.arange(count)
+    previous = np.concatenate(([start_time is not None], active[:-1]))
+    run_start = np.maximum.accumulate(np.where(active & ~previous, index, -1))
+    starts = np.where(run_start >= 0, timestamps[np.maximum(run_start, 0)],
+                      start_time if start_time is not None else 0.0)
+    durations = np.where(active, timestamps - starts, 0.0)
+    last_start = float(starts[-1]) if count and active[-1] else None
+    return durations, last_start
+
+
+def classify_activities(features, eyes_closed_duration, looking_down_duration,
+                        eyes_closed_threshold=5.0, looking_down_threshold=5.0):
+    """
+    Apply the alarm / warning / state priority rules to N poses at once
+    
+    Returns:
+        (activity index into ACTIVITIES, confidence) arrays
+    """
+    eyes_closed = features['eyes_closed']
+    head_down = features['head_down']
+    turn = features['turn']
+    turn_confidence = features['turn_confidence']
+    # (condition, confidence) from the highest priority down
+    rules = [
+        (eyes_closed & (eyes_closed_duration >= eyes_closed_threshold), 0.95),
+        (head_down & (looking_down_duration >= looking_down_threshold), 0.95),
+        (eyes_closed & (eyes_closed_duration > 2.0), 0.80),
+        (head_down & (looking_down_duration > 2.0), 0.80),
+        (features['sleeping'] & (features['sleeping_confidence'] > 0.6), 0.90),
+        (features['eyes_on_road'] & (features['eyes_on_road_confidence'] > 0.6) & ~eyes_closed,
+         features['eyes_on_road_confidence']),
+        ((turn == 1) & (turn_confidence > 0.5), turn_confidence),
+        ((turn == 2) & (turn_confidence > 0.5), turn_confidence)
+    ]
+    # Apply the lowest priority first so higher priorities overwrite it
+    codes = np.full(len(turn), 9)
+    confidences = np.full(len(turn), 0.6)
+    for code in range(len(rules), 0, -1):
+        condition, confidence = rules[code - 1]
+        codes = np.where(condition, code, codes)
+        confidences = np.where(condition, confidence, confidences)
+    return codes, confidences
+
+
+def build_result(code, confidence, eyes_closed_duration, looking_down_duration, fatigue=None):
+    """(activity_name, confidence, ActivityDetails) for one classified pose"""
+    details = ActivityDetails(code, eyes_closed_duration, looking_down_duration, fatigue)
+    return details.activity.label, (confidence if code else 0.0), details
+
+
+def analyze_poses(analyzers, keypoints, timestamps=None):
+    """
+    Analyze one pose per entry with a single vectorized feature pass
+    
+    Entries can belong to different drivers (batched server inference) or
+    repeat the same analyzer for consecutive frames; timers are updated in
+    list order, so results match calling analyze_activity one by one.
+    
+    Args:
+        analyzers: PoseAnalyzer per entry (holds that driver's timers)
+        keypoints: (17, 3) keypoints per entry, None when nobody was detected
+        timestamps: Frame time per entry (None entries: current time)
+        
+    Returns:
+        List of (activity_name, confidence, details)
+    """
+    if timestamps is None:
+        timestamps = [None] * len(keypoints)
+    results = [
+        build_result(0, 0.0, 0.0, 0.0) if kp is None or len(kp) == 0 else None
+        for kp in keypoints
+    ]
+    present = [i for i, result in enumerate(results) if result is None]
+    if len(present) < VECTORIZE_MIN_POSES:
+        # Array overhead outweighs the gain for a few poses
+        for i in present:
+            results[i] = analyzers[i].analyze_activity(keypoints[i], timestamps[i])
+        return results
+    
+    features = pose_features(np.stack([np.asarray(keypoints[i]) for i in present]))
+    eyes_closed = features['eyes_closed'].tolist()
+    head_down = features['head_down'].tolist()
+    eyes_durations = np.empty(len(present))
+    down_durations = np.empty(len(present))
+    eyes_thresholds = np.empty(len(present))
+    down_thresholds = np.empty(len(present))
+    fatigue = [None] * len(present)
+    now = None
+    for j, i in enumerate(present):
+        analyzer = analyzers[i]
+        current_time = timestamps[i]
+        if current_time is None:
+            now = now if now is not None else time.time()
+            current_time = now
+        eyes_durations[j] = analyzer.update_eye_closure_time(eyes_closed[j], current_time)
+        down_durations[j] = analyzer.update_looking_down_time(head_down[j], current_time)
+        analyzer.drowsiness.update(eyes_closed[j], head_down[j], current_time)
+        fatigue[j] = analyzer.drowsiness.stats()
+        eyes_thresholds[j] = analyzer.eyes_closed_threshold
+        down_thresholds[j] = analyzer.looking_down_threshold
+    
+    codes, confidences = classify_activities(
+        features, eyes_durations, down_durations, eyes_thresholds, down_thresholds
+    )
+    for j, (code, confidence, eyes, down) in enumerate(zip(
+            codes.tolist(), confidences.tolist(), eyes_durations.tolist(), down_durations.tolist())):
+        results[present[j]] = build_result(code, confidence, eyes, down, fatigue[j])
+    return results
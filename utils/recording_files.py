@@ -0,0 +1,324 @@
+import os
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import quote, unquote, urlsplit, parse_qs
+
+# Downloadable recording directories -> content types by extension
+RECORDING_KINDS = ("videos", "logs", "clips")
+CONTENT_TYPES = {
+    ".mp4": "video/mp4",
+    ".jsonl": "application/x-ndjson",
+    ".json": "application/json",
+    ".csv": "text/csv"
+}
+CHUNK_SIZE = 256 * 1024
+
+_VIDEO_NAME = re.compile(r"^video_(.+)\.mp4$")
+_CLIP_NAME = re.compile(r"^clip_(.+)_\d{3}\.mp4$")
+
+
+def _file_info(path):
+    """Name, size and modification time of a file (None if it doesn't exist)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {
+        'name': os.path.basename(path),
+        'size': stat.st_size,
+        'modified': stat.st_mtime
+    }
+
+
+def list_recordings(output_dir="recordings"):
+    """
+    Recording sessions found under a VideoRecorder output directory
+
+    Only directory entries are read (no file contents), so listing is cheap
+    however large the recordings are.
+
+    Args:
+        output_dir: VideoRecorder root directory
+
+    Returns:
+        List of dicts (newest first) with session_id, video, activity_log,
+        summary, keypoint_log and clips; files are {name, size, modified}
+        or None, names are relative to their kind's directory
+    """
+    sessions = {}
+
+    def session(session_id):
+        return sessions.setdefault(session_id, {
+            'session_id': session_id,
+            'video': None,
+            'activity_log': None,
+            'summary': None,
+            'keypoint_log': None,
+            'clips': []
+        })
+
+    def scan(kind):
+        directory = os.path.join(output_dir, kind)
+        try:
+            with os.scandir(directory) as entries:
+                return sorted(entry.name for entry in entries)
+        except OSError:
+            return []
+
+    for name in scan("videos"):
+        match = _VIDEO_NAME.match(name)
+        if match:
+            session(match.group(1))['video'] = _file_info(os.path.join(output_dir, "videos", name))
+    for name in scan("logs"):
+        for prefix, suffix, key in (("activity_log_", ".jsonl", 'activity_log'),
+                                    ("summary_", ".json", 'summary')):
+            if name.startswith(prefix) and name.endswith(suffix):
+                session_id = name[len(prefix):-len(suffix)]
+                session(session_id)[key] = _file_info(os.path.join(output_dir, "logs", name))
+    for name in scan("clips"):
+        match = _CLIP_NAME.match(name)
+        if match:
+            session(match.group(1))['clips'].append(_file_info(os.path.join(output_dir, "clips", name)))
+    for name in scan("keypoints"):
+        if name.startswith("keypoints_") and name[len("keypoints_"):] in sessions:
+            sessions[name[len("keypoints_"):]]['keypoint_log'] = name
+
+    def newest(entry):
+        files = [entry['video'], entry['activity_log'], entry['summary']] + entry['clips']
+        return max((info['modified'] for info in files if info), default=0.0)
+
+    return sorted(sessions.values(), key=newest, reverse=True)
+
+
+def resolve_recording_file(output_dir, kind, name):
+    """
+    Path of a downloadable recording file
+
+    Args:
+        output_dir: VideoRecorder root directory
+        kind: One of RECORDING_KINDS
+        name: File name inside that directory (no path components)
+
+    Returns:
+        The path, or None if the kind / name is not valid or the file doesn't exist
+    """
+    if kind not in RECORDING_KINDS or not name or name != os.path.basename(name) or name.startswith("."):
+        return None
+    path = os.path.join(output_dir, kind, name)
+    return path if os.path.isfile(path) else None
+
+
+def content_type(name):
+    """Content type of a recording file"""
+    return CONTENT_TYPES.get(os.path.splitext(name)[1].lower(), "application/octet-stream")
+
+
+def parse_range(header, size):
+    """
+    Byte range requested by an HTTP Range header
+
+    Args:
+        header: Range header value (None / empty = whole file)
+        size: File size in bytes
+
+    Returns:
+        (start, end) inclusive, or None for the whole file (no header, or
+        one that is ignored: other units or multiple ranges)
+
+    Raises:
+        ValueError: The range can't be satisfied (answer 416)
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            start, end = size - length, size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        raise ValueError(f"Invalid range: {header}")
+    if first == "":
+        if length <= 0 or size == 0:
+            raise ValueError(f"Unsatisfiable range: {header}")
+        return max(0, start), end
+    if start >= size or end < start:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, min(end, size - 1)
+
+
+def iter_file(path, start=0, end=None, chunk_size=CHUNK_SIZE):
+    """
+    Read a file (or the inclusive byte range start..end) in chunks
+
+    Yields:
+        bytes chunks of at most chunk_size
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = (os.fstat(f.fileno()).st_size if end is None else end + 1) - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def response_headers(name, size, byte_range=None, download=False):
+    """
+    Status code and headers for serving a recording file
+
+    Args:
+        name: File name (Content-Disposition)
+        size: File size
+        byte_range: (start, end) from parse_range, or None for the whole file
+        download: attachment instead of inline
+
+    Returns:
+        (status code, headers dict)
+    """
+    disposition = "attachment" if download else "inline"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Type": content_type(name),
+        "Content-Disposition": f"{disposition}; filename*=UTF-8''{quote(name)}"
+    }
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return 200, headers
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return 206, headers
+
+
+def _is_loopback(host):
+    """Whether a listen address is only reachable from this machine"""
+    return host == "localhost" or host.startswith("127.") or host == "::1"
+
+
+class _RecordingRequestHandler(BaseHTTPRequestHandler):
+    """GET /<kind>/<name>[?download=1] with Range support"""
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _serve(self, send_body):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        path = resolve_recording_file(self.server.output_dir, *parts) if len(parts) == 2 else None
+        if path is None:
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(path)
+        try:
+            byte_range = parse_range(self.headers.get("Range"), size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        download = parse_qs(url.query).get("download", ["0"])[0] in ("1", "true")
+        status, headers = response_headers(parts[1], size, byte_range, download)
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        if not send_body:
+            return
+        start, end = byte_range if byte_range is not None else (0, size - 1)
+        try:
+            for chunk in iter_file(path, start, end):
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The player seeked elsewhere or the download was cancelled
+
+    def log_message(self, format, *args):
+        pass  # Players issue many range requests - keep the console quiet
+
+
+class RecordingFileServer:
+    """
+    Small HTTP server streaming recording files with Range support
+
+    For UIs without the backend (the Streamlit app): videos can be played
+    and scrubbed, and any file downloaded, without reading it into memory.
+    There is no authentication: by default it only listens on 127.0.0.1,
+    so its links only work in a browser on the same machine. Serving other
+    machines takes a public_url (e.g. a reverse proxy that also restricts
+    access); everything under output_dir is readable by whoever reaches it.
+    """
+
+    def __init__(self, output_dir="recordings", host="127.0.0.1", port=0, public_url=None):
+        """
+        Args:
+            output_dir: VideoRecorder root directory to serve
+            host: Interface to listen on (a non-loopback one requires public_url)
+            port: Port (0 = any free port)
+            public_url: Base URL browsers reach the server at (reverse proxy,
+                        port forwarding); default: http://127.0.0.1:<port>
+
+        Raises:
+            ValueError: Non-loopback host without public_url
+        """
+        if not _is_loopback(host) and not public_url:
+            raise ValueError(
+                f"public_url is required to listen on {host!r}: the recordings would be exposed "
+                "without authentication and there is no reliable URL to link to"
+            )
+        self.output_dir = output_dir
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.httpd = ThreadingHTTPServer((host, port), _RecordingRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.output_dir = output_dir
+        self.thread = None
+
+    @property
+    def remote_access(self):
+        """Whether the links work in browsers on other machines (a public_url is set)"""
+        return self.public_url is not None
+
+    def start(self):
+        """Serve in a background thread"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                           name="recording-file-server", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        if self.thread is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.thread = None
+
+    def url(self, path, download=False):
+        """
+        URL of a recording file
+
+        Args:
+            path: File path inside output_dir (e.g. a VideoRecorder result)
+            download: Ask the browser to save instead of display
+        """
+        kind = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        base = self.public_url
+        if base is None:
+            host, port = self.httpd.server_address[:2]
+            base = f"http://{host}:{port}"
+        url = f"{base}/{kind}/{quote(os.path.basename(path))}"
+        return f"{url}?download=1" if download else url
@@ -0,0 +1,244 @@
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+import cv2
+from utils.video_recorder import VideoRecorder
+
+# Marks the end of a stage's output
+_END = object()
+
+
+class VideoPipeline:
+    """
+    Headless offline analysis of a recorded trip, as fast as the hardware allows
+
+    Three stages connected by bounded queues run concurrently:
+        decode thread  - cv2.VideoCapture reads frames ahead
+        inference      - batched ActivityDetector.process_batch (caller's thread)
+        writer thread  - VideoRecorder writes the annotated video and activity log
+
+    Eye-closure / looking-down timers run on video time, so a 5 second
+    eye closure in the clip raises the same alarm however fast it is processed.
+    Produces the same video, JSONL log and summary as a live
+    VideoRecorder session.
+    """
+
+    def __init__(self, detector, batch_size=8, queue_size=32, output_dir="recordings",
+                 write_video=True, inference_lock=None):
+        """
+        Args:
+            detector: Loaded ActivityDetector
+            batch_size: Frames per YOLO forward pass
+            queue_size: Capacity of each inter-stage queue (bounds memory)
+            output_dir: VideoRecorder output directory
+            write_video: False only writes the activity log and summary
+                         (skips drawing and video encoding)
+            inference_lock: Lock held around inference when the detector is
+                            shared with live sessions
+        """
+        self.detector = detector
+        self.batch_size = max(1, int(batch_size))
+        self.queue_size = max(1, int(queue_size))
+        self.output_dir = output_dir
+        self.write_video = write_video
+        self.inference_lock = inference_lock
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop a running pipeline early (logs so far are still saved, as on Ctrl+C)"""
+        self._cancelled.set()
+
+    def run(self, video_path, max_frames=None, progress_callback=None):
+        """
+        Process a video file
+
+        Args:
+            video_path: Input video
+            max_frames: Stop after this many frames (default: whole video)
+            progress_callback: Called as progress_callback(frames_done, total_frames)
+
+        Returns:
+            Dict with video_file, log_file, summary_file, summary and
+            throughput statistics
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise FileNotFoundError(f"Cannot open video: {video_path}")
+
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        if fps <= 0 or fps > 240:
+            fps = 20.0
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+        if max_frames is not None:
+            total_frames = min(total_frames, max_frames) if total_frames else max_frames
+
+        self._cancelled.clear()
+        recorder = VideoRecorder(output_dir=self.output_dir)
+        name = os.path.splitext(os.path.basename(video_path))[0]
+        recorder.start_recording(width, height, fps=fps, write_video=self.write_video, session_name=name)
+        session = self.detector.create_session(name)
+
+        decoded = queue.Queue(maxsize=self.queue_size)
+        analyzed = queue.Queue(maxsize=self.queue_size)
+        errors = []
+        stats = {
+            "frames_written": 0,
+            "inference_seconds": 0.0,
+            "batches": 0
+        }
+
+        decoder = threading.Thread(
+            target=self._decode_stage,
+            args=(cap, decoded, fps, max_frames, errors),
+            name="video-decode",
+            daemon=True
+        )
+        writer = threading.Thread(
+            target=self._write_stage,
+            args=(recorder, analyzed, stats, errors, total_frames, progress_callback),
+            name="video-write",
+            daemon=True
+        )
+
+        start = time.perf_counter()
+        decoder.start()
+        writer.start()
+        try:
+            self._inference_stage(session, decoded, analyzed, stats)
+        except KeyboardInterrupt:
+            # Stop early but still save what was processed
+            self._cancelled.set()
+        except Exception as e:
+            errors.append(e)
+            self._cancelled.set()
+        finally:
+            # Unblock the decoder if inference stopped early, then end the writer
+            while decoder.is_alive():
+                self._drain(decoded)
+                decoder.join(0.1)
+            while writer.is_alive():
+                try:
+                    analyzed.put(_END, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            writer.join()
+            cap.release()
+        elapsed = time.perf_counter() - start
+
+        video_file, log_file, summary_file = recorder.stop_recording()
+        if errors:
+            raise errors[0]
+
+        frames = stats["frames_written"]
+        video_seconds = frames / fps
+        return {
+            "video_file": video_file,
+            "log_file": log_file,
+            "summary_file": summary_file,
+            "summary": recorder.generate_session_summary(),
+            "frames_processed": frames,
+            "cancelled": self._cancelled.is_set(),
+            "source_fps": round(fps, 2),
+            "video_seconds": round(video_seconds, 2),
+            "processing_seconds": round(elapsed, 2),
+            "processing_fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+            "realtime_factor": round(video_seconds / elapsed, 2) if elapsed > 0 else 0.0,
+            "average_batch_size": round(frames / stats["batches"], 2) if stats["batches"] else 0.0,
+            "inference_seconds": round(stats["inference_seconds"], 2)
+        }
+
+    def _decode_stage(self, cap, decoded, fps, max_frames, errors):
+        """Read frames ahead of inference (blocks when the queue is full)"""
+        try:
+            index = 0
+            while not self._cancelled.is_set():
+                if max_frames is not None and index >= max_frames:
+                    break
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                self._put(decoded, (index / fps, frame))
+                index += 1
+        except Exception as e:
+            errors.append(e)
+        finally:
+            self._put(decoded, _END)
+
+    def _inference_stage(self, session, decoded, analyzed, stats):
+        """Gather frames into batches and run the detector"""
+        finished = False
+        while not finished and not self._cancelled.is_set():
+            # Block for the first frame, then take whatever else is ready
+            item = decoded.get()
+            batch = []
+            while item is not _END:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = decoded.get(timeout=0.05)
+                except queue.Empty:
+                    break
+            finished = item is _END
+            if not batch:
+                continue
+
+            timestamps = [video_time for video_time, _ in batch]
+            frames = [frame for _, frame in batch]
+
+            start = time.perf_counter()
+            with self.inference_lock or nullcontext():
+                results = self.detector.process_batch(
+                    frames, [session] * len(frames), annotate=self.write_video, timestamps=timestamps
+                )
+            stats["inference_seconds"] += time.perf_counter() - start
+            stats["batches"] += 1
+
+            for video_time, result in zip(timestamps, results):
+                self._put(analyzed, (video_time, result))
+
+    def _write_stage(self, recorder, analyzed, stats, errors, total_frames, progress_callback):
+        """Write annotated frames and log entries in video order"""
+        try:
+            while True:
+                item = analyzed.get()
+                if item is _END:
+                    break
+                video_time, result = item
+                if result['annotated_frame'] is not None:
+                    recorder.write_frame(result['annotated_frame'])
+                recorder.log_activity(
+                    result['activity'], float(result['confidence']), result['details'],
+                    elapsed_seconds=round(video_time, 3), keypoints=result['keypoints']
+                )
+                stats["frames_written"] += 1
+                if progress_callback is not None:
+                    progress_callback(stats["frames_written"], total_frames)
+        except Exception as e:
+            errors.append(e)
+            self._cancelled.set()
+            self._drain(analyzed)
+
+    def _put(self, target, item):
+        """Put into a bounded queue, giving up once the pipeline is cancelled"""
+        while True:
+            try:
+                target.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._cancelled.is_set():
+                    return
+
+    @staticmethod
+    def _drain(source):
+        """Discard everything waiting in a queue"""
+        while True:
+            try:
+                source.get_nowait()
+            except queue.Empty:
+                return
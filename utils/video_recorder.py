@@ -1,34 +1,185 @@
 import cv2
+import csv
 import os
-from datetime import datetime
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
 import json
-import pandas as pd
+from utils.keypoint_log import KeypointLogWriter, result_codes
+from utils.event_clips import EventClipRecorder, CLIP_BUFFER_MODES
+
+
+def _details_json(details):
+    """Details of a log entry as a JSON object string"""
+    if hasattr(details, 'to_json'):
+        return details.to_json()
+    return json.dumps(details or {})
+
+
+def export_csv(log_file, csv_file=None):
+    """
+    Convert a JSONL activity log to CSV for spreadsheets (streamed, any length)
+    
+    Args:
+        log_file: activity_log_<session>.jsonl
+        csv_file: Output path (default: same name with .csv)
+    
+    Returns:
+        CSV file path (details as a JSON string column)
+    """
+    if csv_file is None:
+        csv_file = os.path.splitext(log_file)[0] + ".csv"
+    with open(log_file) as src, open(csv_file, 'w', newline='') as dst:
+        writer = csv.writer(dst)
+        writer.writerow(("timestamp", "elapsed_seconds", "activity", "confidence", "details"))
+        for line in src:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            writer.writerow((entry['timestamp'], entry['elapsed_seconds'], entry['activity'],
+                             entry['confidence'], json.dumps(entry['details'])))
+    return csv_file
+
+
+# What write_frame does when the background writer's queue is full
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+# Ends the background writer thread
+_STOP = object()
+
 
 class VideoRecorder:
     """
     Handle video recording and activity logging
     """
     
-    def __init__(self, output_dir="recordings"):
+    def __init__(self, output_dir="recordings", async_write=False, queue_size=64, overflow="block",
+                 event_clips=False, pre_event_seconds=10.0, post_event_seconds=10.0, clip_buffer="jpeg",
+                 log_flush_seconds=1.0):
+        """
+        Args:
+            output_dir: Root directory for videos, logs, keypoint stores and event clips
+            async_write: Encode video on a background writer thread, so
+                         write_frame only queues the frame (frames must not
+                         be modified after they are passed in)
+            queue_size: Frames the background writer may fall behind
+            overflow: When the queue is full - "block" (wait for the writer),
+                      "drop_oldest" (discard the oldest queued frame) or
+                      "drop_newest" (discard the frame being written)
+            event_clips: Also write short clips around alarms (clips/, see
+                         EventClipRecorder); combine with
+                         start_recording(write_video=False) to keep only the clips
+            pre_event_seconds: Pre-roll kept in memory for each clip
+            post_event_seconds: Clip length after the last alarm frame
+            clip_buffer: Pre-roll storage - "jpeg", "downscale" or "raw"
+                         (with overflow "block" clip frames are never dropped)
+            log_flush_seconds: Flush the streamed activity log at most this
+                               often (a crash loses at most this much)
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        if clip_buffer not in CLIP_BUFFER_MODES:
+            raise ValueError(f"clip_buffer must be one of {CLIP_BUFFER_MODES}, got {clip_buffer!r}")
         self.output_dir = output_dir
         self.video_dir = os.path.join(output_dir, "videos")
         self.log_dir = os.path.join(output_dir, "logs")
+        self.keypoint_dir = os.path.join(output_dir, "keypoints")
+        self.clips_dir = os.path.join(output_dir, "clips")
         
         # Create directories if they don't exist
         os.makedirs(self.video_dir, exist_ok=True)
         os.makedirs(self.log_dir, exist_ok=True)
         
         self.video_writer = None
+        self.session_active = False  # Between start_recording and stop_recording
         self.current_session = None
         self.current_video_file = None  # Track current video filename
-        self.activity_log = []
         self.session_start_time = None
+        self.media_duration = None  # Set when entries are logged with video time
+        self.keypoint_writer = None
+        self.current_keypoint_log = None  # Keypoint store directory of the session
+        
+        # Streamed activity log (JSONL, opened on the first entry)
+        self.log_flush_seconds = log_flush_seconds
+        self.current_log_file = None
+        self.log_handle = None
+        self.last_log_flush = 0.0
+        self._activity_json = {}  # activity -> JSON string literal
+        self._reset_aggregates()
+        
+        # Background video writer
+        self.async_write = async_write
+        self.queue_size = max(1, int(queue_size))
+        self.overflow = overflow
+        self.frame_queue = None
+        self.writer_thread = None
+        self.writer_error = None
+        self.frames_written = 0
+        self.frames_dropped = 0
+        
+        # Event clips
+        self.event_clips = event_clips
+        self.pre_event_seconds = pre_event_seconds
+        self.post_event_seconds = post_event_seconds
+        self.clip_buffer = clip_buffer
+        self.clip_recorder = None
+        self.alarm_active = False
+        self.current_clips = []
+        self.clip_frames_dropped = 0
         
-    def start_recording(self, frame_width, frame_height, fps=20.0):
-        """Start a new recording session"""
+    def start_recording(self, frame_width, frame_height, fps=20.0, write_video=True, session_name=None,
+                        keypoint_log=True):
+        """
+        Start a new recording session
+        
+        Args:
+            frame_width, frame_height: Size of the frames to write
+            fps: Frame rate of the output video
+            write_video: False only keeps the activity log (no video file)
+            session_name: Appended to the timestamp in file names, so
+                          recordings started in the same second don't collide
+            keypoint_log: Also write the columnar keypoint store
+                          (keypoints/keypoints_<session>/, see KeypointLog)
+        """
+        if self.session_active:
+            # Finish the previous session instead of leaking its files
+            self.stop_recording()
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if session_name:
+            timestamp = f"{timestamp}_{session_name}"
         self.current_session = timestamp
+        self.session_active = True
         self.session_start_time = datetime.now()
+        self.media_duration = None
+        self._close_log()
+        self.current_log_file = None
+        self._reset_aggregates()
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.writer_error = None
+        
+        self.current_keypoint_log = None
+        if keypoint_log:
+            self.current_keypoint_log = os.path.join(self.keypoint_dir, f"keypoints_{timestamp}")
+            self.keypoint_writer = KeypointLogWriter(
+                self.current_keypoint_log, session_id=timestamp,
+                start_time=self.session_start_time.isoformat()
+            )
+        
+        self.alarm_active = False
+        self.current_clips = []
+        self.clip_frames_dropped = 0
+        if self.event_clips:
+            self.clip_recorder = EventClipRecorder(
+                self.clips_dir, timestamp, frame_width, frame_height, fps=fps,
+                pre_seconds=self.pre_event_seconds, post_seconds=self.post_event_seconds,
+                buffer=self.clip_buffer, block=self.overflow == "block"
+            )
+        
+        if not write_video:
+            self.current_video_file = None
+            return None
         
         video_filename = os.path.join(self.video_dir, f"video_{timestamp}.mp4")
         self.current_video_file = video_filename  # Store for later download
@@ -42,44 +193,191 @@ class VideoRecorder:
             (frame_width, frame_height)
         )
         
-        self.activity_log = []
+        if self.async_write:
+            self.frame_queue = queue.Queue(maxsize=self.queue_size)
+            self.writer_thread = threading.Thread(
+                target=self._writer_loop,
+                args=(self.video_writer, self.frame_queue),
+                name="video-recorder-writer",
+                daemon=True
+            )
+            self.writer_thread.start()
         
         return video_filename
     
     def write_frame(self, frame):
-        """Write a frame to the video file"""
-        if self.video_writer is not None:
+        """Write a frame to the video file (queue it in async mode) and the event-clip buffer"""
+        if self.clip_recorder is not None:
+            self.clip_recorder.push(frame)
+        if self.video_writer is None:
+            return
+        if self.frame_queue is None:
             self.video_writer.write(frame)
+            self.frames_written += 1
+            return
+        
+        if self.overflow == "block":
+            self.frame_queue.put(frame)
+            return
+        while True:
+            try:
+                self.frame_queue.put_nowait(frame)
+                return
+            except queue.Full:
+                if self.overflow == "drop_newest":
+                    self.frames_dropped += 1
+                    return
+            # drop_oldest: make room (the writer may have made room already)
+            try:
+                self.frame_queue.get_nowait()
+                self.frames_dropped += 1
+            except queue.Empty:
+                pass
     
-    def log_activity(self, activity, confidence, details=None):
-        """Log detected activity with timestamp"""
-        log_entry = {
-            'timestamp': datetime.now().isoformat(),
-            'elapsed_seconds': (datetime.now() - self.session_start_time).total_seconds() if self.session_start_time else 0,
-            'activity': activity,
-            'confidence': round(confidence, 3),
-            'details': details or {}
-        }
-        self.activity_log.append(log_entry)
+    def _writer_loop(self, video_writer, frame_queue):
+        """Background writer: encode queued frames until the stop marker"""
+        while True:
+            frame = frame_queue.get()
+            if frame is _STOP:
+                return
+            if self.writer_error is not None:
+                continue  # Keep draining so producers never block forever
+            try:
+                video_writer.write(frame)
+                self.frames_written += 1
+            except Exception as e:
+                # Any failure ends encoding, not the thread (producers would block on the queue)
+                self.writer_error = e
+                print(f"❌ Video writer error: {e}")
+    
+    def pending_frames(self):
+        """Frames queued for the background writer"""
+        return self.frame_queue.qsize() if self.frame_queue is not None else 0
+    
+    def _reset_aggregates(self):
+        """Running summary aggregates of the session's log"""
+        self.frames_logged = 0
+        self.activity_counts = {}
+        self.confidence_sums = {}
+        self.activity_durations = {}
+        self.alarm_events = 0
+        self.last_logged = None  # (activity, elapsed_seconds) of the previous entry
+    
+    def _open_log(self):
+        """Create the session's JSONL log (pandas.read_json(path, lines=True) loads it)"""
+        self.current_log_file = os.path.join(self.log_dir, f"activity_log_{self.current_session}.jsonl")
+        self.log_handle = open(self.current_log_file, 'w')
+        self.last_log_flush = time.monotonic()
+    
+    def _close_log(self):
+        if self.log_handle is not None:
+            self.log_handle.close()
+            self.log_handle = None
+    
+    def log_activity(self, activity, confidence, details=None, elapsed_seconds=None, keypoints=None):
+        """
+        Log detected activity with timestamp
+        
+        The entry is appended to the session's JSONL log (flushed every
+        log_flush_seconds) and folded into the running summary aggregates;
+        nothing is kept per frame in memory. Without an active session
+        (before start_recording / after stop_recording) nothing is logged.
+        
+        Args:
+            details: ActivityDetails (or a details dict)
+            keypoints: (17, 3) keypoints in original image pixels for the
+                       keypoint store (None: nobody detected)
+            elapsed_seconds: Position in the video (offline processing runs
+                             faster than real time); default: wall-clock time
+                             since start_recording
+        """
+        if not self.session_active:
+            return  # A late caller must not reopen (and truncate) the finished log
+        if elapsed_seconds is not None:
+            timestamp = (self.session_start_time or datetime.now()) + timedelta(seconds=elapsed_seconds)
+            self.media_duration = max(self.media_duration or 0.0, elapsed_seconds)
+        else:
+            timestamp = datetime.now()
+            elapsed_seconds = (timestamp - self.session_start_time).total_seconds() if self.session_start_time else 0
+        
+        if self.log_handle is None:
+            self._open_log()
+        timestamp = timestamp.isoformat()
+        confidence = round(float(confidence), 3)
+        activity_json = self._activity_json.get(activity)
+        if activity_json is None:
+            activity_json = self._activity_json[activity] = json.dumps(activity)
+        self.log_handle.write(
+            f'{{"timestamp": "{timestamp}", "elapsed_seconds": {float(elapsed_seconds)!r}, '
+            f'"activity": {activity_json}, "confidence": {confidence!r}, '
+            f'"details": {_details_json(details)}}}\n'
+        )
+        now = time.monotonic()
+        if now - self.last_log_flush >= self.log_flush_seconds:
+            self.log_handle.flush()
+            self.last_log_flush = now
+        
+        # Running summary aggregates
+        self.frames_logged += 1
+        self.activity_counts[activity] = self.activity_counts.get(activity, 0) + 1
+        self.confidence_sums[activity] = self.confidence_sums.get(activity, 0.0) + confidence
+        if self.last_logged is not None:
+            previous, previous_elapsed = self.last_logged
+            self.activity_durations[previous] = (
+                self.activity_durations.get(previous, 0.0) + max(0.0, elapsed_seconds - previous_elapsed)
+            )
+        self.last_logged = (activity, elapsed_seconds)
+        
+        if self.keypoint_writer is not None:
+            activity_code, alert_code = result_codes(activity, details)
+            self.keypoint_writer.append(elapsed_seconds, keypoints, activity_code, alert_code, confidence)
+        
+        # Mapping access works for ActivityDetails and details dicts alike
+        alarm = details is not None and bool(details.get('trigger_alarm'))
+        if self.clip_recorder is not None and alarm:
+            self.clip_recorder.alarm(
+                activity, details.get('alert_level'), details.get('alarm_reason'), dict(details),
+                elapsed_seconds=elapsed_seconds, new_event=not self.alarm_active
+            )
+        if alarm and not self.alarm_active:
+            self.alarm_events += 1
+        self.alarm_active = alarm
     
     def stop_recording(self):
         """Stop recording and save activity log - Returns video file path"""
         video_file = self.current_video_file
+        self.session_active = False
+        
+        if self.writer_thread is not None:
+            # Drain: everything queued so far is still written (never wait
+            # on a full queue for a writer thread that is gone)
+            while self.writer_thread.is_alive():
+                try:
+                    self.frame_queue.put(_STOP, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            self.writer_thread.join()
+            self.writer_thread = None
+            self.frame_queue = None
         
         if self.video_writer is not None:
             self.video_writer.release()
             self.video_writer = None
         
-        if self.current_session and self.activity_log:
-            # Save activity log as JSON
-            log_filename = os.path.join(self.log_dir, f"activity_log_{self.current_session}.json")
-            with open(log_filename, 'w') as f:
-                json.dump(self.activity_log, f, indent=2)
-            
-            # Save as CSV for easy analysis
-            csv_filename = os.path.join(self.log_dir, f"activity_log_{self.current_session}.csv")
-            df = pd.DataFrame(self.activity_log)
-            df.to_csv(csv_filename, index=False)
+        if self.keypoint_writer is not None:
+            self.keypoint_writer.close()
+            self.keypoint_writer = None
+        
+        if self.clip_recorder is not None:
+            self.current_clips = self.clip_recorder.stop()
+            self.clip_frames_dropped = self.clip_recorder.frames_dropped
+            self.clip_recorder = None
+        
+        if self.log_handle is not None:
+            # The log is already on disk - close it and write the summary
+            self._close_log()
+            log_filename = self.current_log_file
             
             # Generate summary
             summary = self.generate_session_summary()
@@ -93,37 +391,55 @@ class VideoRecorder:
         return video_file, None, None
     
     def generate_session_summary(self):
-        """Generate summary statistics for the session"""
-        if not self.activity_log:
+        """Generate summary statistics for the session (from the running aggregates)"""
+        if not self.frames_logged:
             return {}
         
-        df = pd.DataFrame(self.activity_log)
-        
-        # Calculate time spent in each activity
-        activity_counts = df['activity'].value_counts().to_dict()
+        # Frames per activity, most frequent first
+        activity_counts = dict(sorted(self.activity_counts.items(), key=lambda item: -item[1]))
         
-        # Calculate average confidence per activity
-        avg_confidence = df.groupby('activity')['confidence'].mean().to_dict()
+        # Average confidence per activity
+        avg_confidence = {activity: self.confidence_sums[activity] / count
+                          for activity, count in sorted(self.activity_counts.items())}
         
-        # Session duration
-        session_duration = (datetime.now() - self.session_start_time).total_seconds() if self.session_start_time else 0
+        # Session duration (video length when logged with video time)
+        end_time = datetime.now()
+        if self.media_duration is not None and self.session_start_time:
+            end_time = self.session_start_time + timedelta(seconds=self.media_duration)
+        session_duration = (end_time - self.session_start_time).total_seconds() if self.session_start_time else 0
         
         summary = {
             'session_id': self.current_session,
             'start_time': self.session_start_time.isoformat() if self.session_start_time else None,
-            'end_time': datetime.now().isoformat(),
+            'end_time': end_time.isoformat(),
             'duration_seconds': round(session_duration, 2),
-            'total_frames_logged': len(self.activity_log),
+            'total_frames_logged': self.frames_logged,
             'activity_counts': activity_counts,
             'average_confidence': {k: round(v, 3) for k, v in avg_confidence.items()},
-            'unique_activities': list(activity_counts.keys())
+            'activity_durations': {k: round(self.activity_durations.get(k, 0.0), 2) for k in activity_counts},
+            'alarm_events': self.alarm_events,
+            'unique_activities': list(activity_counts.keys()),
+            'activity_log': self.current_log_file,
+            'keypoint_log': self.current_keypoint_log,
+            'video_frames_written': self.frames_written,
+            'video_frames_dropped': self.frames_dropped,
+            'event_clips': [
+                {
+                    'clip_file': clip['clip_file'],
+                    'metadata_file': clip['metadata_file'],
+                    'duration_seconds': clip['duration_seconds'],
+                    'alarms': [alarm['activity'] for alarm in clip['alarms']]
+                }
+                for clip in self.current_clips
+            ],
+            'event_clip_frames_dropped': self.clip_frames_dropped
         }
         
         return summary
     
     def is_recording(self):
-        """Check if currently recording"""
-        return self.video_writer is not None
+        """Check if a session is active (video, event clips or only the activity log)"""
+        return self.session_active
 
 
 